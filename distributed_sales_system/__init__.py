@@ -1,8 +1,8 @@
-from distributed_sales_system.user_register import UserRegister
+from distributed_sales_system.market import Market
+from distributed_sales_system.product_register import product_register
 import logging
-from threading import Event
 
-global_user_register = UserRegister()
-logging.basicConfig(level=logging.DEBUG, format='%(relativeCreated)8.6f %(threadName)s %(message)s')
-
-stop_producer = Event()
\ No newline at end of file
+# market used by agents created without explicit market (one per process, kept for compatibility)
+default_market = Market("default", catalog=product_register)
+global_user_register = default_market.register
+stop_producer = default_market.stop
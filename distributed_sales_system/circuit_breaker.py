@@ -0,0 +1,125 @@
+from distributed_sales_system.lock_stats import make_lock
+from typing import Dict, List
+import time
+
+
+class CircuitBreaker:
+    '''
+    A class representing per-producer circuit breakers of customer (or of many customers, it is thread-safe).
+
+    Producer's breaker is closed while producer answers. After failure_threshold consecutive failures (timeouts,
+    full queues, Busy replies after all retries) it opens and producer is skipped without any message, so customer
+    doesn't pay timeout again. After reset_timeout one request is let through (half-open) - success closes breaker,
+    failure opens it for next reset_timeout. Lost probe doesn't block producer forever, another one is let through
+    after reset_timeout.
+
+    ...
+
+    Attributes
+    ----------
+    failure_threshold (int):
+            Number of consecutive failures that opens breaker.
+    reset_timeout (float):
+            Time (in seconds) after which open breaker lets one request through.
+    __breakers (dict):
+            Producer ID mapped to [number of consecutive failures, time (monotonic) until which breaker is open].
+            Producers without failures aren't stored.
+    '''
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 5.0) -> None:
+        if failure_threshold <= 0:
+            raise ValueError("CircuitBreaker: Failure threshold has to be greater than zero!")
+        if reset_timeout < 0:
+            raise ValueError("CircuitBreaker: Reset timeout cannot be less than zero!")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.__breakers: Dict[int, List] = {}
+        self.__lock = make_lock("circuit_breaker")
+
+    def __repr__(self) -> str:
+        return f"{ {producer_id: self.state(producer_id) for producer_id in list(self.__breakers)} }"
+
+    def allow(self, producer_id: int) -> bool:
+        '''
+        Method checking if request can be sent to producer. When open breaker lets request through (as a probe),
+        it stays open for others until probe's result is recorded or reset_timeout passes.
+
+            Parameters:
+                    producer_id (int): ID of producer.
+
+            Returns:
+                    False if producer should be skipped, True otherwise.
+        '''
+        breaker = self.__breakers.get(producer_id)
+        if breaker is None:
+            return True
+        with self.__lock:
+            now = time.monotonic()
+            if breaker[0] < self.failure_threshold:
+                return True
+            if now < breaker[1]:
+                return False
+            breaker[1] = now + self.reset_timeout
+            return True
+
+    def success(self, producer_id: int) -> None:
+        '''
+        Method recording answer of producer - its breaker is closed.
+
+            Parameters:
+                    producer_id (int): ID of producer.
+
+            Returns:
+                    None
+        '''
+        if producer_id in self.__breakers:
+            with self.__lock:
+                self.__breakers.pop(producer_id, None)
+
+    def failure(self, producer_id: int) -> None:
+        '''
+        Method recording failure of producer (no answer on time or busy for all retries).
+
+            Parameters:
+                    producer_id (int): ID of producer.
+
+            Returns:
+                    None
+        '''
+        with self.__lock:
+            breaker = self.__breakers.setdefault(producer_id, [0, 0.0])
+            breaker[0] += 1
+            if breaker[0] >= self.failure_threshold:
+                breaker[1] = time.monotonic() + self.reset_timeout
+
+    def forget(self, producer_id: int) -> None:
+        '''
+        Method removing breaker of producer that left the market, so that new producer with the same ID doesn't
+        inherit it. Called by market's user register (see UserRegister.add_listener).
+
+            Parameters:
+                    producer_id (int): ID of producer.
+
+            Returns:
+                    None
+        '''
+        if producer_id in self.__breakers:
+            with self.__lock:
+                self.__breakers.pop(producer_id, None)
+
+    def state(self, producer_id: int) -> str:
+        '''
+        Method returning state of producer's breaker.
+
+            Parameters:
+                    producer_id (int): ID of producer.
+
+            Returns:
+                    CLOSED, OPEN or HALF_OPEN (next request will be let through as a probe).
+        '''
+        breaker = self.__breakers.get(producer_id)
+        if breaker is None or breaker[0] < self.failure_threshold:
+            return CircuitBreaker.CLOSED
+        return CircuitBreaker.OPEN if time.monotonic() < breaker[1] else CircuitBreaker.HALF_OPEN
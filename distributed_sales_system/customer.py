@@ -1,10 +1,17 @@
-from distributed_sales_system import global_user_register, logging
-from .product_register import product_register
-from typing import List, Dict, Tuple, Union, Optional
-from random import sample, randint
+from distributed_sales_system import default_market, logging
+from .messages import OfferRequest, OrderRequest, OrderStatus, Busy, Closed, PrepareRequest, Decision, Vote, Ack
+from .shopping_cart import ShoppingCart
+from .profiling import profiled
+from .market_board import MarketBoard
+from .exchange import Exchange
+from .circuit_breaker import CircuitBreaker
+from .market import Market
+from typing import List, Dict, Mapping, Tuple, Union, Optional
+from random import expovariate, uniform
 from threading import Thread
+import itertools
 import time
-from queue import Queue, Empty
+from queue import Queue, Empty, Full
 
 
 class Customer(Thread):
@@ -18,96 +25,166 @@ class Customer(Thread):
     purchases (int):
         Number of whole ordering routine before customer end shopping.
     id (int):
-        ID of customer in global user register.
-    __shopping_list (dict):
-        Name of products mapped to amount. Represents shopping list. It can be passed as argument or be generated
-        automatically based on products available in product register.
-    __producers_data (dict):
-        Dictionary mapping producer id to offered products. Information about product contain available amount and
-        price per unit.
-    __preference_list (list):
-        List of preference producers, by selection criterion. We prefer producers that can complete most part of order.
-    __possible_producers (dict):
-        Stores ID and queues (communication) of producers that have at least one product we want to buy.
+        ID of customer in market's user register.
+    market (Market):
+        Market where customer shops.
+    think_time (float):
+        Mean time (in seconds) customer waits before every purchase (exponentially distributed), 0 means no waiting.
+    market_board (MarketBoard | None):
+        Board from which offers are read without messaging producers. Producers that aren't on board are asked.
+    exchange (Exchange | None):
+        Exchange where customer buys instead of negotiating with producers (bids are matched with producers' asks).
+    circuit_breaker (CircuitBreaker):
+        Per-producer circuit breakers - producers that repeatedly didn't answer on time are skipped for a while.
+        Customer's own by default, may be shared by many customers.
+    ordering (str):
+        How orders of one purchase are submitted (one of ordering_modes):
+        - 'sequential' - one producer after another, shopping list and preference list are updated after every reply,
+        - 'parallel' - orders for all producers are planned at once and sent together (one round-trip),
+        - 'atomic' - like parallel, but with two-phase commit - goods are reserved by all producers first and
+          bought only if every producer could reserve its part, so basket is never half-filled.
+    __cart (ShoppingCart):
+        Shopping state of current purchase - shopping list, collected offers and preference list of producers.
+    offerTimeout (float):
+        Class attribute, time (in seconds) customer waits for producer's offer.
+    orderTimeout (float):
+        Class attribute, time (in seconds) customer waits for producer's answer to order.
+    maxRetries (int):
+        Class attribute, how many times request is retried when producer is busy (full queue or Busy reply).
+    backoffBase (float):
+        Class attribute, base delay (in seconds) of exponential backoff between retries.
     """
 
-    def __init__(self, name: str, purchases: int, shopping_list: Optional[Dict[str, int]] = None) -> None:
+    offerTimeout = 10.0
+    orderTimeout = 10.0
+    ordering_modes = ('sequential', 'parallel', 'atomic')
+    __transaction_ids = itertools.count()
+    __request_ids = itertools.count()
+    maxRetries = 5
+    backoffBase = 0.05
+
+    def __init__(self, name: str, purchases: int, shopping_list: Optional[Dict[str, int]] = None, register: bool = True,
+                 think_time: float = 0.0, market_board: Optional[MarketBoard] = None,
+                 exchange: Optional[Exchange] = None, circuit_breaker: Optional[CircuitBreaker] = None,
+                 ordering: str = 'sequential', market: Optional[Market] = None) -> None:
         """
-        Function for initialization of customer. ID is generated automatically by global register.
+        Function for initialization of customer. ID is generated automatically by market's user register. Customer leaves
+        the register when it finishes shopping, when close is called or when it is garbage collected.
 
         Parameters:
             name (str): Name of customer.
             purchases (int): Number of purchases that customer will make
-            shopping_list (dict): Dict mapping name of product to it's number
+            shopping_list (dict): Dict mapping name of product to it's number (names are translated to product IDs)
+            register (bool): If False, customer isn't registered (its id is None) and has to be registered in bulk
+                (see UserRegister.add_customers).
+            think_time (float): Mean time (in seconds) between purchases, 0 means no waiting.
+            market_board (MarketBoard): Board for reading offers (optional).
+            exchange (Exchange): Exchange for buying without negotiation (optional).
+            circuit_breaker (CircuitBreaker): Circuit breakers shared with other customers (optional, customer
+                creates its own if not passed).
+            ordering (str): How orders are submitted - 'sequential', 'parallel' or 'atomic' (see ordering attribute).
+            market (Market): Market where customer shops (default market of the package if not passed).
         """
+        if ordering not in self.ordering_modes:
+            raise ValueError(f"Customer: Ordering has to be one of {self.ordering_modes}!")
         super().__init__()
         self.name = name
         self.purchases = purchases
+        self.market = market if market is not None else default_market
+        self.think_time = think_time
+        self.market_board = market_board
+        self.exchange = exchange
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self.market.register.add_listener(self.circuit_breaker, producers=True)
+        self.ordering = ordering
         self.offer_queue = Queue()
-        self.order_status = Queue(maxsize=1)
-        self.id = global_user_register.add_customer(name, self.offer_queue)
-        self.__producers_data: Dict[int, Dict[str, List[Union[int, float]]]] = {}
-        self.__preference_list: List[Tuple[int, float]] = []
-        self.__possible_producers: Dict[int, List] = {}
-        if shopping_list is None:
-            self.__shopping_list: Dict[str, int] = {}
-        else:    
-            self.__shopping_list: Dict[str, int] = shopping_list
-
+        self.order_status = Queue()
+        # cart is built first, so customer with invalid shopping list isn't left in register
+        self.__cart = ShoppingCart(shopping_list, self.market)
+        self.id = self.market.register.add_customer(name, self.offer_queue) if register else None
+        if self.id is not None:
+            self.market.register.watch(self.id, self)
+
+    @profiled('customer')
     def run(self) -> None:
         """
         Function representing customer behaviour. It includes:
-        - decision to start shopping,
+        - waiting before shopping (think time),
         - browsing producers offer,
-        - submitting orders.
-        Customer follow shopping routine as long as he made fix number of purchases.
+        - submitting orders,
+        or, when customer trades on exchange, bidding for products of shopping list.
+        Customer follow shopping routine as long as he made fix number of purchases, then leaves the register.
 
             Returns:
                 None
 
         """
         number_of_purchases = 0
-        while number_of_purchases < self.purchases:
-            if randint(0, 1):
-                self.browsing_producers_offer()
-                # time.sleep(1)
-                self.submit_order()
-                # time.sleep(1)
+        try:
+            while number_of_purchases < self.purchases:
+                if self.think_time > 0:
+                    time.sleep(expovariate(1 / self.think_time))
+                if self.exchange is not None:
+                    self.trade_on_exchange()
+                else:
+                    self.browsing_producers_offer()
+                    self.submit_order()
                 number_of_purchases += 1
+        finally:
+            self.close()
         logging.debug("is done")
 
+    def __enter__(self) -> 'Customer':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Function for leaving the market - customer is removed from market's user register. Calling close more than
+        once has no effect.
+
+            Returns:
+                None
+        """
+        customer_id, self.id = self.id, None
+        if customer_id is not None:
+            self.market.register.delete_user(customer_id)
+
 
     def browsing_producers_offer(self) -> None:
         """
         Function used for browsing products offers. It includes:
         - generation shopping list,
         - getting information about possible producers,
-        - communication with producers,
+        - reading offers from market board or communication with producers (skipped when their circuit
+          breaker is open),
         - preparation of preference list.
 
             Returns:
                 None
         """
-        if not self.__shopping_list:
-            self.__generate_shopping_list()
-        self.__get_producers_from_register()
-        logging.debug(f"wants to get {self.__shopping_list}")
-        for producer_id, producer_queues in self.__possible_producers.copy().items():
-            producer_queues[0].put_nowait((self.id, list(self.__shopping_list.keys()), self.offer_queue))
-            # logging.debug(f"Customer {self.name} has sent request to {producer_id}")
-            try:
-                producer_data = self.offer_queue.get(timeout=10)
-            except Empty:
-                del self.__possible_producers[producer_id]
+        cart = self.__cart
+        if not cart.shopping_list:
+            cart.generate_shopping_list()
+        cart.get_producers_from_register(self.id)
+        logging.debug(f"wants to get {cart.shopping_list}")
+        for producer_id, producer_queues in cart.possible_producers.copy().items():
+            producer_data = self.market_board.read(producer_id) if self.market_board is not None else None
+            if producer_data is None and self.circuit_breaker.allow(producer_id):
+                producer_data = self.__request_offer(producer_id, producer_queues[0])
+                if producer_data is None:
+                    self.circuit_breaker.failure(producer_id)
+                else:
+                    self.circuit_breaker.success(producer_id)
+            if producer_data is None:
+                cart.remove_producer(producer_id)
                 continue
             # logging.debug(f"Customer {self.name} received data from producer {producer_data}")
             logging.debug(f"queue {producer_data}")
-            self.__remove_product_with_zero_amount(producer_data)
-            if producer_data:
-                self.__producers_data[producer_id] = producer_data
-            else:
-                del self.__possible_producers[producer_id]
-        self.__create_preference_list()
+            cart.add_offer(producer_id, producer_data)
+        cart.create_preference_list()
 
     def submit_order(self) -> None:
         """
@@ -116,154 +193,259 @@ class Customer(Thread):
         - communication with producer,
         - update of shopping list,
         - removing data remaining after completing order.
+        Orders are sent one by one, or all at once in parallel and atomic ordering.
 
             Returns:
                 None
         """
-        while self.__shopping_list and self.__possible_producers:
-            logging.debug(f"shopping list is {self.__shopping_list}")
-            current_producer_id = self.__preference_list.pop(0)[0]
-            current_order = self.__prepare_order_for_producer(current_producer_id)
-            if current_order:
-                self.__possible_producers[current_producer_id][1].put_nowait((self.id, current_order, self.order_status)) # wyślij zamówienie
-                is_order_completed = self.order_status.get() # odbierz odpowiedź
+        if self.ordering != 'sequential':
+            self.__submit_parallel(atomic=self.ordering == 'atomic')
+            return
+        cart = self.__cart
+        while cart.shopping_list and cart.possible_producers:
+            logging.debug(f"shopping list is {cart.shopping_list}")
+            current_producer_id = cart.next_producer()
+            current_order = cart.prepare_order_for_producer(current_producer_id)
+            if current_order and self.circuit_breaker.allow(current_producer_id):
+                is_order_completed = False
+                order_status = None
+                # wyślij zamówienie
+                request_id = next(self.__request_ids)
+                if self.__send(cart.possible_producers[current_producer_id][1], OrderRequest(self.id, current_order, self.order_status, self.market.clock(), request_id)):
+                    order_status = self.__wait_for_reply(self.order_status, current_producer_id, request_id, self.orderTimeout) # odbierz odpowiedź
+                    is_order_completed = isinstance(order_status, OrderStatus) and order_status.completed
+                if order_status is None:
+                    self.circuit_breaker.failure(current_producer_id)
+                elif not isinstance(order_status, Closed):
+                    self.circuit_breaker.success(current_producer_id)
                 logging.debug(f"order is: {is_order_completed}")
                 if is_order_completed:
-                    for bought_product in current_order:
-                        self.__shopping_list[bought_product] -= current_order[bought_product]
-                        if self.__shopping_list[bought_product] == 0:
-                            del self.__shopping_list[bought_product]
-            del self.__possible_producers[current_producer_id]
-            if not self.__shopping_list:
+                    cart.order_completed(current_order)
+            cart.remove_producer(current_producer_id)
+            if not cart.shopping_list:
                 break
-            self.__create_preference_list()
-        self.__remove_shopping_data_finished_order()
+            cart.create_preference_list()
+        cart.clear()
 
-    def __remove_product_with_zero_amount(self, products_info: Dict[str, List[Union[int, float]]]) -> None:
+    def trade_on_exchange(self) -> None:
         """
-        Inner function for checking if producer has a product (zero amount means product is not available
-        and should be deleted).
+        Function for purchase on exchange - every product of shopping list is bought with one bid, filled from
+        the cheapest asks. Products that nobody has in stock stay unbought.
+
+            Returns:
+                None
+        """
+        cart = self.__cart
+        if not cart.shopping_list:
+            cart.generate_shopping_list()
+        logging.debug(f"wants to get {cart.shopping_list}")
+        for product_id, amount in list(cart.shopping_list.items()):
+            fills = self.exchange.buy(self.id, product_id, amount)
+            bought = sum(fill.amount for fill in fills)
+            logging.debug(f"bought {bought} of {product_id}: {fills}")
+            if bought:
+                cart.order_completed({product_id: bought})
+        cart.clear()
+
+    def __submit_parallel(self, atomic: bool) -> None:
+        """
+        Inner function submitting orders for all producers of preference list at once and collecting their replies
+        together. In atomic mode orders are only prepared (goods reserved) and decision is sent to every prepared
+        producer afterwards - commit if all of them voted ready, abort otherwise. Committed order counts as bought
+        only when producer acknowledged it (goods of producer that voted ready stay reserved until decision comes,
+        or until customer leaves the register). Plan that can't buy whole shopping list (according to offers) isn't
+        submitted at all in atomic mode.
 
             Parameters:
-                products_info (dict): Dictionary mapping product name to two-element list with amount and price
-                    (name: [amount, price])
+                atomic (bool): If True, orders are submitted with two-phase commit.
 
             Returns:
                 None
         """
-        for product, info in products_info.copy().items():
-            if info[0] == 0:
-                del products_info[product]
-
-    def __prepare_order_for_producer(self, producer_id) -> Dict[str, int]:
+        cart = self.__cart
+        plan = {producer_id: order for producer_id, order in cart.plan_orders().items()
+                if self.circuit_breaker.allow(producer_id)}
+        if atomic and not self.__covers_shopping_list(plan):
+            logging.debug(f"order plan {plan} doesn't cover whole shopping list, nothing is bought")
+            plan = {}
+        logging.debug(f"order plan is {plan}")
+        transaction_id = next(self.__transaction_ids) if atomic else None
+        # producer ID mapped to ID of its order (transaction ID in atomic mode)
+        sent = {}
+        for producer_id, order in plan.items():
+            sent_at = self.market.clock()
+            request_id = transaction_id if atomic else next(self.__request_ids)
+            message = PrepareRequest(self.id, transaction_id, order, self.order_status, sent_at) if atomic \
+                else OrderRequest(self.id, order, self.order_status, sent_at, request_id)
+            if self.__send(cart.possible_producers[producer_id][1], message):
+                sent[producer_id] = request_id
+        replies = self.__wait_for_replies(self.order_status, sent, self.orderTimeout, Vote if atomic else OrderStatus)
+        for producer_id in plan:
+            if producer_id in replies:
+                self.circuit_breaker.success(producer_id)
+            else:
+                self.circuit_breaker.failure(producer_id)
+        if atomic:
+            commit = len(replies) == len(plan) and all(isinstance(vote, Vote) and vote.ready
+                                                        for vote in replies.values())
+            decided = {producer_id: transaction_id for producer_id in sent
+                       if self.__send(cart.possible_producers[producer_id][1],
+                                      Decision(self.id, transaction_id, commit, self.order_status, self.market.clock()))}
+            completed = []
+            if commit:
+                acks = self.__wait_for_replies(self.order_status, decided, self.orderTimeout, Ack)
+                completed = [producer_id for producer_id, ack in acks.items() if isinstance(ack, Ack) and ack.committed]
+                if len(completed) != len(plan):
+                    logging.debug(f"transaction {transaction_id} committed only by {completed}, others in doubt")
+        else:
+            completed = [producer_id for producer_id, status in replies.items()
+                         if isinstance(status, OrderStatus) and status.completed]
+        logging.debug(f"orders completed by {completed}")
+        for producer_id in completed:
+            cart.order_completed(plan[producer_id])
+        cart.clear()
+
+    def __covers_shopping_list(self, plan: Dict[int, Dict[int, int]]) -> bool:
         """
-        Inner function for preparing order.
+        Inner function checking if orders of plan together buy whole shopping list.
 
             Parameters:
-                producer_id (int): ID of producer that we want to buy from.
+                plan (dict): Dictionary mapping producer ID to its order.
 
             Returns:
-                 order (dict): Dictionary mapping product name to amount (name:amount).
+                True if every product of shopping list is ordered in full amount, False otherwise.
         """
-        order = {}
-        producer_info = self.__producers_data[producer_id]
-        for available_product in producer_info:
-            if available_product in self.__shopping_list.keys():
-                product_amount = producer_info[available_product][0]
-                product_need = self.__shopping_list[available_product]
-                order[available_product] = product_need if product_amount >= product_need else product_amount
-        return order
-
-    def __generate_shopping_list(self, max_products_in_list=4, max_product_amount=10) -> None:
+        ordered = {}
+        for order in plan.values():
+            for product, amount in order.items():
+                ordered[product] = ordered.get(product, 0) + amount
+        return all(ordered.get(product, 0) >= amount for product, amount in self.__cart.shopping_list.items())
+
+    def __wait_for_replies(self, reply_queue: Queue, request_ids: Dict[int, int], timeout: float,
+                           reply_type: type) -> Dict[int, tuple]:
         """
-        Internal function for generating shopping list. Product are chosen from product register.
+        Inner function for waiting for replies from given producers (until all of them reply or timeout passes).
+        Late replies (to orders that already timed out or to other transactions) are discarded, Closed reply
+        of closed producer is accepted as its reply.
 
             Parameters:
-                max_products_in_list (int): Maximum number of products in shopping list.
+                reply_queue (Queue): Queue where replies are expected.
 
-                max_product_amount (int): Maximum amount of every product in shopping list.
+                request_ids (dict): IDs of producers that should reply mapped to ID of their order (request ID
+                                    for order statuses, transaction ID for votes and acknowledgements).
 
-            Returns:
-                 None
-        """
-        number_of_products = randint(1, max_products_in_list)
-        products = sample(product_register, number_of_products)
-        for product in products:
-            amount = randint(1, max_product_amount)
-            self.__shopping_list[product] = amount
+                timeout (float): Maximum waiting time in seconds (for all replies).
 
-    def __get_producers_from_register(self) -> None:
-        """
-        Internal function for contacting global user register for information about possible producers.
+                reply_type (type): Type of expected replies (OrderStatus, Vote or Ack).
 
             Returns:
-                None
-
+                Dictionary mapping producer ID to its reply (producers that didn't reply on time are missing).
         """
-        self.__possible_producers = global_user_register.producer_with_products(self.__shopping_list)
+        waiting = dict(request_ids)
+        replies = {}
+        deadline = time.monotonic() + timeout
+        while waiting:
+            try:
+                reply = reply_queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except Empty:
+                break
+            if reply.producer_id in waiting and (isinstance(reply, Closed) or (isinstance(reply, reply_type) and (
+                    reply.request_id if reply_type is OrderStatus else reply.transaction_id) == waiting[reply.producer_id])):
+                del waiting[reply.producer_id]
+                replies[reply.producer_id] = reply
+            else:
+                logging.debug(f"discarding late reply {reply}")
+        return replies
 
-    def __cost_function(self, products_data: Dict[str, List[Union[int, float]]]) -> float:
+    def __request_offer(self, producer_id: int, request_queue: Queue) -> Optional[Mapping[int, Tuple[int, float]]]:
         """
-        Internal function for calculating cost function (selection criterion) for producer - gives penalty for missing
-        products and too little amount.
+        Inner function for asking producer for its offer. When producer is busy, request is retried with jittered
+        exponential backoff (at most maxRetries times).
 
             Parameters:
-                products_data (dict): Dictionary mapping product name to two-element list with amount and price
-                (name: [amount, price])
+                producer_id (int): ID of producer.
+
+                request_queue (Queue): Queue where producer receives offer requests.
 
             Returns:
-                cost (float): Value of cost function.
+                Offered products (dict) or None if producer didn't answer, was busy for all retries or is closed.
+        """
+        request_id = next(self.__request_ids)
+        for attempt in range(self.maxRetries + 1):
+            retry_after = 0.0
+            if self.__send(request_queue, OfferRequest(self.id, list(self.__cart.shopping_list.keys()), self.offer_queue, self.market.clock(), request_id), retry=False):
+                reply = self.__wait_for_reply(self.offer_queue, producer_id, request_id, self.offerTimeout)
+                if reply is None or isinstance(reply, Closed):
+                    return None
+                if not isinstance(reply, Busy):
+                    return reply.products
+                retry_after = reply.retry_after
+            if attempt < self.maxRetries:
+                self.__backoff(attempt, retry_after)
+        logging.debug(f"producer {producer_id} is busy, giving up")
+        return None
+
+    def __send(self, producer_queue: Queue, message, retry: bool = True) -> bool:
         """
+        Inner function for putting message into producer's (bounded) queue without blocking.
 
-        products_number_coef = len(set(self.__shopping_list.keys())-(set(products_data.keys())))/len(self.__shopping_list)
-        cost = 0
-        for product in products_data:
-            if product in self.__shopping_list.keys():
-                product_amount = products_data[product][0]
-                product_need = self.__shopping_list[product]
-                product_cost = products_data[product][1]
-                is_order_satisfied = product_amount >= product_need
-                order_amount = product_need if is_order_satisfied else product_amount
-                product_amount_coef = 1 if is_order_satisfied else product_amount/product_need
-                cost += product_cost*order_amount/product_amount_coef
-        if products_number_coef != 0:
-            return cost/products_number_coef
-        else:
-            return cost
+            Parameters:
+                producer_queue (Queue): Producer's request or order queue.
 
+                message (namedtuple): OfferRequest or OrderRequest.
 
-    def __create_preference_list(self) -> None:
-        """
-        Internal function for creating preference list. It includes:
-        - calculation of cost function per producer
-        - sorting results
+                retry (bool): If True, full queue is retried with backoff (at most maxRetries times).
 
-            Results:
-                None
+            Returns:
+                True if message was sent, False if queue was full.
         """
-        cost_for_producers = []
-        for possible_producer in self.__possible_producers:
-            cost_for_producers.append((possible_producer, self.__cost_function(self.__producers_data[possible_producer])))
-        logging.debug(f"preference list: {cost_for_producers}")
-        self.__preference_list = sorted(cost_for_producers, key=lambda producer_data: producer_data[1])
-
-    def __remove_shopping_data_finished_order(self) -> None:
+        for attempt in range(self.maxRetries + 1 if retry else 1):
+            try:
+                producer_queue.put_nowait(message)
+                return True
+            except Full:
+                if retry and attempt < self.maxRetries:
+                    self.__backoff(attempt)
+        return False
+
+    def __wait_for_reply(self, reply_queue: Queue, producer_id: int, request_id: int, timeout: float):
         """
-        Internal method for removing data remaining after completing order.
+        Inner function for waiting for reply to given request. Late replies (to requests that already timed out,
+        also from the same producer) are discarded, Closed reply of closed producer is accepted as its reply.
+
+            Parameters:
+                reply_queue (Queue): Queue where reply is expected.
+
+                producer_id (int): ID of producer that should reply.
+
+                request_id (int): ID of request (or order) that reply should belong to.
+
+                timeout (float): Maximum waiting time in seconds.
 
             Returns:
-                None
+                Reply message or None if producer didn't reply on time.
         """
-        self.__shopping_list: Dict[str, int] = {}
-        self.__producers_data: Dict[int, Dict[str, List]] = {}
-        self.__preference_list: List[Tuple[int, float]] = []
-        self.__possible_producers: List[int] = []
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                reply = reply_queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except Empty:
+                return None
+            if reply.producer_id == producer_id and (isinstance(reply, Closed) or reply.request_id == request_id):
+                return reply
+            logging.debug(f"discarding late reply {reply}")
 
-    def __del__(self) -> None:
+    def __backoff(self, attempt: int, retry_after: float = 0.0) -> None:
         """
-        Deletion of customer object. Automatically calls method form global user register.
+        Inner function for sleeping before retry - exponential backoff with jitter, at least retry_after.
+
+            Parameters:
+                attempt (int): Number of retry (starting from 0).
+
+                retry_after (float): Minimum delay requested by producer.
 
             Returns:
                 None
         """
-        global_user_register.delete_user(self.id)
+        delay = max(retry_after, self.backoffBase * 2 ** attempt)
+        time.sleep(uniform(delay / 2, delay * 3 / 2))
@@ -0,0 +1,504 @@
+from distributed_sales_system import default_market, logging
+from .messages import OfferRequest, OrderRequest, Offer, OrderStatus, Busy, Closed, Timeout, Retry
+from .shopping_cart import ShoppingCart
+from .customer import Customer
+from .profiling import profiled
+from .market_board import MarketBoard
+from .circuit_breaker import CircuitBreaker
+from .market import Market
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from random import uniform
+from threading import Thread, Condition
+from itertools import count
+from queue import Queue, Full
+import heapq
+import time
+
+
+class PooledCustomer:
+    """
+    Class representing customer run as resumable state machine by CustomerPool (instead of own thread).
+
+    Customer never blocks - it sends requests and returns, and CustomerPool resumes it (calls handle) whenever
+    reply or timer message arrives. Customer object is used as its own reply queue (it implements put_nowait),
+    so producers reply to it exactly like to Customer threads.
+
+    States: IDLE (before purchase) -> BROWSING (waiting for offers from all possible producers at once)
+    -> ORDERING (waiting for answer to order, one producer at a time, in preference order) -> IDLE ... -> DONE.
+
+    Attributes
+    ----------
+    name (str):
+        Name of customer.
+    purchases (int):
+        Number of whole ordering routine before customer end shopping.
+    id (int):
+        ID of customer in market's user register.
+    pool (CustomerPool):
+        Pool that runs this customer.
+    number_of_purchases (int):
+        Number of purchases already made.
+    state (int):
+        Current state of customer.
+    cart (ShoppingCart):
+        Shopping state of current purchase.
+    pending (dict):
+        While browsing - producers whose offer we still wait for, mapped to number of retries.
+        While ordering - producer we wait for, mapped to number of retries.
+    order (dict):
+        Order sent to producer we currently wait for.
+    token (int):
+        Identifier of current wait, also sent as request ID of offer requests and orders - timers and replies
+        from previous waits (e.g. late answer to order that timed out) are ignored.
+    """
+
+    __slots__ = ('name', 'purchases', 'id', 'pool', 'number_of_purchases', 'state', 'cart', 'pending', 'order', 'token')
+
+    IDLE, BROWSING, ORDERING, DONE = range(4)
+
+    def __init__(self, name: str, purchases: int, pool: 'CustomerPool', shopping_list: Optional[Dict[str, int]] = None,
+                 register: bool = True) -> None:
+        """
+        Function for initialization of customer. ID is generated automatically by register of pool's market.
+
+        Parameters:
+            name (str): Name of customer.
+            purchases (int): Number of purchases that customer will make
+            pool (CustomerPool): Pool that runs this customer.
+            shopping_list (dict): Dict mapping name of product to it's number (names are translated to product IDs)
+            register (bool): If False, customer isn't registered (its id is None) and has to be registered in bulk
+                before the pool is started (see CustomerPool.add_customers).
+        """
+        self.name = name
+        self.purchases = purchases
+        self.pool = pool
+        self.number_of_purchases = 0
+        self.state = PooledCustomer.IDLE
+        self.cart = ShoppingCart(shopping_list, pool.market)
+        self.pending: Dict[int, int] = {}
+        self.order: Dict[int, int] = {}
+        self.token = 0
+        self.id = pool.market.register.add_customer(name, self) if register else None
+
+    def __repr__(self) -> str:
+        return f"{self.name}"
+
+    def put_nowait(self, message) -> None:
+        """
+        Interface for producers - replies are passed to the pool, which resumes customer with them.
+
+            Parameters:
+                message (namedtuple): Reply from producer.
+
+            Returns:
+                None
+        """
+        self.pool.deliver(self, message)
+
+    def handle(self, message) -> None:
+        """
+        Function resuming customer with message (reply from producer, timer or None for start of shopping).
+        Called only by pool workers, never concurrently for the same customer.
+
+            Parameters:
+                message (namedtuple | None): Message that customer waited for.
+
+            Returns:
+                None
+        """
+        if self.state == PooledCustomer.IDLE:
+            if message is None:
+                self.__start_purchase()
+        elif self.state == PooledCustomer.BROWSING:
+            self.__handle_browsing(message)
+        elif self.state == PooledCustomer.ORDERING:
+            self.__handle_ordering(message)
+
+    def __start_purchase(self) -> None:
+        """
+        Inner function starting new purchase - offers are read from market board, other possible producers are asked
+        for offer at once (except producers whose circuit breaker is open).
+        """
+        cart = self.cart
+        if self.number_of_purchases >= self.purchases:
+            self.state = PooledCustomer.DONE
+            self.pool.customer_done(self)
+            return
+        if not cart.shopping_list:
+            cart.generate_shopping_list()
+        cart.get_producers_from_register(self.id)
+        logging.debug(f"{self.name} wants to get {cart.shopping_list}")
+        self.state = PooledCustomer.BROWSING
+        self.pending = dict.fromkeys(cart.possible_producers, 0)
+        market_board = self.pool.market_board
+        if market_board is not None:
+            for producer_id in list(self.pending):
+                offer = market_board.read(producer_id)
+                if offer is not None:
+                    del self.pending[producer_id]
+                    cart.add_offer(producer_id, offer)
+        circuit_breaker = self.pool.circuit_breaker
+        for producer_id in list(self.pending):
+            if not circuit_breaker.allow(producer_id):
+                del self.pending[producer_id]
+                cart.remove_producer(producer_id)
+        self.token += 1
+        self.pool.schedule(Customer.offerTimeout, self, Timeout(self.token))
+        for producer_id in list(self.pending):
+            self.__request_offer(producer_id)
+        self.__check_browsing_finished()
+
+    def __handle_browsing(self, message) -> None:
+        """
+        Inner function handling messages while waiting for offers.
+        """
+        if isinstance(message, Timeout):
+            if message.token == self.token:
+                for producer_id in self.pending:
+                    self.pool.circuit_breaker.failure(producer_id)
+                    self.cart.remove_producer(producer_id)
+                self.pending = {}
+        elif isinstance(message, Retry):
+            if message.producer_id in self.pending:
+                self.__request_offer(message.producer_id)
+        elif isinstance(message, Offer):
+            if message.producer_id in self.pending and message.request_id == self.token:
+                del self.pending[message.producer_id]
+                self.pool.circuit_breaker.success(message.producer_id)
+                self.cart.add_offer(message.producer_id, message.products)
+        elif isinstance(message, Busy):
+            if message.producer_id in self.pending and message.request_id == self.token:
+                self.__retry(message.producer_id, message.retry_after)
+        elif isinstance(message, Closed):
+            # producer left the market - not a failure, it just isn't asked any more
+            if message.producer_id in self.pending:
+                del self.pending[message.producer_id]
+                self.cart.remove_producer(message.producer_id)
+        self.__check_browsing_finished()
+
+    def __handle_ordering(self, message) -> None:
+        """
+        Inner function handling messages while waiting for answer to order.
+        """
+        if isinstance(message, Timeout):
+            if message.token == self.token:
+                for producer_id in self.pending:
+                    self.pool.circuit_breaker.failure(producer_id)
+                self.__order_finished(False)
+        elif isinstance(message, Retry):
+            if message.producer_id in self.pending:
+                self.__send_order(message.producer_id)
+        elif isinstance(message, OrderStatus):
+            if message.producer_id in self.pending and message.request_id == self.token:
+                self.pool.circuit_breaker.success(message.producer_id)
+                self.__order_finished(message.completed)
+        elif isinstance(message, Closed):
+            if message.producer_id in self.pending:
+                self.__order_finished(False)
+
+    def __request_offer(self, producer_id: int) -> None:
+        """
+        Inner function sending offer request to producer (retried later if producer's queue is full).
+        """
+        request_queue = self.cart.possible_producers[producer_id][0]
+        try:
+            request_queue.put_nowait(OfferRequest(self.id, list(self.cart.shopping_list.keys()), self, self.pool.market.clock(),
+                                                  self.token))
+        except Full:
+            self.__retry(producer_id)
+
+    def __retry(self, producer_id: int, retry_after: float = 0.0) -> None:
+        """
+        Inner function scheduling retry of request with jittered exponential backoff. When there are no retries
+        left, producer is skipped.
+        """
+        attempt = self.pending[producer_id]
+        if attempt >= Customer.maxRetries:
+            logging.debug(f"{self.name}: producer {producer_id} is busy, giving up")
+            self.pool.circuit_breaker.failure(producer_id)
+            del self.pending[producer_id]
+            self.cart.remove_producer(producer_id)
+            if self.state == PooledCustomer.ORDERING:
+                self.__order_finished(False)
+            return
+        self.pending[producer_id] = attempt + 1
+        delay = max(retry_after, Customer.backoffBase * 2 ** attempt)
+        self.pool.schedule(uniform(delay / 2, delay * 3 / 2), self, Retry(producer_id))
+
+    def __check_browsing_finished(self) -> None:
+        """
+        Inner function moving customer to ordering when all offers were collected.
+        """
+        if self.state == PooledCustomer.BROWSING and not self.pending:
+            self.cart.create_preference_list()
+            self.state = PooledCustomer.ORDERING
+            self.__next_order()
+
+    def __next_order(self) -> None:
+        """
+        Inner function sending order to the most preferred producer or finishing purchase if there is none.
+        Producers whose circuit breaker is open are skipped.
+        """
+        cart = self.cart
+        while cart.shopping_list and cart.possible_producers:
+            producer_id = cart.next_producer()
+            self.order = cart.prepare_order_for_producer(producer_id)
+            if self.order and self.pool.circuit_breaker.allow(producer_id):
+                self.pending = {producer_id: 0}
+                self.token += 1
+                self.pool.schedule(Customer.orderTimeout, self, Timeout(self.token))
+                self.__send_order(producer_id)
+                return
+            cart.remove_producer(producer_id)
+            if cart.shopping_list:
+                cart.create_preference_list()
+        self.__purchase_finished()
+
+    def __send_order(self, producer_id: int) -> None:
+        """
+        Inner function sending order to producer (retried later if producer's queue is full).
+        """
+        try:
+            self.cart.possible_producers[producer_id][1].put_nowait(OrderRequest(self.id, self.order, self, self.pool.market.clock(),
+                                                                                 self.token))
+        except Full:
+            self.__retry(producer_id)
+
+    def __order_finished(self, is_order_completed: bool) -> None:
+        """
+        Inner function updating shopping list after answer to order (or its timeout) and continuing with next producer.
+        """
+        logging.debug(f"{self.name} order is: {is_order_completed}")
+        cart = self.cart
+        producer_id = next(iter(self.pending), None)
+        self.pending = {}
+        self.token += 1
+        if is_order_completed:
+            cart.order_completed(self.order)
+        if producer_id is not None:
+            cart.remove_producer(producer_id)
+        if cart.shopping_list and cart.possible_producers:
+            cart.create_preference_list()
+        self.__next_order()
+
+    def __purchase_finished(self) -> None:
+        """
+        Inner function finishing purchase and starting next one (or finishing shopping).
+        """
+        self.cart.clear()
+        self.order = {}
+        self.number_of_purchases += 1
+        self.state = PooledCustomer.IDLE
+        # resumed later by the pool, so that other customers aren't starved
+        self.pool.deliver(self, None)
+
+
+class CustomerPool:
+    """
+    Class representing fixed pool of worker threads running many customers as state machines.
+
+    Messages for given customer always go to the same worker (customers are sharded by ID), so customer is never
+    resumed by two workers at once and needs no lock. Timeouts and retries are delivered by single timer thread.
+
+    Attributes
+    ----------
+    workers (int):
+        Number of worker threads.
+    on_done (callable | None):
+        Function called with customer when it finishes shopping (e.g. for latency measurement).
+    market_board (MarketBoard | None):
+        Board from which customers read offers without messaging producers.
+    circuit_breaker (CircuitBreaker):
+        Per-producer circuit breakers shared by all customers of the pool (pooled customers are many and short-lived,
+        so failures seen by one of them protect the others).
+    market (Market):
+        Market where customers of the pool shop.
+    __waiting (list):
+        Customers added before the pool was started.
+    __inboxes (list):
+        Queue of (customer, message) pairs for every worker.
+    __timers (list):
+        Heap of (deadline, sequence number, customer, message) waiting for delivery.
+    """
+
+    def __init__(self, workers: int = 4, on_done: Optional[Callable[[PooledCustomer], None]] = None,
+                 market_board: Optional[MarketBoard] = None, circuit_breaker: Optional[CircuitBreaker] = None,
+                 market: Optional[Market] = None) -> None:
+        if workers <= 0:
+            raise ValueError("CustomerPool: Number of workers has to be greater than zero!")
+        self.workers = workers
+        self.market = market if market is not None else default_market
+        self.on_done = on_done
+        self.market_board = market_board
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self.market.register.add_listener(self.circuit_breaker, producers=True)
+        self.__waiting: List[PooledCustomer] = []
+        self.__inboxes = [Queue() for _ in range(workers)]
+        self.__timers = []
+        self.__sequence = count()
+        self.__condition = Condition()
+        self.__active = 0
+        self.__started = False
+        self.__stopped = False
+        self.__threads: List[Thread] = []
+
+    def add_customer(self, name: str, purchases: int, shopping_list: Optional[Dict[str, int]] = None) -> PooledCustomer:
+        """
+        Function for creating customer run by this pool. If pool is already running, customer starts shopping at once.
+
+        Parameters:
+            name (str): Name of customer.
+            purchases (int): Number of purchases that customer will make
+            shopping_list (dict): Dict mapping name of product to it's number
+
+            Returns:
+                customer (PooledCustomer): New customer.
+        """
+        customer = PooledCustomer(name, purchases, self, shopping_list)
+        self.__enqueue([customer])
+        return customer
+
+    def add_customers(self, customers: Iterable[Tuple[str, int, Optional[Dict[str, int]]]]) -> List[PooledCustomer]:
+        """
+        Function for creating many customers at once, registered in market's user register in bulk.
+
+        Parameters:
+            customers (iterable): Tuples of customer name, number of purchases and shopping list (or None).
+
+            Returns:
+                new_customers (list): New customers.
+        """
+        new_customers = [PooledCustomer(name, purchases, self, shopping_list, register=False)
+                         for name, purchases, shopping_list in customers]
+        customer_ids = self.market.register.add_customers((customer.name, customer) for customer in new_customers)
+        for customer, customer_id in zip(new_customers, customer_ids):
+            customer.id = customer_id
+        self.__enqueue(new_customers)
+        return new_customers
+
+    def start(self) -> None:
+        """
+        Function starting worker threads and timer thread, and starting shopping of all added customers.
+
+            Returns:
+                None
+        """
+        for i, inbox in enumerate(self.__inboxes):
+            self.__threads.append(Thread(target=self.__work, args=(inbox,), name=f"customer_pool_worker_{i}", daemon=True))
+        self.__threads.append(Thread(target=self.__run_timers, name="customer_pool_timer", daemon=True))
+        for thread in self.__threads:
+            thread.start()
+        with self.__condition:
+            self.__started = True
+            waiting, self.__waiting = self.__waiting, []
+        for customer in waiting:
+            self.deliver(customer, None)
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """
+        Function waiting until all customers finished shopping, then stopping pool threads.
+
+            Parameters:
+                timeout (float): Maximum waiting time in seconds, None means no limit.
+
+            Returns:
+                True if all customers finished, False on timeout.
+        """
+        with self.__condition:
+            finished = self.__condition.wait_for(lambda: self.__active == 0, timeout)
+            self.__stopped = True
+            self.__condition.notify_all()
+        for inbox in self.__inboxes:
+            inbox.put_nowait((None, None))
+        for thread in self.__threads:
+            thread.join()
+        return finished
+
+    def deliver(self, customer: PooledCustomer, message) -> None:
+        """
+        Function passing message to worker responsible for customer.
+
+            Parameters:
+                customer (PooledCustomer): Addressee.
+                message (namedtuple | None): Message for customer.
+
+            Returns:
+                None
+        """
+        self.__inboxes[customer.id % self.workers].put_nowait((customer, message))
+
+    def schedule(self, delay: float, customer: PooledCustomer, message) -> None:
+        """
+        Function for delivering message to customer after delay (timeouts and retries).
+
+            Parameters:
+                delay (float): Delay in seconds.
+                customer (PooledCustomer): Addressee.
+                message (namedtuple): Message for customer.
+
+            Returns:
+                None
+        """
+        with self.__condition:
+            heapq.heappush(self.__timers, (time.monotonic() + delay, next(self.__sequence), customer, message))
+            self.__condition.notify_all()
+
+    def customer_done(self, customer: PooledCustomer) -> None:
+        """
+        Function called by customer after its last purchase. Customer is removed from market's user register.
+
+            Parameters:
+                customer (PooledCustomer): Customer that finished shopping.
+
+            Returns:
+                None
+        """
+        logging.debug(f"{customer.name} is done")
+        self.market.register.delete_user(customer.id)
+        if self.on_done is not None:
+            self.on_done(customer)
+        with self.__condition:
+            self.__active -= 1
+            self.__condition.notify_all()
+
+    def __enqueue(self, customers: List[PooledCustomer]) -> None:
+        """
+        Inner function counting new customers as active and starting them (or keeping them until pool is started).
+        """
+        with self.__condition:
+            self.__active += len(customers)
+            if not self.__started:
+                self.__waiting.extend(customers)
+                return
+        for customer in customers:
+            self.deliver(customer, None)
+
+    @profiled('customer_pool')
+    def __work(self, inbox: Queue) -> None:
+        """
+        Inner function representing worker thread - resuming customers with their messages.
+        """
+        while True:
+            customer, message = inbox.get()
+            if customer is None:
+                break
+            if customer.state == PooledCustomer.DONE:
+                continue
+            try:
+                customer.handle(message)
+            except Exception:
+                logging.exception(f"{customer.name} failed")
+                customer.state = PooledCustomer.DONE
+                self.customer_done(customer)
+
+    def __run_timers(self) -> None:
+        """
+        Inner function representing timer thread - delivering scheduled messages when their time comes.
+        """
+        with self.__condition:
+            while not self.__stopped:
+                now = time.monotonic()
+                while self.__timers and self.__timers[0][0] <= now:
+                    _, _, customer, message = heapq.heappop(self.__timers)
+                    self.deliver(customer, message)
+                self.__condition.wait(self.__timers[0][0] - now if self.__timers else None)
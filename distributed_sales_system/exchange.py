@@ -0,0 +1,244 @@
+from distributed_sales_system.lock_stats import make_lock
+from collections import namedtuple
+from itertools import count
+from typing import Callable, Dict, List, Optional, Tuple
+import heapq
+
+# one execution of customer's bid against producer's ask
+Fill = namedtuple('Fill', ['producer_id', 'product_id', 'amount', 'price'])
+
+
+class OrderBook:
+    '''
+    A class representing book of asks (offers of producers) of one product, ordered by price-time priority -
+    the cheapest ask first, among asks with the same price the oldest one first.
+
+    Asks are kept in heap. Changed or cancelled ask is only marked dead in heap and removed lazily when it gets
+    to the top, so posting, cancelling and matching are O(log n). Ask keeps its time priority when only its
+    amount decreases (e.g. after partial fill), otherwise it goes to the back of its price level.
+
+    ...
+
+    Attributes
+    ----------
+    product_id (int):
+            ID of product traded in this book.
+    __heap (list):
+            Heap of asks - lists [price, sequence number, producer ID, amount, alive].
+    __asks (dict):
+            Producer ID mapped to its current (alive) ask.
+    '''
+
+    def __init__(self, product_id: int) -> None:
+        self.product_id = product_id
+        self.__heap: List[list] = []
+        self.__asks: Dict[int, list] = {}
+        self.__sequence = count()
+        self.__lock = make_lock(f"order_book[{product_id}]")
+
+    def __repr__(self) -> str:
+        return f"{sorted((ask[0], ask[1], ask[2], ask[3]) for ask in self.__asks.values())}"
+
+    def __len__(self) -> int:
+        return len(self.__asks)
+
+    def post(self, producer_id: int, amount: int, price: float) -> None:
+        '''
+        Method for posting, changing or cancelling (amount 0) producer's ask.
+
+            Parameters:
+                    producer_id (int): ID of producer.
+                    amount (int): Amount offered.
+                    price (float): Price per unit.
+
+            Returns:
+                    None
+        '''
+        with self.__lock:
+            ask = self.__asks.get(producer_id)
+            if ask is not None:
+                if ask[0] == price and 0 < amount <= ask[3]:
+                    ask[3] = amount
+                    return
+                ask[4] = False
+                del self.__asks[producer_id]
+            if amount > 0:
+                ask = [price, next(self.__sequence), producer_id, amount, True]
+                self.__asks[producer_id] = ask
+                heapq.heappush(self.__heap, ask)
+
+    def best_ask(self) -> Optional[Tuple[float, int]]:
+        '''
+        Method returning the best (cheapest, oldest) ask.
+
+            Returns:
+                    (price, amount) of the best ask or None if book is empty.
+        '''
+        with self.__lock:
+            self.__drop_dead()
+            return (self.__heap[0][0], self.__heap[0][3]) if self.__heap else None
+
+    def reserve(self, amount: int, limit_price: Optional[float] = None) -> List[Tuple[int, int, float]]:
+        '''
+        Method matching bid against asks by price-time priority. Matched amounts are taken from asks at once,
+        goods are settled by caller (outside of book lock).
+
+            Parameters:
+                    amount (int): Amount wanted.
+                    limit_price (float): Maximum price per unit, None means any price.
+
+            Returns:
+                    List of (producer ID, amount, price) reservations, the best first.
+        '''
+        reservations = []
+        with self.__lock:
+            heap = self.__heap
+            while amount > 0:
+                self.__drop_dead()
+                if not heap or (limit_price is not None and heap[0][0] > limit_price):
+                    break
+                ask = heap[0]
+                taken = min(amount, ask[3])
+                reservations.append((ask[2], taken, ask[0]))
+                amount -= taken
+                ask[3] -= taken
+                if ask[3] == 0:
+                    ask[4] = False
+                    del self.__asks[ask[2]]
+        return reservations
+
+    def __drop_dead(self) -> None:
+        '''
+        Inner function removing changed and cancelled asks from top of heap. Called with lock held.
+        '''
+        heap = self.__heap
+        while heap and not heap[0][4]:
+            heapq.heappop(heap)
+
+
+class Exchange:
+    '''
+    A class representing central exchange - alternative to bilateral negotiation between customers and producers.
+    Producers post asks (their stock and price of every product), customers post immediate-or-cancel bids and
+    matching engine of product's order book fills them in one step by price-time priority.
+
+    Goods are settled directly with producer's warehouse (warehouse is authority, asks are only its picture) -
+    when producer can't deliver reserved amount (its stock changed meanwhile), its ask is corrected and the rest
+    of bid is matched again.
+
+    ...
+
+    Attributes
+    ----------
+    __books (dict):
+            Product ID mapped to its order book.
+    __settlers (dict):
+            Producer ID mapped to its settle function: settle(customer ID, product ID, amount, price) returning
+            (delivered amount, amount left in warehouse).
+    '''
+
+    def __init__(self) -> None:
+        self.__books: Dict[int, OrderBook] = {}
+        self.__settlers: Dict[int, Callable[[int, int, int, float], Tuple[int, int]]] = {}
+        self.__lock = make_lock("exchange")
+
+    def __repr__(self) -> str:
+        return f"{self.__books}"
+
+    def book(self, product_id: int) -> OrderBook:
+        '''
+        Method returning order book of product (created on first use).
+
+            Parameters:
+                    product_id (int): ID of product.
+
+            Returns:
+                    Order book of the product.
+        '''
+        book = self.__books.get(product_id)
+        if book is None:
+            with self.__lock:
+                book = self.__books.setdefault(product_id, OrderBook(product_id))
+        return book
+
+    def add_producer(self, producer_id: int, settle: Callable[[int, int, int, float], Tuple[int, int]]) -> None:
+        '''
+        Interface for producers - function used for joining the exchange.
+
+            Parameters:
+                    producer_id (int): ID of producer.
+                    settle (callable): Function delivering goods from producer's warehouse.
+
+            Returns:
+                    None
+        '''
+        with self.__lock:
+            self.__settlers[producer_id] = settle
+
+    def remove_producer(self, producer_id: int) -> None:
+        '''
+        Interface for producers - function used for leaving the exchange. All asks of producer are cancelled.
+
+            Parameters:
+                    producer_id (int): ID of producer.
+
+            Returns:
+                    None
+        '''
+        with self.__lock:
+            self.__settlers.pop(producer_id, None)
+            books = list(self.__books.values())
+        for book in books:
+            book.post(producer_id, 0, 0.0)
+
+    def post_ask(self, producer_id: int, product_id: int, amount: int, price: float) -> None:
+        '''
+        Interface for producers - function used for posting (or changing) ask. Amount 0 cancels ask.
+
+            Parameters:
+                    producer_id (int): ID of producer.
+                    product_id (int): ID of product.
+                    amount (int): Amount offered.
+                    price (float): Price per unit.
+
+            Returns:
+                    None
+        '''
+        self.book(product_id).post(producer_id, amount, price)
+
+    def buy(self, customer_id: int, product_id: int, amount: int, limit_price: Optional[float] = None) -> List[Fill]:
+        '''
+        Interface for customers - function used for buying product. Bid is immediate-or-cancel - it is filled
+        from the best asks as much as possible and the rest is dropped.
+
+            Parameters:
+                    customer_id (int): ID of customer.
+                    product_id (int): ID of product.
+                    amount (int): Amount wanted.
+                    limit_price (float): Maximum price per unit, None means any price.
+
+            Returns:
+                    fills (list): Executions of the bid, the best price first (empty if nothing was bought).
+        '''
+        book = self.book(product_id)
+        fills = []
+        while amount > 0:
+            reservations = book.reserve(amount, limit_price)
+            if not reservations:
+                break
+            progress = False
+            for producer_id, reserved, price in reservations:
+                settle = self.__settlers.get(producer_id)
+                if settle is None:
+                    continue
+                delivered, left = settle(customer_id, product_id, reserved, price)
+                if delivered:
+                    fills.append(Fill(producer_id, product_id, delivered, price))
+                    amount -= delivered
+                    progress = True
+                if delivered < reserved:
+                    # ask was stale - it is corrected to real stock, undelivered amount is matched again
+                    book.post(producer_id, left, price)
+            if not progress:
+                break
+        return fills
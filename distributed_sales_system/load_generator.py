@@ -0,0 +1,168 @@
+from distributed_sales_system import logging
+from distributed_sales_system.customer_pool import CustomerPool, PooledCustomer
+# re-exported - Zipf shopping lists were defined here before shopping carts used them
+from distributed_sales_system.shopping_cart import ZipfShoppingLists
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from random import expovariate
+from threading import Condition, Lock
+import time
+
+
+def poisson_arrivals(qps: float, duration: float) -> Iterator[float]:
+    '''
+    Function generating arrival times of Poisson process (exponential gaps between arrivals).
+
+        Parameters:
+                qps (float): Mean number of arrivals per second.
+                duration (float): Length of generated schedule in seconds.
+
+        Returns:
+                Iterator over intended arrival times (seconds since start of the run).
+    '''
+    if qps <= 0:
+        raise ValueError("LoadGenerator: Arrival rate has to be greater than zero!")
+    arrival = expovariate(qps)
+    while arrival < duration:
+        yield arrival
+        arrival += expovariate(qps)
+
+
+def ramp_arrivals(schedule: Sequence[Tuple[float, float]]) -> Iterator[float]:
+    '''
+    Function generating arrival times of Poisson process with rate changing in steps.
+
+        Parameters:
+                schedule (sequence): Pairs of (duration in seconds, arrivals per second), e.g.
+                                     [(10, 100), (10, 200), (10, 400)] for load increasing every 10 seconds.
+
+        Returns:
+                Iterator over intended arrival times (seconds since start of the run).
+    '''
+    offset = 0.0
+    for duration, qps in schedule:
+        for arrival in poisson_arrivals(qps, duration):
+            yield offset + arrival
+        offset += duration
+
+
+def trace_arrivals(timestamps: Iterable[float]) -> Iterator[float]:
+    '''
+    Function generating arrival times from recorded trace (e.g. timestamps of orders from sales ledger).
+
+        Parameters:
+                timestamps (iterable): Sorted absolute timestamps of arrivals.
+
+        Returns:
+                Iterator over intended arrival times (seconds since first arrival of the trace).
+    '''
+    first = None
+    for timestamp in timestamps:
+        if first is None:
+            first = timestamp
+        yield timestamp - first
+
+
+class LoadGenerator:
+    '''
+    A class representing open-loop load generator. Every arrival is a new pooled customer making one purchase,
+    started at its intended time regardless of how many earlier customers are still shopping (arrivals never
+    wait for the system). Latency is measured from intended start, not from actual one, so delays of the
+    generator itself (coordinated omission) are included in the results.
+
+    ...
+
+    Attributes
+    ----------
+    pool (CustomerPool):
+            Pool running generated customers. Load generator sets its on_done callback.
+    arrivals (iterable):
+            Intended arrival times in seconds since start of the run (e.g. from poisson_arrivals).
+    shopping_lists (callable):
+            Function returning shopping list (product names mapped to amount) for every arrival.
+    latencies (list):
+            Time from intended start to end of purchase of every finished customer.
+    service_times (list):
+            Time from actual start to end of purchase of every finished customer.
+    '''
+
+    def __init__(self, pool: CustomerPool, arrivals: Iterable[float], shopping_lists=None) -> None:
+        self.pool = pool
+        self.arrivals = arrivals
+        self.shopping_lists = shopping_lists if shopping_lists is not None else ZipfShoppingLists()
+        self.latencies: List[float] = []
+        self.service_times: List[float] = []
+        self.__started: Dict[PooledCustomer, Tuple[float, float]] = {}
+        self.__issued = 0
+        self.__duration = 0.0
+        self.__lock = Lock()
+        self.__finished = Condition(self.__lock)
+        pool.on_done = self.__customer_done
+
+    def run(self, timeout: Optional[float] = None) -> None:
+        '''
+        Method issuing all arrivals at their intended times and waiting until generated customers finish.
+        Customer pool has to be started.
+
+            Parameters:
+                    timeout (float): Maximum time of waiting for customers after last arrival, None means no limit.
+
+            Returns:
+                    None
+        '''
+        start = time.monotonic()
+        for arrival in self.arrivals:
+            intended = start + arrival
+            delay = intended - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            shopping_list = self.shopping_lists()
+            # lock is held until customer is recorded, so it cannot be reported done before that
+            with self.__lock:
+                self.__issued += 1
+                started = time.monotonic()
+                customer = self.pool.add_customer(f"load_customer_{self.__issued}", 1, shopping_list)
+                self.__started[customer] = (intended, started)
+        with self.__finished:
+            self.__finished.wait_for(lambda: not self.__started, timeout)
+        self.__duration = time.monotonic() - start
+        logging.debug(f"load generator issued {self.__issued} customers")
+
+    def report(self) -> Dict[str, float]:
+        '''
+        Method summarizing run - achieved throughput and latency percentiles (in seconds).
+
+            Returns:
+                    summary (dict): Number of issued and finished customers, throughput, p50/p90/p99/p99.9 and max latency
+                                    (from intended start) and p50/p99 service time (from actual start).
+        '''
+        with self.__lock:
+            latencies = sorted(self.latencies)
+            service_times = sorted(self.service_times)
+        summary = {'issued': self.__issued, 'finished': len(latencies),
+                   'throughput': len(latencies) / self.__duration if self.__duration else 0.0}
+        for name, quantile in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p99.9', 0.999), ('max', 1.0)):
+            summary[f"latency_{name}"] = self.__percentile(latencies, quantile)
+        for name, quantile in (('p50', 0.5), ('p99', 0.99)):
+            summary[f"service_{name}"] = self.__percentile(service_times, quantile)
+        return summary
+
+    def __customer_done(self, customer: PooledCustomer) -> None:
+        '''
+        Inner function called by customer pool when generated customer finishes its purchase.
+        '''
+        now = time.monotonic()
+        with self.__finished:
+            intended, started = self.__started.pop(customer, (None, None))
+            if intended is not None:
+                self.latencies.append(now - intended)
+                self.service_times.append(now - started)
+            self.__finished.notify_all()
+
+    @staticmethod
+    def __percentile(values: List[float], quantile: float) -> float:
+        '''
+        Inner function returning value of given quantile of sorted values (nearest rank).
+        '''
+        if not values:
+            return 0.0
+        return values[min(int(quantile * len(values)), len(values) - 1)]
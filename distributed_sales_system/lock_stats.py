@@ -0,0 +1,473 @@
+'''
+Lock contention and GIL wait instrumentation.
+
+Locks of the project are created with make_lock / make_rlock. When instrumentation is enabled (enable() or
+environment variable DSS_LOCK_STATS set before the package is imported), they return InstrumentedLock, which
+records time spent waiting for the lock and time the lock was held, per lock and per call site that acquired it.
+When disabled, plain threading locks are returned, so there is no overhead at all. Only locks created while
+instrumentation is enabled are measured.
+
+GilProbe measures how late a thread wakes up after short sleep - with many busy threads this is dominated by
+waiting for the GIL.
+'''
+
+from threading import Lock, RLock, Thread, Event, get_ident
+from typing import Dict, List, Optional, Tuple, Union
+from collections import deque
+import os
+import sys
+import time
+import weakref
+
+_enabled = bool(os.environ.get('DSS_LOCK_STATS'))
+# statistics of live instrumented locks (by id of statistics) and merged statistics of collected ones (by lock name),
+# so registry doesn't grow with locks of agents created and destroyed in loops
+_registry: Dict[int, 'LockStats'] = {}
+_retired: Dict[str, 'LockStats'] = {}
+# statistics of collected locks, moved to _retired by next registry operation (finalizers run at any moment,
+# also while _registry_lock is held, so they never take it)
+_released = deque()
+_registry_lock = Lock()
+
+
+class Histogram:
+    '''
+    A class representing histogram of durations with logarithmic (power of two) buckets of nanoseconds.
+
+    ...
+
+    Attributes
+    ----------
+    buckets (list):
+            Bucket i counts durations d with d.bit_length() == i, i.e. 2^(i-1) <= d < 2^i nanoseconds.
+    count (int):
+            Number of recorded durations.
+    total (int):
+            Sum of recorded durations in nanoseconds.
+    max (int):
+            Longest recorded duration in nanoseconds.
+    '''
+
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self) -> None:
+        self.buckets = [0] * 64
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, duration: int) -> None:
+        '''
+        Method for recording duration.
+
+            Parameters:
+                    duration (int): Duration in nanoseconds.
+
+            Returns:
+                    None
+        '''
+        self.buckets[min(duration.bit_length(), 63)] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def merge(self, other: 'Histogram') -> None:
+        '''
+        Method for adding durations of other histogram to this one.
+
+            Parameters:
+                    other (Histogram): Histogram to add.
+
+            Returns:
+                    None
+        '''
+        for bucket, samples in enumerate(other.buckets):
+            self.buckets[bucket] += samples
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, quantile: float) -> int:
+        '''
+        Method for estimating quantile of recorded durations.
+
+            Parameters:
+                    quantile (float): Quantile between 0 and 1.
+
+            Returns:
+                    Upper bound (in nanoseconds) of bucket containing the quantile, 0 if histogram is empty.
+        '''
+        rank = quantile * self.count
+        seen = 0
+        for bucket, samples in enumerate(self.buckets):
+            seen += samples
+            if samples and seen >= rank:
+                return min(1 << bucket, self.max)
+        return 0
+
+
+class LockStats:
+    '''
+    A class representing statistics of one lock. Updated only by thread holding the lock, so it needs no lock itself.
+
+    ...
+
+    Attributes
+    ----------
+    name (str):
+            Name of the lock.
+    wait (Histogram):
+            Time spent waiting for the lock.
+    hold (Histogram):
+            Time the lock was held.
+    contended (int):
+            Number of acquisitions that had to wait (lock was held by other thread).
+    sites (dict):
+            Call site mapped to [acquisitions, total wait, total hold, longest hold] (durations in nanoseconds).
+    '''
+
+    __slots__ = ('name', 'wait', 'hold', 'contended', 'sites')
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.wait = Histogram()
+        self.hold = Histogram()
+        self.contended = 0
+        self.sites: Dict[str, List[int]] = {}
+
+
+class InstrumentedLock:
+    '''
+    A class representing lock (or reentrant lock) recording its wait and hold times. It can be used everywhere
+    threading.Lock / threading.RLock is used (acquire, release, context manager). For reentrant lock only
+    the outermost acquire and release are measured.
+
+    ...
+
+    Attributes
+    ----------
+    name (str):
+            Name of the lock, used in report.
+    stats (LockStats):
+            Statistics of the lock.
+    '''
+
+    __slots__ = ('name', 'stats', '__lock', '__owner', '__depth', '__acquired_at', '__site', '__weakref__')
+
+    def __init__(self, name: str, reentrant: bool = False) -> None:
+        self.name = name
+        self.stats = LockStats(name)
+        self.__lock = RLock() if reentrant else Lock()
+        self.__owner = None
+        self.__depth = 0
+        self.__acquired_at = 0
+        self.__site = None
+        with _registry_lock:
+            _collect_released()
+            _registry[id(self.stats)] = self.stats
+        weakref.finalize(self, _released.append, self.stats).atexit = False
+
+    def __repr__(self) -> str:
+        return f"<InstrumentedLock {self.name} {'locked' if self.__depth else 'unlocked'}>"
+
+    def __enter__(self) -> bool:
+        return self.__acquire(True, -1, sys._getframe(1))
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        '''
+        Method acquiring the lock, the same as threading.Lock.acquire.
+
+            Parameters:
+                    blocking (bool): If False, lock is acquired only if it's free.
+                    timeout (float): Maximum waiting time in seconds, -1 means no limit.
+
+            Returns:
+                    True if lock was acquired, False otherwise.
+        '''
+        return self.__acquire(blocking, timeout, sys._getframe(1))
+
+    def release(self) -> None:
+        '''
+        Method releasing the lock, the same as threading.Lock.release.
+
+            Returns:
+                    None
+        '''
+        if self.__depth == 1:
+            hold = time.perf_counter_ns() - self.__acquired_at
+            self.stats.hold.record(hold)
+            site = self.stats.sites[self.__site]
+            site[2] += hold
+            if hold > site[3]:
+                site[3] = hold
+            self.__owner = None
+        self.__depth -= 1
+        self.__lock.release()
+
+    def locked(self) -> bool:
+        return self.__depth > 0
+
+    def __acquire(self, blocking: bool, timeout: float, frame) -> bool:
+        '''
+        Inner function acquiring the lock and recording waiting time of the call site in given frame.
+        '''
+        start = time.perf_counter_ns()
+        if self.__lock.acquire(False):
+            wait = 0
+        elif not blocking or not self.__lock.acquire(True, timeout):
+            return False
+        else:
+            wait = time.perf_counter_ns() - start
+        self.__depth += 1
+        if self.__depth == 1:
+            self.__owner = get_ident()
+            code = frame.f_code
+            site = f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+            stats = self.stats
+            stats.wait.record(wait)
+            if wait:
+                stats.contended += 1
+            site_stats = stats.sites.get(site)
+            if site_stats is None:
+                site_stats = stats.sites[site] = [0, 0, 0, 0]
+            site_stats[0] += 1
+            site_stats[1] += wait
+            self.__site = site
+            self.__acquired_at = time.perf_counter_ns()
+        return True
+
+    # used by threading.Condition, so that instrumented reentrant lock can be used with it
+    def _is_owned(self) -> bool:
+        return self.__owner == get_ident()
+
+
+class GilProbe:
+    '''
+    A class representing probe of GIL contention - thread repeatedly sleeping for interval and recording how much
+    later than requested it woke up. On idle interpreter lateness is timer resolution (tens of microseconds),
+    with busy threads it grows by time spent waiting for the GIL (up to sys.getswitchinterval() per waiting thread).
+
+    ...
+
+    Attributes
+    ----------
+    interval (float):
+            Requested sleep time in seconds.
+    lateness (Histogram):
+            How much later than requested probe woke up (nanoseconds).
+    '''
+
+    def __init__(self, interval: float = 0.001) -> None:
+        self.interval = interval
+        self.lateness = Histogram()
+        self.__stop = Event()
+        self.__thread = Thread(target=self.__probe, name="gil_probe", daemon=True)
+
+    def __enter__(self) -> 'GilProbe':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        '''
+        Method starting probe thread.
+
+            Returns:
+                    None
+        '''
+        self.__thread.start()
+
+    def stop(self) -> None:
+        '''
+        Method stopping probe thread.
+
+            Returns:
+                    None
+        '''
+        self.__stop.set()
+        if self.__thread.is_alive():
+            self.__thread.join()
+
+    def report(self) -> str:
+        '''
+        Method summarizing wake-up lateness.
+
+            Returns:
+                    Report text.
+        '''
+        lateness = self.lateness
+        return (f"GIL probe: {lateness.count} wake-ups every {self.interval * 1000:.1f} ms, lateness "
+                f"p50 {_format(lateness.percentile(0.5))}, p99 {_format(lateness.percentile(0.99))}, "
+                f"max {_format(lateness.max)} (switch interval {sys.getswitchinterval() * 1000:.1f} ms)")
+
+    def __probe(self) -> None:
+        '''
+        Inner function representing probe thread.
+        '''
+        requested = int(self.interval * 1e9)
+        while not self.__stop.is_set():
+            start = time.perf_counter_ns()
+            time.sleep(self.interval)
+            self.lateness.record(max(time.perf_counter_ns() - start - requested, 0))
+
+
+def enable() -> None:
+    '''
+    Function enabling instrumentation of locks created from now on.
+
+        Returns:
+            None
+    '''
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    '''
+    Function disabling instrumentation of locks created from now on (already instrumented locks keep recording).
+
+        Returns:
+            None
+    '''
+    global _enabled
+    _enabled = False
+
+
+def reset() -> None:
+    '''
+    Function forgetting statistics of all instrumented locks created so far.
+
+        Returns:
+            None
+    '''
+    with _registry_lock:
+        _registry.clear()
+        _retired.clear()
+        _released.clear()
+
+
+def make_lock(name: str) -> Union[InstrumentedLock, Lock]:
+    '''
+    Function creating lock - instrumented if instrumentation is enabled, threading.Lock otherwise.
+
+        Parameters:
+            name (str): Name of the lock, used in report.
+
+        Returns:
+            New lock.
+    '''
+    return InstrumentedLock(name) if _enabled else Lock()
+
+
+def make_rlock(name: str) -> Union[InstrumentedLock, RLock]:
+    '''
+    Function creating reentrant lock - instrumented if instrumentation is enabled, threading.RLock otherwise.
+
+        Parameters:
+            name (str): Name of the lock, used in report.
+
+        Returns:
+            New reentrant lock.
+    '''
+    return InstrumentedLock(name, reentrant=True) if _enabled else RLock()
+
+
+def collect() -> Dict[str, LockStats]:
+    '''
+    Function merging statistics of instrumented locks with the same name.
+
+        Returns:
+            Lock name mapped to its merged statistics.
+    '''
+    merged: Dict[str, LockStats] = {}
+    with _registry_lock:
+        _collect_released()
+        registry = list(_retired.values()) + list(_registry.values())
+    for stats in registry:
+        total = merged.get(stats.name)
+        if total is None:
+            total = merged[stats.name] = LockStats(stats.name)
+        _merge(total, stats)
+    return merged
+
+
+def _merge(total: LockStats, stats: LockStats) -> None:
+    '''
+    Inner function adding statistics of lock to total statistics.
+    '''
+    total.wait.merge(stats.wait)
+    total.hold.merge(stats.hold)
+    total.contended += stats.contended
+    for site, (acquisitions, wait, hold, longest) in list(stats.sites.items()):
+        site_total = total.sites.setdefault(site, [0, 0, 0, 0])
+        site_total[0] += acquisitions
+        site_total[1] += wait
+        site_total[2] += hold
+        site_total[3] = max(site_total[3], longest)
+
+
+def _collect_released() -> None:
+    '''
+    Inner function merging statistics of collected locks into statistics retired by name. Called with registry
+    lock held.
+    '''
+    while _released:
+        stats = _released.popleft()
+        if _registry.pop(id(stats), None) is None:
+            # lock created before reset
+            continue
+        total = _retired.get(stats.name)
+        if total is None:
+            total = _retired[stats.name] = LockStats(stats.name)
+        _merge(total, stats)
+
+
+def report(top: int = 10, gil_probe: Optional[GilProbe] = None) -> str:
+    '''
+    Function creating text report - locks with the longest total waiting time and call sites that held locks
+    for the longest total time.
+
+        Parameters:
+            top (int): Number of listed locks and call sites.
+            gil_probe (GilProbe): Probe whose results are included (optional).
+
+        Returns:
+            Report text.
+    '''
+    merged = collect()
+    lines = [f"{'lock':<30} {'acquired':>9} {'contended':>9} {'wait p50':>9} {'wait p99':>9} {'wait max':>9} "
+             f"{'hold p50':>9} {'hold p99':>9} {'hold max':>9}"]
+    for stats in sorted(merged.values(), key=lambda stats: stats.wait.total, reverse=True)[:top]:
+        lines.append(f"{stats.name:<30} {stats.wait.count:>9} {stats.contended:>9} "
+                     f"{_format(stats.wait.percentile(0.5)):>9} {_format(stats.wait.percentile(0.99)):>9} "
+                     f"{_format(stats.wait.max):>9} {_format(stats.hold.percentile(0.5)):>9} "
+                     f"{_format(stats.hold.percentile(0.99)):>9} {_format(stats.hold.max):>9}")
+    sites: List[Tuple[str, str, List[int]]] = [(stats.name, site, site_stats) for stats in merged.values()
+                                               for site, site_stats in stats.sites.items()]
+    sites.sort(key=lambda site: site[2][2], reverse=True)
+    lines.append(f"\n{'longest holders':<60} {'acquired':>9} {'total wait':>10} {'total hold':>10} {'hold max':>9}")
+    for name, site, (acquisitions, wait, hold, longest) in sites[:top]:
+        lines.append(f"{name + ' @ ' + site:<60} {acquisitions:>9} {_format(wait):>10} {_format(hold):>10} "
+                     f"{_format(longest):>9}")
+    if gil_probe is not None:
+        lines.append("\n" + gil_probe.report())
+    return "\n".join(lines)
+
+
+def _format(duration: int) -> str:
+    '''
+    Inner function formatting duration in nanoseconds with suitable unit.
+    '''
+    if duration < 1000:
+        return f"{duration}ns"
+    if duration < 1000000:
+        return f"{duration / 1e3:.1f}us"
+    if duration < 1000000000:
+        return f"{duration / 1e6:.1f}ms"
+    return f"{duration / 1e9:.2f}s"
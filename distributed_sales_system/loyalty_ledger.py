@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from distributed_sales_system.lock_stats import make_lock
+
+
+class LoyaltyLedger:
+    '''
+    A class representing bounded store of customer spendings, used by producer for discounts.
+
+    Customers that spent more than threshold are kept as IDs in a set, so checking discount eligibility is O(1)
+    and their exact spendings are not stored at all. Spendings of customers below threshold are kept in LRU order
+    and the least recently active customers are evicted when capacity is reached (they start collecting from zero).
+
+    ...
+
+    Attributes
+    ----------
+    threshold (float):
+            Amount of spendings after which customer is eligible for discount.
+    capacity (int):
+            Maximum number of tracked customers below threshold.
+    __spendings (OrderedDict):
+            Customer ID mapped to total spendings, for customers below threshold. Least recently active first.
+    __eligible (set):
+            IDs of customers eligible for discount.
+    '''
+
+    def __init__(self, threshold: float, capacity: int = 10000) -> None:
+        if capacity <= 0:
+            raise ValueError("LoyaltyLedger: Capacity has to be greater than zero!")
+        self.threshold = threshold
+        self.capacity = capacity
+        self.__spendings = OrderedDict()
+        self.__eligible = set()
+        self.__lock = make_lock("loyalty_ledger")
+
+    def __repr__(self) -> str:
+        return f"[eligible: {len(self.__eligible)}, tracked: {len(self.__spendings)}]"
+
+    def __len__(self) -> int:
+        return len(self.__eligible) + len(self.__spendings)
+
+    def is_eligible(self, customer_id: int) -> bool:
+        '''
+        Method for checking if customer should get discount.
+
+            Parameters:
+                    customer_id (int): ID of the customer.
+
+            Returns:
+                    True if customer spent more than threshold, False otherwise.
+        '''
+        return customer_id in self.__eligible
+
+    def add_spendings(self, customer_id: int, amount: float) -> bool:
+        '''
+        Method for adding value of completed order to customer spendings.
+
+            Parameters:
+                    customer_id (int): ID of the customer.
+                    amount (float): Value of the order.
+
+            Returns:
+                    True if customer is eligible for discount after this order, False otherwise.
+        '''
+        with self.__lock:
+            if customer_id in self.__eligible:
+                return True
+            spendings = self.__spendings.pop(customer_id, 0.0) + amount
+            if spendings > self.threshold:
+                self.__eligible.add(customer_id)
+                return True
+            self.__spendings[customer_id] = spendings
+            if len(self.__spendings) > self.capacity:
+                self.__spendings.popitem(last=False)
+            return False
+
+    def forget(self, customer_id: int) -> None:
+        '''
+        Method for removing all data about customer (e.g. when customer ID is freed in user register).
+
+            Parameters:
+                    customer_id (int): ID of the customer.
+
+            Returns:
+                    None
+        '''
+        with self.__lock:
+            self.__eligible.discard(customer_id)
+            self.__spendings.pop(customer_id, None)
@@ -0,0 +1,105 @@
+from distributed_sales_system.user_register import UserRegister
+from distributed_sales_system.product_register import ProductCatalog, default_products
+from threading import Event
+from typing import Callable, Optional
+from weakref import WeakSet
+import time
+
+
+class Market:
+    '''
+    A class representing one market - everything that agents of the market share: user register, product catalog,
+    clock and stop signal. Producers, customers and customer pools are bound to market when they are created
+    (default market of the package if none is passed, see distributed_sales_system.default_market), so many isolated
+    markets can run side by side in one process - stopping one of them doesn't stop the others, and their users and
+    products never meet.
+
+    ...
+
+    Attributes
+    ----------
+    name (str):
+            Name of the market (for logging and reports).
+    register (UserRegister):
+            Register of users of the market.
+    catalog (ProductCatalog):
+            Catalog of products that can be traded on the market.
+    clock (callable):
+            Monotonic clock (seconds) used for heartbeats, health of producers and reservation deadlines.
+    stop (Event):
+            Set when market stops - producers of the market end, like after close is called on every one of them.
+    producers (WeakSet):
+            Producers bound to the market (see shutdown).
+    '''
+
+    def __init__(self, name: str = "market", catalog: Optional[ProductCatalog] = None, routing: str = 'round_robin',
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        '''
+        Constructor of the market.
+
+            Parameters:
+                    name (str): Name of the market.
+                    catalog (ProductCatalog): Catalog of products (optional, new catalog of default products is
+                                              created if not passed - catalogs may be shared by markets).
+                    routing (str): Routing policy of user register (see UserRegister.routing_policies).
+                    clock (callable): Monotonic clock in seconds (time.monotonic by default).
+        '''
+        self.name = name
+        self.catalog = catalog if catalog is not None else ProductCatalog(default_products)
+        self.clock = clock
+        self.register = UserRegister(routing, clock)
+        self.stop = Event()
+        self.producers = WeakSet()
+
+    def __repr__(self) -> str:
+        return f"Market({self.name}, users: {len(self.register)}, stopped: {self.stopped})"
+
+    def __enter__(self) -> 'Market':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def stopped(self) -> bool:
+        return self.stop.is_set()
+
+    def close(self) -> None:
+        '''
+        Method stopping the market without waiting - every producer leaves the register, settles orders it already
+        received (within Producer.drainTimeout), answers the rest of its queues with Closed reply and ends.
+
+            Returns:
+                    None
+        '''
+        self.stop.set()
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        '''
+        Method stopping the market and waiting until its producers end (they drain their queues in parallel).
+
+            Parameters:
+                    timeout (float): Maximum waiting time in seconds (for all producers together), None means no limit.
+
+            Returns:
+                    True if all started producers ended, False on timeout.
+        '''
+        self.close()
+        deadline = None if timeout is None else self.clock() + timeout
+        for producer in list(self.producers):
+            if producer.ident is None:
+                producer.close()
+                continue
+            producer.join(None if deadline is None else max(deadline - self.clock(), 0))
+            if producer.is_alive():
+                return False
+        return True
+
+    def restart(self) -> None:
+        '''
+        Method clearing stop signal, so market can be used with new producers after it was stopped.
+
+            Returns:
+                    None
+        '''
+        self.stop.clear()
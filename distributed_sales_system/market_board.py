@@ -0,0 +1,294 @@
+from distributed_sales_system.lock_stats import make_lock
+from distributed_sales_system.product_register import ProductCatalog, product_register
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Optional, Tuple
+import struct
+
+
+class MarketBoard:
+    '''
+    A class representing market board - offers of all producers in shared memory, readable without messaging
+    from any thread or process (see multiprocessing.shared_memory).
+
+    Board is a fixed-layout table. Every row belongs to one producer and holds amount and price of every product
+    (column = product ID) and version of producer's warehouse. Producer rewrites its row on every warehouse change,
+    customers read rows directly. Rows are guarded by seqlocks - sequence number is odd while row is written,
+    reader retries when sequence was odd or changed during read, so readers never block writers and never see
+    half-written row. Every row has to have single writer (producer publishes under its own lock) and all rows
+    have to be assigned by one process (the one that creates producers).
+
+    Board has one column per product of catalog by default. Row of producer selling product outside the columns
+    (ID not less than number of columns) is published as incomplete - readers get None and ask producer directly,
+    like for producer that isn't on board. Prices on board are undiscounted - customers reading the board never
+    get loyalty discount (see Producer.discountMultiplier), only offers sent by producers are discounted.
+
+    Layout: header (magic, number of rows, number of products, directory generation), then rows of
+    (sequence, producer ID or -1 for free row, version or -1 for row that wasn't published yet or is incomplete,
+    (amount, price) for every product).
+
+    ...
+
+    Attributes
+    ----------
+    name (str):
+            Name of shared memory block, other processes attach to the board by it.
+    rows (int):
+            Maximum number of producers on board.
+    products (int):
+            Number of product columns (row of producer selling product with bigger ID is incomplete).
+    __slots (dict):
+            Producer ID mapped to its row, as found by readers of this process.
+    __generation (int):
+            Directory generation __slots were built for. Generation changes whenever row is assigned or freed.
+    __assigned (dict):
+            Producer ID mapped to its row, for rows assigned by this process (see forget).
+    '''
+
+    magic = b'DSSB'
+    maxReadRetries = 100
+    __header = struct.Struct('<4sIIQ')
+    __sequence = struct.Struct('<Q')
+    __producer = struct.Struct('<q')
+    __header_size = 64
+
+    def __init__(self, name: Optional[str] = None, rows: int = 1024, products: Optional[int] = None,
+                 create: bool = True, catalog: Optional[ProductCatalog] = None) -> None:
+        '''
+        Constructor of the board - creates new shared memory block or attaches to existing one.
+
+            Parameters:
+                    name (str): Name of shared memory block (generated if None and board is created).
+                    rows (int): Maximum number of producers (ignored when attaching).
+                    products (int): Number of product columns, size of catalog if not passed (ignored when attaching).
+                    create (bool): If False, board created by other process is attached by name.
+                    catalog (ProductCatalog): Catalog of market the board serves (default product register).
+        '''
+        if products is None:
+            products = len(catalog if catalog is not None else product_register)
+        if create:
+            if rows <= 0 or products <= 0:
+                raise ValueError("MarketBoard: Number of rows and products has to be greater than zero!")
+            self.__memory = shared_memory.SharedMemory(name, create=True, size=self.__header_size
+                                                       + rows * self.__row_size(products))
+            self.__header.pack_into(self.__memory.buf, 0, self.magic, rows, products, 0)
+            for row in range(rows):
+                self.__producer.pack_into(self.__memory.buf, self.__row_offset(row, products) + 8, -1)
+        else:
+            if name is None:
+                raise ValueError("MarketBoard: Name of board is needed to attach it!")
+            try:
+                self.__memory = shared_memory.SharedMemory(name, track=False)
+            except TypeError:
+                # before Python 3.13 attaching process tracks block too and destroys it when it exits
+                self.__memory = shared_memory.SharedMemory(name)
+                resource_tracker.unregister(self.__memory._name, 'shared_memory')
+            magic, rows, products, _ = self.__header.unpack_from(self.__memory.buf, 0)
+            if magic != self.magic:
+                raise ValueError("MarketBoard: Shared memory block isn't a market board!")
+        self.name = self.__memory.name
+        self.rows = rows
+        self.products = products
+        self.__owner = create
+        self.__body = struct.Struct('<qq' + 'qd' * products)
+        self.__slots: Dict[int, int] = {}
+        self.__generation = -1
+        self.__assigned: Dict[int, int] = {}
+        self.__directory_lock = make_lock("market_board")
+
+    def __repr__(self) -> str:
+        return f"[board: {self.name}, rows: {self.rows}, products: {self.products}]"
+
+    def __enter__(self) -> 'MarketBoard':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+        if self.__owner:
+            self.unlink()
+
+    def assign(self, producer_id: int) -> int:
+        '''
+        Method for assigning free row to producer.
+
+            Parameters:
+                    producer_id (int): ID of producer.
+
+            Returns:
+                    row (int): Number of assigned row.
+
+            Raises:
+                    ValueError - board is full.
+        '''
+        buf = self.__memory.buf
+        with self.__directory_lock:
+            for row in range(self.rows):
+                offset = self.__row_offset(row, self.products)
+                if self.__producer.unpack_from(buf, offset + 8)[0] == -1:
+                    self.__write(offset, producer_id, -1, {}, {})
+                    self.__bump_generation()
+                    self.__assigned[producer_id] = row
+                    return row
+        raise ValueError("MarketBoard: Board is full!")
+
+    def release(self, row: int, producer_id: Optional[int] = None) -> None:
+        '''
+        Method for freeing row of producer that left the market.
+
+            Parameters:
+                    row (int): Number of row.
+                    producer_id (int): ID of producer, if passed row is freed only if it still belongs to producer
+                                       (it may have been freed by forget and assigned again).
+
+            Returns:
+                    None
+        '''
+        with self.__directory_lock:
+            offset = self.__row_offset(row, self.products)
+            owner = self.__producer.unpack_from(self.__memory.buf, offset + 8)[0]
+            if producer_id is not None and (owner != producer_id or self.__assigned.get(owner) != row):
+                return
+            if self.__assigned.get(owner) == row:
+                del self.__assigned[owner]
+            self.__write(offset, -1, -1, {}, {})
+            self.__bump_generation()
+
+    def forget(self, producer_id: int) -> None:
+        '''
+        Method freeing row of producer that left the market without releasing it (e.g. producer was garbage
+        collected), so that new producer with the same ID doesn't inherit its offer. Called by market's user
+        register (see UserRegister.add_listener).
+
+            Parameters:
+                    producer_id (int): ID of producer.
+
+            Returns:
+                    None
+        '''
+        if producer_id in self.__assigned:
+            with self.__directory_lock:
+                row = self.__assigned.pop(producer_id, None)
+                if row is not None:
+                    self.__write(self.__row_offset(row, self.products), -1, -1, {}, {})
+                    self.__bump_generation()
+
+    def publish(self, row: int, producer_id: int, version: int, amounts: Dict[int, int], prices: Dict[int, float]) -> None:
+        '''
+        Method for rewriting producer's row. Caller has to be the only writer of the row.
+
+            Parameters:
+                    row (int): Number of producer's row.
+                    producer_id (int): ID of producer.
+                    version (int): Version of producer's warehouse.
+                    amounts (dict): Product ID mapped to available amount.
+                    prices (dict): Product ID mapped to price (undiscounted), for every product producer sells.
+
+            Returns:
+                    None
+        '''
+        if any(product_id >= self.products for product_id in prices):
+            # offer doesn't fit into columns - readers fall back to asking producer
+            version = -1
+        self.__write(self.__row_offset(row, self.products), producer_id, version, amounts, prices)
+
+    def read(self, producer_id: int) -> Optional[Dict[int, Tuple[int, float]]]:
+        '''
+        Method for reading offer of producer without contacting it.
+
+            Parameters:
+                    producer_id (int): ID of producer.
+
+            Returns:
+                    Dictionary mapping available products to (amount, price) pairs (undiscounted prices) or None if
+                    producer isn't on board, its row isn't complete (see publish) or it was rewritten too many times
+                    during reading.
+        '''
+        generation = self.__header.unpack_from(self.__memory.buf, 0)[3]
+        if generation != self.__generation:
+            self.__refresh_slots(generation)
+        row = self.__slots.get(producer_id)
+        if row is None:
+            return None
+        body = self.__read(self.__row_offset(row, self.products))
+        if body is None or body[0] != producer_id or body[1] == -1:
+            return None
+        return {product_id: (body[2 + 2 * product_id], body[3 + 2 * product_id])
+                for product_id in range(self.products) if body[2 + 2 * product_id] > 0}
+
+    def close(self) -> None:
+        '''
+        Method for detaching board from this process.
+
+            Returns:
+                    None
+        '''
+        self.__memory.close()
+
+    def unlink(self) -> None:
+        '''
+        Method for destroying shared memory block (only by process that created it, after all producers left).
+
+            Returns:
+                    None
+        '''
+        self.__memory.unlink()
+
+    def __write(self, offset: int, producer_id: int, version: int, amounts: Dict[int, int], prices: Dict[int, float]) -> None:
+        '''
+        Inner function writing row under seqlock (odd sequence number while row is written).
+        '''
+        buf = self.__memory.buf
+        sequence = self.__sequence.unpack_from(buf, offset)[0]
+        self.__sequence.pack_into(buf, offset, sequence + 1)
+        values = [producer_id, version]
+        for product_id in range(self.products):
+            values.append(amounts.get(product_id, 0))
+            values.append(prices.get(product_id, 0.0))
+        self.__body.pack_into(buf, offset + 8, *values)
+        self.__sequence.pack_into(buf, offset, sequence + 2)
+
+    def __read(self, offset: int) -> Optional[tuple]:
+        '''
+        Inner function reading consistent row (retried while it is being written).
+        '''
+        buf = self.__memory.buf
+        for _ in range(self.maxReadRetries):
+            sequence = self.__sequence.unpack_from(buf, offset)[0]
+            if sequence & 1:
+                continue
+            body = self.__body.unpack_from(buf, offset + 8)
+            if self.__sequence.unpack_from(buf, offset)[0] == sequence:
+                return body
+        return None
+
+    def __refresh_slots(self, generation: int) -> None:
+        '''
+        Inner function rebuilding mapping of producers to rows after rows were assigned or freed.
+        '''
+        buf = self.__memory.buf
+        slots = {}
+        for row in range(self.rows):
+            producer_id = self.__producer.unpack_from(buf, self.__row_offset(row, self.products) + 8)[0]
+            if producer_id != -1:
+                slots[producer_id] = row
+        self.__slots = slots
+        self.__generation = generation
+
+    def __bump_generation(self) -> None:
+        '''
+        Inner function announcing change of directory (rows assigned or freed) to readers.
+        '''
+        magic, rows, products, generation = self.__header.unpack_from(self.__memory.buf, 0)
+        self.__header.pack_into(self.__memory.buf, 0, magic, rows, products, generation + 1)
+
+    def __row_offset(self, row: int, products: int) -> int:
+        '''
+        Inner function returning offset of row in shared memory block.
+        '''
+        return self.__header_size + row * self.__row_size(products)
+
+    @staticmethod
+    def __row_size(products: int) -> int:
+        '''
+        Inner function returning size of row in bytes.
+        '''
+        return 24 + 16 * products
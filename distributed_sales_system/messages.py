@@ -0,0 +1,31 @@
+from collections import namedtuple
+
+
+# customer -> producer
+# sent_at - time of sending (market clock), used by producer's scheduling and latency SLOs, None if unknown
+# request_id - chosen by customer and copied to reply, so late reply to earlier (timed out) request isn't taken
+# for reply to current one
+OfferRequest = namedtuple('OfferRequest', ['customer_id', 'products', 'reply_queue', 'sent_at', 'request_id'],
+                          defaults=(None, None))
+OrderRequest = namedtuple('OrderRequest', ['customer_id', 'order', 'reply_queue', 'sent_at', 'request_id'],
+                          defaults=(None, None))
+# two-phase commit of basket split across producers - prepare reserves goods, decision commits or releases them
+# (and is acknowledged, reply_queue None - no acknowledgement)
+PrepareRequest = namedtuple('PrepareRequest', ['customer_id', 'transaction_id', 'order', 'reply_queue', 'sent_at'],
+                            defaults=(None,))
+Decision = namedtuple('Decision', ['customer_id', 'transaction_id', 'commit', 'reply_queue', 'sent_at'],
+                      defaults=(None, None))
+
+# producer -> customer
+Offer = namedtuple('Offer', ['producer_id', 'products', 'request_id'], defaults=(None,))
+OrderStatus = namedtuple('OrderStatus', ['producer_id', 'completed', 'request_id'], defaults=(None,))
+Busy = namedtuple('Busy', ['producer_id', 'retry_after', 'request_id'], defaults=(None,))
+Vote = namedtuple('Vote', ['producer_id', 'transaction_id', 'ready'])
+# committed - goods of transaction were sold (False for abort or unknown transaction)
+Ack = namedtuple('Ack', ['producer_id', 'transaction_id', 'committed'])
+# producer left the market - request or order wasn't handled (valid answer to any request sent to the producer)
+Closed = namedtuple('Closed', ['producer_id'])
+
+# customer pool -> pooled customer (timers)
+Timeout = namedtuple('Timeout', ['token'])
+Retry = namedtuple('Retry', ['producer_id'])
@@ -0,0 +1,75 @@
+from distributed_sales_system.product_register import ProductCatalog, product_register
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class OfferSnapshot(Mapping):
+    '''
+    A class representing immutable snapshot of producer's offer - products available in warehouse with their prices.
+
+    Snapshot is built by producer only when warehouse or prices change (see Warehouse.version) and the same
+    object is sent to every customer that asks for offer in the meantime, so browsing needs neither warehouse
+    lock nor allocation. Snapshot behaves like read-only dict mapping product ID to (amount, price) pair.
+    Discount is applied lazily - discounted view shares data with snapshot and multiplies prices when they are read.
+
+    ...
+
+    Attributes
+    ----------
+    version (int):
+            Version of warehouse the snapshot was built from.
+    discount_multiplier (float):
+            Multiplier applied to prices when they are read. 1.0 means no discount.
+    catalog (ProductCatalog):
+            Catalog that product IDs come from (used for product names).
+    __amounts (dict):
+            Product ID mapped to available amount. Products that are out of stock are not included.
+    __prices (dict):
+            Product ID mapped to price (without discount).
+    __discounted (OfferSnapshot | None):
+            Cached discounted view of this snapshot.
+    '''
+
+    __slots__ = ('version', 'discount_multiplier', 'catalog', '__amounts', '__prices', '__discounted')
+
+    def __init__(self, version: int, amounts: Dict[int, int], prices: Dict[int, float],
+                 discount_multiplier: float = 1.0, catalog: Optional[ProductCatalog] = None) -> None:
+        self.version = version
+        self.discount_multiplier = discount_multiplier
+        self.catalog = catalog if catalog is not None else product_register
+        self.__amounts = amounts
+        self.__prices = prices
+        self.__discounted = None
+
+    def __repr__(self) -> str:
+        return f"{dict(zip(self.catalog.names(self.__amounts), self.values()))}"
+
+    def __len__(self) -> int:
+        return len(self.__amounts)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.__amounts)
+
+    def __contains__(self, product_id) -> bool:
+        return product_id in self.__amounts
+
+    def __getitem__(self, product_id: int) -> Tuple[int, float]:
+        return self.__amounts[product_id], self.__prices[product_id] * self.discount_multiplier
+
+    def discounted(self, discount_multiplier: float) -> 'OfferSnapshot':
+        '''
+        Method returning view of the snapshot with prices reduced by discount multiplier.
+
+            Parameters:
+                    discount_multiplier (float): Multiplier applied to all prices. 1.0 means no discount.
+
+            Returns:
+                    View sharing data with this snapshot (the same view is returned for the same multiplier).
+        '''
+        if discount_multiplier == self.discount_multiplier:
+            return self
+        view = self.__discounted
+        if view is None or view.discount_multiplier != discount_multiplier:
+            view = OfferSnapshot(self.version, self.__amounts, self.__prices, discount_multiplier, self.catalog)
+            self.__discounted = view
+        return view
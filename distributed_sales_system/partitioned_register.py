@@ -0,0 +1,622 @@
+'''
+Partitioned directory of users and products - prototype of sharding user register across processes or hosts,
+used for measuring lookup scalability (see PartitionedRegisterTest). It isn't a replacement of UserRegister - Market
+always uses UserRegister, and agents need its watching, listeners, heartbeats and replicas.
+
+Register data is sharded across shard processes by consistent hashing - every user record lives on the shard owning
+its ID, every product's index (producers selling it) lives on the shard owning the product. Shards are served over
+local sockets (multiprocessing.connection), clients talk to all shards and send every lookup only to shards owning
+requested products (scatter-gather), so lookups are spread over shards and no shard is a single point of the whole
+register.
+
+Queues of agents can't cross process boundaries - shards keep only directory data (names, product lists, product
+index) and every client keeps queues of agents registered through it. Lookups therefore return queues only for
+producers of client's own process, IDs of all producers are available with producer_ids_with_products.
+'''
+
+from distributed_sales_system.lock_stats import make_lock
+from multiprocessing import get_context
+from multiprocessing.connection import Client, Connection, Listener
+from queue import Queue
+from threading import Thread
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+from hashlib import blake2b
+import bisect
+import os
+import shutil
+import tempfile
+import time
+
+
+class HashRing:
+    '''
+    A class representing consistent hashing ring - keys are mapped to nodes so that adding or removing node moves
+    only keys of its neighbourhood.
+
+    ...
+
+    Attributes
+    ----------
+    nodes (list):
+            Nodes (shard indexes) on ring.
+    virtual_nodes (int):
+            Number of points of every node on ring (more points - more even distribution of keys).
+    __points (list):
+            Sorted hashes of all points.
+    __owners (list):
+            Node owning point with the same index in __points.
+    '''
+
+    def __init__(self, nodes: Iterable[int], virtual_nodes: int = 64) -> None:
+        self.nodes = list(nodes)
+        if not self.nodes:
+            raise ValueError("HashRing: Ring has to have at least one node!")
+        self.virtual_nodes = virtual_nodes
+        points = sorted((self.__hash(f"{node}#{point}"), node)
+                        for node in self.nodes for point in range(virtual_nodes))
+        self.__points = [point for point, _ in points]
+        self.__owners = [node for _, node in points]
+
+    def node_for(self, key: Hashable) -> int:
+        '''
+        Method returning node owning key (first point clockwise from key's hash).
+
+            Parameters:
+                    key (hashable): Key, e.g. 'p3' for product 3 or 'u17' for user 17.
+
+            Returns:
+                    Node owning key.
+        '''
+        index = bisect.bisect(self.__points, self.__hash(str(key)))
+        return self.__owners[index % len(self.__owners)]
+
+    @staticmethod
+    def __hash(key: str) -> int:
+        '''
+        Inner function hashing key to point on ring (crc32 spreads similar short keys unevenly).
+        '''
+        return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class RegisterShard:
+    '''
+    A class representing one shard of partitioned register (run in shard process, see serve_shard).
+
+    ...
+
+    Attributes
+    ----------
+    index (int):
+            Index of shard.
+    shards (int):
+            Number of shards in cluster.
+    __users (dict):
+            User ID mapped to (kind, name, list of product IDs) for users owned by this shard.
+    __product_index (dict):
+            Product ID mapped to dict of IDs of producers selling it mapped to their names, for products owned by
+            this shard.
+    __next_block (int):
+            Number of next block of IDs allocated by this shard (blocks of shards are interleaved).
+    idBlockSize (int):
+            Class attribute, number of IDs allocated to client at once.
+    '''
+
+    idBlockSize = 1024
+
+    def __init__(self, index: int, shards: int) -> None:
+        self.index = index
+        self.shards = shards
+        self.__users: Dict[int, Tuple[str, str, List[int]]] = {}
+        self.__product_index: Dict[int, Dict[int, str]] = {}
+        self.__next_block = 0
+        self.__lock = make_lock(f"register_shard[{index}]")
+
+    def handle(self, request: tuple):
+        '''
+        Method executing request of client.
+
+            Parameters:
+                    request (tuple): Name of operation followed by its arguments.
+
+            Returns:
+                    Result of operation.
+
+            Raises:
+                    ValueError - unknown operation or incorrect ID.
+        '''
+        operation, *arguments = request
+        handler = self.__handlers.get(operation)
+        if handler is None:
+            raise ValueError(f"RegisterShard: Unknown operation {operation}!")
+        with self.__lock:
+            return handler(self, *arguments)
+
+    def __allocate(self) -> int:
+        '''
+        Inner function allocating block of IDs, returns its first ID.
+        '''
+        block = self.__next_block * self.shards + self.index
+        self.__next_block += 1
+        return block * self.idBlockSize
+
+    def __add_user(self, user_id: int, kind: str, name: str, products: List[int]) -> None:
+        '''
+        Inner function storing record of user.
+        '''
+        if user_id in self.__users:
+            raise ValueError("Incorrect ID - ID already in register")
+        self.__users[user_id] = (kind, name, list(products))
+
+    def __user(self, user_id: int) -> Optional[Tuple[str, str, List[int]]]:
+        '''
+        Inner function returning record of user or None.
+        '''
+        return self.__users.get(user_id)
+
+    def __delete_user(self, user_id: int) -> Tuple[str, str, List[int]]:
+        '''
+        Inner function removing record of user and returning it (client unindexes its products).
+        '''
+        if user_id not in self.__users:
+            raise ValueError("Incorrect ID - No such ID in register")
+        return self.__users.pop(user_id)
+
+    def __change_products(self, producer_id: int, added: List[int], removed: List[int]) -> None:
+        '''
+        Inner function updating product list of producer's record (one pass, also for large batches).
+        '''
+        kind, name, products = self.__users.get(producer_id, (None, None, None))
+        if kind != 'producer':
+            raise ValueError("Incorrect ID - No such producer in register")
+        present = set(products)
+        for product in added:
+            if product not in present:
+                present.add(product)
+                products.append(product)
+        if removed:
+            removed = set(removed)
+            products[:] = [product for product in products if product not in removed]
+
+    def __index(self, entries: List[Tuple[int, int, str]]) -> None:
+        '''
+        Inner function adding (product ID, producer ID, producer name) entries to product index.
+        '''
+        for product, producer_id, name in entries:
+            self.__product_index.setdefault(product, {})[producer_id] = name
+
+    def __unindex(self, entries: List[Tuple[int, int]]) -> None:
+        '''
+        Inner function removing (product ID, producer ID) entries from product index.
+        '''
+        for product, producer_id in entries:
+            producers = self.__product_index.get(product)
+            if producers is not None:
+                producers.pop(producer_id, None)
+                if not producers:
+                    del self.__product_index[product]
+
+    def __lookup(self, products: List[int]) -> Set[int]:
+        '''
+        Inner function returning IDs of producers selling at least one of products.
+        '''
+        producer_ids = set()
+        for product in products:
+            producer_ids.update(self.__product_index.get(product, ()))
+        return producer_ids
+
+    def __stats(self) -> Dict[str, int]:
+        '''
+        Inner function returning number of users and indexed products of shard.
+        '''
+        return {'users': len(self.__users), 'products': len(self.__product_index)}
+
+    __handlers = {'allocate': __allocate, 'add_user': __add_user, 'user': __user, 'delete_user': __delete_user,
+                  'change_products': __change_products, 'index': __index, 'unindex': __unindex,
+                  'lookup': __lookup, 'stats': __stats}
+
+
+def serve_shard(address: str, authkey: bytes, index: int, shards: int) -> None:
+    '''
+    Function representing shard process - serving requests of clients (thread per connection) until the process
+    is terminated (shard keeps its data only in memory).
+
+        Parameters:
+                address (str): Address of local socket.
+                authkey (bytes): Key authenticating clients.
+                index (int): Index of shard.
+                shards (int): Number of shards in cluster.
+
+        Returns:
+                None
+    '''
+    shard = RegisterShard(index, shards)
+    with Listener(address, authkey=authkey) as listener:
+        while True:
+            connection = listener.accept()
+            Thread(target=_serve_connection, args=(shard, connection), daemon=True).start()
+
+
+def _serve_connection(shard: RegisterShard, connection: Connection) -> None:
+    '''
+    Function representing connection thread of shard - replies are ('ok', result) or ('error', message).
+    '''
+    with connection:
+        while True:
+            try:
+                request = connection.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                reply = ('ok', shard.handle(request))
+            except ValueError as error:
+                reply = ('error', str(error))
+            connection.send(reply)
+
+
+class RegisterCluster:
+    '''
+    A class representing cluster of shard processes on local sockets. Used as context manager - shards are stopped
+    and sockets removed at exit.
+
+    ...
+
+    Attributes
+    ----------
+    shards (int):
+            Number of shards.
+    addresses (list):
+            Addresses of shards (to be passed to PartitionedRegister in any process).
+    authkey (bytes):
+            Key authenticating clients.
+    '''
+
+    def __init__(self, shards: int = 4) -> None:
+        if shards <= 0:
+            raise ValueError("RegisterCluster: Number of shards has to be greater than zero!")
+        self.shards = shards
+        self.authkey = os.urandom(16)
+        self.__directory = tempfile.mkdtemp(prefix="dss_register_")
+        self.addresses = [os.path.join(self.__directory, f"shard_{index}") for index in range(shards)]
+        context = get_context('spawn')
+        self.__processes = [context.Process(target=serve_shard, args=(address, self.authkey, index, shards),
+                                            name=f"register_shard_{index}", daemon=True)
+                            for index, address in enumerate(self.addresses)]
+        for process in self.__processes:
+            process.start()
+
+    def __enter__(self) -> 'RegisterCluster':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        '''
+        Method stopping shard processes (data of register is lost).
+
+            Returns:
+                    None
+        '''
+        for process in self.__processes:
+            process.terminate()
+        for process in self.__processes:
+            process.join()
+        shutil.rmtree(self.__directory, ignore_errors=True)
+
+
+def _connect(address: str, authkey: bytes, attempts: int = 100) -> Connection:
+    '''
+    Function connecting to shard, waiting for shard process that is still starting.
+    '''
+    for attempt in range(attempts):
+        try:
+            return Client(address, authkey=authkey)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.05)
+
+
+class PartitionedRegister:
+    '''
+    A class representing client of partitioned register backed by shards of RegisterCluster - lookup-only directory
+    client with registration and lookup methods named like in UserRegister. It doesn't implement watch, add_listener,
+    heartbeat or add_replica, so it can't serve as register of Market (producers, customers and health or replica
+    features rely on them). Every process (or thread that needs parallel lookups) uses its own client.
+
+    ...
+
+    Attributes
+    ----------
+    ring (HashRing):
+            Consistent hashing ring of shards.
+    __connections (list):
+            Connection to every shard.
+    __locks (list):
+            Lock of every connection (requests of threads sharing client are serialized per shard).
+    __endpoints (dict):
+            User ID mapped to its queues, for users registered through this client.
+    __ids (range):
+            Remaining IDs of block allocated to this client.
+    '''
+
+    def __init__(self, addresses: List[str], authkey: bytes) -> None:
+        self.ring = HashRing(range(len(addresses)))
+        self.__connections = [_connect(address, authkey) for address in addresses]
+        self.__locks = [make_lock(f"register_client[{index}]") for index in range(len(addresses))]
+        self.__endpoints: Dict[int, list] = {}
+        self.__ids = iter(())
+        self.__allocation_shard = os.getpid() % len(addresses)
+        self.__lock = make_lock("register_client")
+
+    def __enter__(self) -> 'PartitionedRegister':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        '''
+        Method closing connections to shards (registered users stay in register).
+
+            Returns:
+                    None
+        '''
+        for connection in self.__connections:
+            connection.close()
+
+    def add_customer(self, customer_name: str, offer_queue: Optional[Queue]) -> int:
+        '''
+        Interface for customer - function used for assigning ID and adding new customer to register.
+
+            Parameters:
+                customer_name (str): Name of customer.
+                offer_queue (Queue): Queue where producers will list their offers.
+
+            Returns:
+                customer_id (int): ID assigned for new customer.
+        '''
+        customer_id = self.__next_id()
+        self.__call(self.__user_shard(customer_id), 'add_user', customer_id, 'customer', customer_name, [])
+        self.__endpoints[customer_id] = [offer_queue]
+        return customer_id
+
+    def add_producer(self, producer_name: str, producer_product_list: List[int], producer_request_queue: Optional[Queue],
+                     producer_order_queue: Optional[Queue]) -> int:
+        '''
+        Interface for producer - function used for assigning ID and adding new producer to register. Producer's
+        record goes to shard owning its ID, its products are indexed by shards owning them.
+
+            Parameters:
+                producer_name (str): Name of producer.
+                producer_product_list (list): List containing IDs (int) of products that producer is selling.
+                producer_request_queue (Queue): Queue where producer receives offer requests.
+                producer_order_queue (Queue): Queue where producer receives orders.
+
+            Returns:
+                producer_id (int): ID assigned for new producer.
+        '''
+        producer_id = self.__next_id()
+        self.__call(self.__user_shard(producer_id), 'add_user', producer_id, 'producer', producer_name,
+                    list(producer_product_list))
+        self.__scatter('index', {shard: [(product, producer_id, producer_name) for product in products]
+                                 for shard, products in self.__product_shards(producer_product_list).items()})
+        self.__endpoints[producer_id] = [producer_request_queue, producer_order_queue]
+        return producer_id
+
+    def add_producer_product(self, producer_id: int, product: int) -> None:
+        '''
+        Interface for producer - function used for adding product to producer's offer.
+
+            Parameters:
+                producer_id (int): Producer ID.
+                product (int): ID of product.
+
+            Returns:
+                None
+        '''
+        self.__call(self.__user_shard(producer_id), 'change_products', producer_id, [product], [])
+        _, name, _ = self.__call(self.__user_shard(producer_id), 'user', producer_id)
+        self.__call(self.__product_shard(product), 'index', [(product, producer_id, name)])
+
+    def remove_producer_product(self, producer_id: int, product: int) -> None:
+        '''
+        Interface for producer - function used for removing product from producer's offer.
+
+            Parameters:
+                producer_id (int): Producer ID.
+                product (int): ID of product.
+
+            Returns:
+                None
+        '''
+        self.__call(self.__user_shard(producer_id), 'change_products', producer_id, [], [product])
+        self.__call(self.__product_shard(product), 'unindex', [(product, producer_id)])
+
+    def add_producer_products(self, producer_id: int, products: Iterable[int]) -> None:
+        '''
+        Interface for producer - bulk version of add_producer_product, every shard is contacted once per batch.
+
+            Parameters:
+                producer_id (int): Producer ID.
+                products (iterable): IDs of products.
+
+            Returns:
+                None
+        '''
+        products = list(products)
+        self.__call(self.__user_shard(producer_id), 'change_products', producer_id, products, [])
+        _, name, _ = self.__call(self.__user_shard(producer_id), 'user', producer_id)
+        self.__scatter('index', {shard: [(product, producer_id, name) for product in shard_products]
+                                 for shard, shard_products in self.__product_shards(products).items()})
+
+    def remove_producer_products(self, producer_id: int, products: Iterable[int]) -> None:
+        '''
+        Interface for producer - bulk version of remove_producer_product, every shard is contacted once per batch.
+
+            Parameters:
+                producer_id (int): Producer ID.
+                products (iterable): IDs of products.
+
+            Returns:
+                None
+        '''
+        products = list(products)
+        self.__call(self.__user_shard(producer_id), 'change_products', producer_id, [], products)
+        self.__scatter('unindex', {shard: [(product, producer_id) for product in shard_products]
+                                   for shard, shard_products in self.__product_shards(products).items()})
+
+    def delete_user(self, user_id: int) -> None:
+        '''
+        Interface for users - function used for removing user from register.
+
+            Parameters:
+                user_id (int): User ID.
+
+            Returns:
+                None
+
+            Raises:
+                ValueError - Incorrect ID.
+        '''
+        kind, _, products = self.__call(self.__user_shard(user_id), 'delete_user', user_id)
+        if kind == 'producer':
+            self.__scatter('unindex', {shard: [(product, user_id) for product in shard_products]
+                                       for shard, shard_products in self.__product_shards(products).items()})
+        self.__endpoints.pop(user_id, None)
+
+    def check_customer_id(self, customer_id: int):
+        '''
+        Interface for producers - function used for checking if ID belongs to customer.
+
+            Parameters:
+                customer_id (int): ID that will be checked.
+
+            Returns:
+                Name of customer or False if ID doesn't belong to customer.
+        '''
+        record = self.__call(self.__user_shard(customer_id), 'user', customer_id)
+        return record[1] if record is not None and record[0] == 'customer' else False
+
+    def producer_ids_with_products(self, products_list: Iterable[int]) -> Set[int]:
+        '''
+        Interface for customers - function used for finding IDs of all producers (of any process) that sell at
+        least one of products. Only shards owning requested products are asked, all at once.
+
+            Parameters:
+                products_list (iterable): IDs of products (int) that customer want to buy.
+
+            Returns:
+                Set of producer IDs.
+        '''
+        producer_ids = set()
+        for shard_ids in self.__scatter('lookup', self.__product_shards(products_list)).values():
+            producer_ids.update(shard_ids)
+        return producer_ids
+
+    def producer_with_products(self, products_list: Iterable[int], customer_id: Optional[int] = None) -> Dict[int, List[Queue]]:
+        '''
+        Interface for customers - function used for finding producers that meet customer requirements (in terms
+        of products), as UserRegister.producer_with_products. Only producers registered through this client can be
+        reached by queues, others are left out (see producer_ids_with_products).
+
+            Parameters:
+                products_list (iterable): IDs of products (int) that customer want to buy.
+                customer_id (int): ID of customer (unused, kept for compatibility with UserRegister).
+
+            Returns:
+                possible_producers (dict): Dictionary mapping id of producers to their request and order queues.
+        '''
+        return {producer_id: self.__endpoints[producer_id]
+                for producer_id in self.producer_ids_with_products(products_list) if producer_id in self.__endpoints}
+
+    def product_shards(self, products: Iterable[int]) -> Dict[int, List[int]]:
+        '''
+        Interface for monitoring and benchmarks - function grouping products by shards owning their index (lookup
+        of products of one group is answered by one shard).
+
+            Parameters:
+                products (iterable): IDs of products.
+
+            Returns:
+                Shard index mapped to list of its products.
+        '''
+        return self.__product_shards(products)
+
+    def stats(self) -> List[Dict[str, int]]:
+        '''
+        Interface for monitoring - function returning number of users and indexed products of every shard.
+
+            Returns:
+                List of shard statistics.
+        '''
+        return [self.__call(shard, 'stats') for shard in range(len(self.__connections))]
+
+    def __next_id(self) -> int:
+        '''
+        Inner function returning unused ID - IDs are taken from blocks allocated by shards, so clients don't
+        coordinate on every registration.
+        '''
+        with self.__lock:
+            user_id = next(self.__ids, None)
+            if user_id is None:
+                start = self.__call(self.__allocation_shard, 'allocate')
+                self.__ids = iter(range(start, start + RegisterShard.idBlockSize))
+                user_id = next(self.__ids)
+            return user_id
+
+    def __user_shard(self, user_id: int) -> int:
+        '''
+        Inner function returning shard owning user record.
+        '''
+        return self.ring.node_for(f"u{user_id}")
+
+    def __product_shard(self, product: int) -> int:
+        '''
+        Inner function returning shard owning product index.
+        '''
+        return self.ring.node_for(f"p{product}")
+
+    def __product_shards(self, products: Iterable[int]) -> Dict[int, List[int]]:
+        '''
+        Inner function grouping products by shards owning them.
+        '''
+        shards: Dict[int, List[int]] = {}
+        for product in products:
+            shards.setdefault(self.__product_shard(product), []).append(product)
+        return shards
+
+    def __call(self, shard: int, operation: str, *arguments):
+        '''
+        Inner function sending request to shard and waiting for result.
+        '''
+        with self.__locks[shard]:
+            self.__connections[shard].send((operation, *arguments))
+            return self.__result(self.__connections[shard].recv())
+
+    def __scatter(self, operation: str, arguments: Dict[int, object]) -> Dict[int, object]:
+        '''
+        Inner function sending request with one argument (per shard) to all given shards first and then collecting
+        their results, so shards work in parallel. Locks are taken in shard order.
+        '''
+        shards = sorted(arguments)
+        for shard in shards:
+            self.__locks[shard].acquire()
+        try:
+            for shard in shards:
+                self.__connections[shard].send((operation, arguments[shard]))
+            replies = {shard: self.__connections[shard].recv() for shard in shards}
+        finally:
+            for shard in shards:
+                self.__locks[shard].release()
+        return {shard: self.__result(reply) for shard, reply in replies.items()}
+
+    @staticmethod
+    def __result(reply: Tuple[str, object]):
+        '''
+        Inner function unpacking reply of shard (errors are raised as ValueError like in UserRegister).
+        '''
+        status, result = reply
+        if status == 'error':
+            raise ValueError(result)
+        return result
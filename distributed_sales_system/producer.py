@@ -1,13 +1,67 @@
-from typing import List, Dict, Union, Optional, Tuple
+from typing import Callable, Iterable, List, Dict, Union, Optional, Tuple
 from distributed_sales_system.warehouse import Warehouse
-from distributed_sales_system import global_user_register, logging, stop_producer
-from distributed_sales_system.product_register import product_register
+from distributed_sales_system import default_market, logging
+from distributed_sales_system.market import Market
 from distributed_sales_system.product_generator import Generator
-from threading import Thread, Lock
-from queue import Queue
+from distributed_sales_system.sales_ledger import SalesLedger
+from distributed_sales_system.loyalty_ledger import LoyaltyLedger
+from distributed_sales_system.messages import Offer, OrderStatus, Busy, Vote, Ack, Closed, PrepareRequest, Decision
+from distributed_sales_system.offer_snapshot import OfferSnapshot
+from distributed_sales_system.profiling import profiled
+from distributed_sales_system.lock_stats import make_lock, make_rlock
+from distributed_sales_system.market_board import MarketBoard
+from distributed_sales_system.exchange import Exchange
+from distributed_sales_system.replenishment import ReplenishmentController
+from distributed_sales_system import traffic_log
+from threading import Thread, Event, Lock
+from weakref import WeakSet
+from queue import Queue, Full, Empty
+from collections import deque
 import time
 
 
+class SignalingQueue(Queue):
+    '''
+    A class representing queue that sets event whenever item is put into it, so one consumer can wait for items
+    of several queues at once (producer thread waits for orders and offer requests together).
+
+    ...
+
+    Attributes
+    ----------
+    signal (Event):
+            Event set after every put. Consumer clears it before it checks queues, so no item is missed.
+    refuse (callable | None):
+            Function called (in putting thread) with every item put after queue was closed, None while queue is open.
+    '''
+
+    def __init__(self, signal: Event, maxsize: int = 0) -> None:
+        super().__init__(maxsize)
+        self.signal = signal
+        self.refuse: Optional[Callable[[tuple], None]] = None
+
+    def close(self, refuse: Callable[[tuple], None]) -> None:
+        '''
+        Method closing queue - items put afterwards aren't stored, refuse is called with them instead. Items already
+        in queue stay there.
+
+            Parameters:
+                    refuse (callable): Function called with every refused item.
+
+            Returns:
+                    None
+        '''
+        with self.mutex:
+            self.refuse = refuse
+
+    def _put(self, item) -> None:
+        if self.refuse is not None:
+            self.refuse(item)
+            return
+        super()._put(item)
+        self.signal.set()
+
+
 class Producer(Thread):
     '''
     A class to represent producer.
@@ -17,149 +71,902 @@ class Producer(Thread):
     Attributes
     ----------
     name (str):
-            Name of the producer. Used mostly for communication with global user register
+            Name of the producer. Used mostly for communication with market's user register
     products (dict):
-            Dictionary mapping product name to its price.
+            Dictionary mapping product ID (from product catalog) to its price.
     warehouse (Warehouse):
             Warehouse instance for this producer. Manages products. Producer can only have one warehouse.
     product_generator (Generator):
             Generator instance for this producer. Generates products. Producer can only have one generator.
     id (int):
-            Id of the producer in global user register.
-    customer_register (dict):
+            Id of the producer in market's user register.
+    market (Market):
+            Market the producer is bound to - its register, product catalog, clock and stop signal (shared with
+            replicas).
+    customer_register (LoyaltyLedger):
             Stores customer id and keeps track of total amount of cash that he spent. Used for discounts.
+    sales_ledger (SalesLedger | None):
+            Ledger where every handled order is recorded. Can be shared between producers. None disables recording.
+    shed_threshold (int | None):
+            Number of orders waiting in order queue above which offer requests are answered with Busy reply
+            instead of offer (orders are favored over browsing). None disables load shedding.
+    workers (int):
+            Number of worker threads serving offer requests concurrently (pool mode). 0 means that requests and
+            orders are served by producer thread alone.
+    replica_of (Producer | None):
+            Primary producer whose warehouse this producer serves, None if producer is primary itself.
+    market_board (MarketBoard | None):
+            Board where producer publishes its offer on every warehouse change, so customers can read it without
+            messaging. Only primary producer publishes (customers routed to replica ask it for offer).
+    exchange (Exchange | None):
+            Exchange where producer posts asks (stock and price of every product) and settles bids matched with them.
+            Only primary producer trades on exchange (replicas share its warehouse).
+    scheduling (str):
+            Policy of choosing between waiting order and offer request when producer thread serves both (workers = 0,
+            in pool mode orders have producer thread for themselves), one of scheduling_policies:
+            - 'round_robin' - orders and requests take turns,
+            - 'weighted' - weighted fair queuing, up to orderWeight orders are served per one request,
+            - 'order_priority' - strict priority, requests are served only when no order waits,
+            - 'edf' - earliest deadline first, deadline is time of sending plus SLO of message class (orderSlo or
+              requestSlo).
+            Orders include messages of two-phase commit.
+    slo_stats (dict):
+            Message class ('order' or 'request') mapped to [number of handled messages, number of messages that waited
+            in queue longer than SLO of the class]. Only messages with time of sending are counted.
+    replenishment (ReplenishmentController | None):
+            Controller adjusting production rates to observed demand (shared with replicas), None if production
+            follows static create time and amount.
+    __board_row (int | None):
+            Row of market board assigned to producer, None until first publication.
+    __replicas (WeakSet):
+            Replicas of this producer (empty for replica), closed together with it.
+    __closed (Event):
+            Set when producer left the market (see close). Producer threads end like after market's stop event.
+    __close_lock (Lock):
+            Lock serializing close, so producer leaves the market only once even if closed by several threads.
+    __shut_down_claim (Lock):
+            One-shot lock taken (never released) by thread draining queues, so queues are drained only once.
+    __drain_deadline (float | None):
+            Time (market clock) until which orders received before closing are still settled, set when producer
+            is closed or its market stops.
+    __generator_thread (Thread | None):
+            Thread running generator of primary producer, None until producer starts.
+    __reservations (dict):
+            (customer ID, transaction ID) mapped to (order, deadline, customer name) - goods reserved by prepared transactions
+            (two-phase commit), taken out of warehouse until customer's decision. Producer voted ready, so it never
+            aborts on its own while customer may still decide - only reservation of customer that left the register
+            is released after deadline (presumed abort). Used by producer thread only.
+    __orphaned (set):
+            Keys of reservations whose customer left the register - released after deadline even if customer's ID
+            is given to new customer meanwhile. Used by producer thread only.
+    __departed (deque):
+            IDs of customers that left the register (see forget), not yet processed by producer thread. Filled only
+            after producer prepared its first transaction.
+    __offer (OfferSnapshot):
+            Snapshot of available products and prices sent to customers, rebuilt when warehouse version changes.
     defaultPrice (int):
             Class attribute, default price assigned to product in not specified
+    discountMultiplier (float):
+            Class attribute, multiplier applied to prices for customers that spent more than discountThreshold.
+    loyaltyCapacity (int):
+            Class attribute, maximum number of customers below discountThreshold whose spendings are tracked.
+    busyRetryAfter (float):
+            Class attribute, time (in seconds) after which customer should retry request answered with Busy reply.
+    pollTimeout (float):
+            Class attribute, how long (in seconds) threads in pool mode wait for message before checking stop event.
+    orderWeight (int):
+            Class attribute, number of orders served per one offer request in weighted scheduling.
+    orderSlo (float):
+            Class attribute, target time (in seconds) order waits in queue before it is handled.
+    requestSlo (float):
+            Class attribute, target time (in seconds) offer request waits in queue before it is handled.
+    reservationTimeout (float):
+            Class attribute, time (in seconds) after which reservation without decision is released, if its customer
+            left the register meanwhile.
+    drainTimeout (float):
+            Class attribute, time (in seconds) producer settles orders already in its queue after closing (or after
+            its market stops), messages left afterwards are answered with Closed reply (decisions are still applied).
+    heartbeatInterval (float):
+            Class attribute, time (in seconds) between heartbeats sent to market's user register (see
+            UserRegister.heartbeat). It has to be shorter than UserRegister.heartbeatTimeout.
     '''
 
     defaultPrice = 1.0
     discountThreshold = 50.0
+    discountMultiplier = 0.95
+    loyaltyCapacity = 10000
+    busyRetryAfter = 0.05
+    pollTimeout = 0.1
+    heartbeatInterval = 0.5
+    reservationTimeout = 30.0
+    drainTimeout = 1.0
+    orderWeight = 4
+    orderSlo = 0.05
+    requestSlo = 0.5
+    scheduling_policies = ('round_robin', 'weighted', 'order_priority', 'edf')
+
+    def __init__(self, name: str, products: Union[List[str], Dict[str, Dict[str, Union[float, int]]], None] = None,
+                 sales_ledger: Optional[SalesLedger] = None, request_queue_size: int = 0, order_queue_size: int = 0,
+                 shed_threshold: Optional[int] = None, workers: int = 0, replica_of: Optional['Producer'] = None,
+                 register: bool = True, market_board: Optional[MarketBoard] = None,
+                 exchange: Optional[Exchange] = None, replenishment_period: Optional[float] = None,
+                 market: Optional[Market] = None, scheduling: str = 'round_robin') -> None:
+        '''
+        Constructor of the producer. Producer is registered in market's user register with its products and stays
+        there until close is called (or producer is used as context manager), or until it is garbage collected.
+        Replica (replica_of passed) shares products, warehouse, generator, lock, discounts and sales ledger with its
+        primary producer - it is just another frontend with own queues, so products shouldn't be passed.
 
-    def __init__(self, name: str, products: Union[List[str], Dict[str, Dict[str, Union[float, int]]]]) -> None:
+            Parameters:
+                    name (str): Name of the producer.
+                    products (list | dict): Names of products or dict mapping names to their parameters.
+                    sales_ledger (SalesLedger): Ledger for recording orders (optional).
+                    request_queue_size (int): Maximum number of waiting offer requests, 0 means unbounded.
+                    order_queue_size (int): Maximum number of waiting orders, 0 means unbounded.
+                    shed_threshold (int): Order queue depth above which offer requests are shed (optional).
+                    workers (int): Number of worker threads serving offer requests, 0 disables pool mode.
+                    replica_of (Producer): Primary producer, if this producer is its replica.
+                    register (bool): If False, producer isn't registered in market's user register (its id is None)
+                                     and has to be registered in bulk (see UserRegister.add_producers).
+                    market_board (MarketBoard): Board for publishing offer (optional, ignored for replica).
+                    exchange (Exchange): Exchange for posting asks (optional, ignored for replica).
+                    replenishment_period (float): Time (in seconds) between adjustments of production rates to demand
+                                                  (optional, ignored for replica). None keeps static production.
+                    market (Market): Market of the producer (optional, default market of the package if not passed,
+                                     market of primary producer for replica).
+                    scheduling (str): Policy of choosing between orders and offer requests (see scheduling attribute).
+        '''
+        if replica_of is not None and market is not None and market is not replica_of.market:
+            raise ValueError("Producer: Replica has to be in the market of its primary producer!")
+        if scheduling not in self.scheduling_policies:
+            raise ValueError(f"Producer: Scheduling has to be one of {self.scheduling_policies}!")
         super().__init__()
         self.name = name
-        self.products = self.__add_products(products)
-        self.warehouse = Warehouse(products)
-        self.product_generator = Generator(products)
-        self.order_queue = Queue()
-        self.request_queue = Queue()
-        self.warehouse_lock = Lock()
-        self.id = global_user_register.add_producer(
-            self.name, list(self.products.keys()), self.request_queue, self.order_queue)
-        self.customer_register = {}
+        self.market = market if market is not None else replica_of.market if replica_of is not None else default_market
+        self.__work = Event()
+        self.order_queue = SignalingQueue(self.__work, maxsize=order_queue_size)
+        self.request_queue = SignalingQueue(self.__work, maxsize=request_queue_size)
+        self.scheduling = scheduling
+        self.slo_stats = {'order': [0, 0], 'request': [0, 0]}
+        self.__slo_lock = make_lock(f"slo_lock[{name}]")
+        self.__orders_in_row = 0
+        self.shed_threshold = shed_threshold
+        if workers < 0:
+            raise ValueError("Producer: Number of workers cannot be less than zero!")
+        self.workers = workers
+        self.replica_of = replica_of
+        self.__replicas = WeakSet()
+        self.__closed = Event()
+        self.__close_lock = make_lock(f"close_lock[{name}]")
+        self.__shut_down_claim = Lock()
+        self.__drain_deadline: Optional[float] = None
+        self.__generator_thread: Optional[Thread] = None
+        self.__offer = OfferSnapshot(-1, {}, {}, catalog=self.market.catalog)
+        self.__next_heartbeat = 0.0
+        self.__reservations: Dict[Tuple[int, int], Tuple[Dict[int, int], float, Optional[str]]] = {}
+        self.__orphaned = set()
+        self.__departed = None
+        self.market_board = market_board if replica_of is None else None
+        self.exchange = exchange if replica_of is None else None
+        self.__board_row = None
+        self.__board_lock = make_lock(f"board_lock[{name}]")
+        if replica_of is None:
+            if products is None:
+                raise ValueError("Producer: Products have to be passed!")
+            products = self.__resolve_product_ids(products)
+            self.products = self.__add_products(products)
+            self.warehouse = Warehouse(products, self.market.catalog)
+            self.warehouse_lock = make_rlock(f"warehouse_lock[{name}]")
+            self.product_generator = Generator(products, lock=self.warehouse_lock)
+            self.replenishment = ReplenishmentController(self.product_generator, self.warehouse, replenishment_period) \
+                if replenishment_period is not None else None
+            self.id = self.market.register.add_producer(
+                self.name, list(self.products.keys()), self.request_queue, self.order_queue) if register else None
+            self.customer_register = LoyaltyLedger(self.discountThreshold, self.loyaltyCapacity)
+            self.sales_ledger = sales_ledger
+            # spendings of customers that left the market aren't inherited by new customers with the same ID
+            self.market.register.add_listener(self.customer_register)
+        else:
+            if products is not None:
+                raise ValueError("Producer: Replica sells products of its primary producer!")
+            if replica_of.replica_of is not None:
+                raise ValueError("Producer: Cannot create replica of replica!")
+            if not register:
+                raise ValueError("Producer: Replica has to be registered with its primary producer!")
+            self.products = replica_of.products
+            self.warehouse = replica_of.warehouse
+            self.product_generator = replica_of.product_generator
+            self.warehouse_lock = replica_of.warehouse_lock
+            self.replenishment = replica_of.replenishment
+            self.id = self.market.register.add_replica(replica_of.id, self.name, self.request_queue, self.order_queue)
+            self.customer_register = replica_of.customer_register
+            self.sales_ledger = replica_of.sales_ledger
+            replica_of.__replicas.add(self)
+        if self.id is not None:
+            self.market.register.watch(self.id, self)
+        self.market.producers.add(self)
+        if self.market_board is not None or self.exchange is not None:
+            self.warehouse.on_change = self.__warehouse_changed
+        if self.market_board is not None:
+            # row of producer that leaves without releasing it is freed before its ID is reused
+            self.market.register.add_listener(self.market_board, producers=True)
+            self.__publish()
+        if self.exchange is not None:
+            self.__join_exchange()
 
     def __repr__(self) -> str:
         return f"{self.products}"
 
+    def __enter__(self) -> 'Producer':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        return self.__closed.is_set()
+
+    def close(self, drain_timeout: Optional[float] = None) -> None:
+        '''
+        Method for leaving the market - producer (for primary producer also all its replicas) is removed from
+        market's user register at once, so no new customer finds it. Orders already in its queue are settled within
+        drain_timeout, remaining messages are answered with Closed reply (so no customer waits for timeout), then
+        producer threads end and generation stops. Draining is done by producer thread - or by caller, if producer
+        thread isn't running. Calling close more than once (also concurrently) has no effect.
+
+            Parameters:
+                drain_timeout (float): Time (in seconds) for settling waiting orders, drainTimeout if not passed.
+
+            Returns:
+                None
+        '''
+        with self.__close_lock:
+            if self.__closed.is_set():
+                return
+            self.__drain_deadline = self.market.clock() + \
+                (self.drainTimeout if drain_timeout is None else drain_timeout)
+            for replica in list(self.__replicas):
+                replica.close(drain_timeout)
+            self.__closed.set()
+            self.__work.set()
+            # row is released before ID is freed - new producer with the same ID mustn't find it
+            if self.__board_row is not None:
+                with self.__board_lock:
+                    self.market_board.release(self.__board_row, self.id)
+                    self.__board_row = None
+            if self.id is not None:
+                try:
+                    self.market.register.delete_user(self.id)
+                except ValueError:
+                    # ID could be already removed by someone else (e.g. by market tearing register down)
+                    logging.debug(f"{self.name} already removed from register")
+            if self.exchange is not None and self.id is not None:
+                self.exchange.remove_producer(self.id)
+        if not self.is_alive():
+            self.__shut_down()
+        logging.debug(f"{self.name} closed")
+
+    @profiled('producer')
     def run(self) -> None:
         '''
         Method represents producer execution. It includes:
-        - starting daemon thread for generation of products. It runs when request and order queues are empty.
-        - handling of customers requests for offered products
-        - handling of customers orders
+        - starting daemon thread for generation of products (only primary producer, replicas share its warehouse).
+        - handling of customers requests for offered products (shed with Busy reply when orders are piling up),
+          in pool mode by separate worker threads, otherwise interleaved with orders by scheduling policy
+        - handling of customers orders (also prepared and committed in two phases, see PrepareRequest)
+        - sending heartbeats (liveness and queue depth) to market's user register
 
-        Producer works until global stop_producer event is set. Usually this event is set after customers threads end.
-        If stop_producer event is not set then thread won't terminate!
+        Producer works until stop event of its market is set or producer is closed. Usually this event is set after
+        customers threads end. If stop event is not set and producer isn't closed then thread won't terminate!
+        Afterwards producer leaves the market and drains its queues (see close).
 
             Returns:
                 None
 
         '''
-        generator = Thread(target=self.generate_products, name=self.name + "_generator", daemon=True)
-        generator.start()
-        while not stop_producer.is_set():
-            if not self.order_queue.empty():
-                customer_id, order, customer_reply = self.order_queue.get()
-                logging.debug(f"order is {order}")
-                with self.warehouse_lock:
-                    order_completed = self.create_order(order)
-                # send back to customer
-                customer_reply.put_nowait(order_completed)
-                
-                if order_completed:
-                    customer_name = global_user_register.check_customer_id(customer_id)
-                    # sum customer spendings only up to discount threshold, after that we always give him 5% discount
-                    if customer_name not in self.customer_register.keys():
-                        self.customer_register[customer_name] = sum((order[name] * self.products[name] for name in order))
-                    elif self.customer_register[customer_name] <= self.discountThreshold:
-                        self.customer_register[customer_name] += sum((order[name] * self.products[name] for name in order))
-            if not self.request_queue.empty():
-                logging.debug(f"queue: {list(self.request_queue.queue)}")
-                customer_id, requested_products, customer_queue = self.request_queue.get()
-                customer_name = global_user_register.check_customer_id(customer_id)
-                if customer_name:
-                    if customer_name in self.customer_register.keys() and self.customer_register[customer_name] > self.discountThreshold:
-                        with self.warehouse_lock:
-                            products_info = self.display_products(requested_products, discount_multiplier=0.95)
-                            logging.debug(f"{customer_name} got discount!")
-                    else:
-                        with self.warehouse_lock:
-                            products_info = self.display_products(requested_products)
-                    customer_queue.put_nowait(products_info)
+        if self.replica_of is None:
+            self.__generator_thread = Thread(target=self.generate_products, name=self.name + "_generator",
+                                             daemon=True)
+            self.__generator_thread.start()
+        if self.market_board is not None:
+            self.__publish()
+        if self.exchange is not None:
+            self.__join_exchange()
+        if self.workers:
+            self.__run_pool()
+        else:
+            while self.__running():
+                self.__heartbeat()
+                if self.__reservations or self.__departed:
+                    self.__expire_reservations()
+                # cleared before queues are checked - message put afterwards sets it again
+                self.__work.clear()
+                is_order, message = self.__next_message()
+                if message is None:
+                    self.__work.wait(self.pollTimeout)
+                elif is_order:
+                    self.__handle_order(message)
                 else:
-                    logging.debug("Request not from customer")
-                # self.generate_products()
-            # logging.debug(f"{self.name} warehouse: {self.warehouse.products}")
-            # time.sleep(1)
-
+                    self.__handle_request(message)
+        self.close()
+        self.__shut_down()
         logging.debug("is done")
 
+    def __shut_down(self) -> None:
+        '''
+        Inner function draining queues of closed producer (only once - by producer thread, or by closing thread
+        if producer thread isn't running, later calls return at once) and stopping generation. Orders (and decisions of prepared transactions)
+        are settled until drain deadline, then queues are closed (messages put later are answered with Closed reply
+        at once) and every waiting message is answered with Closed reply - except decisions, which are still applied.
+        Reservations still without decision stay in doubt (goods aren't returned, customer may have committed them),
+        like after crash of participant of two-phase commit.
+
+            Returns:
+                None
+        '''
+        if not self.__shut_down_claim.acquire(blocking=False):
+            return
+        while self.market.clock() < self.__drain_deadline:
+            try:
+                # decisions of prepared transactions are awaited, otherwise only orders already queued are settled
+                message = self.order_queue.get(timeout=self.pollTimeout) if self.__reservations \
+                    else self.order_queue.get_nowait()
+            except Empty:
+                if self.__reservations:
+                    continue
+                break
+            self.__handle_order(message)
+        refused = 0
+        for queue in (self.order_queue, self.request_queue):
+            # closed first - nothing put meanwhile is left in queue unanswered
+            queue.close(self.__refuse)
+            while True:
+                try:
+                    message = queue.get_nowait()
+                except Empty:
+                    break
+                if isinstance(message, Decision):
+                    self.__decide(message)
+                    continue
+                self.__refuse(message)
+                refused += 1
+        if self.__reservations:
+            logging.debug(f"{self.name} closed with transactions in doubt: {list(self.__reservations)}")
+        if self.replica_of is None:
+            self.product_generator.stop()
+            if self.__generator_thread is not None:
+                self.__generator_thread.join()
+        logging.debug(f"{self.name} drained, {refused} messages refused")
+
+    def __refuse(self, message) -> None:
+        '''
+        Inner function answering message that closed producer won't handle with Closed reply (decision put after
+        queues were closed is refused too - its transaction stays in doubt). Called also by threads putting messages
+        into closed queues.
+
+            Parameters:
+                    message (namedtuple): Message from customer.
+
+            Returns:
+                    None
+        '''
+        reply_queue = getattr(message, 'reply_queue', None)
+        if reply_queue is not None:
+            self.__reply(reply_queue, Closed(self.id))
+
+    def __run_pool(self) -> None:
+        '''
+        Inner function used in pool mode (workers > 0). Offer requests are served concurrently by worker threads,
+        while orders are settled only by this (producer) thread, so warehouse has exactly one writer.
+
+            Returns:
+                None
+        '''
+        pool = [Thread(target=self.__serve_requests, name=f"{self.name}_worker_{i}", daemon=True)
+                for i in range(self.workers)]
+        for worker in pool:
+            worker.start()
+        while self.__running():
+            self.__heartbeat()
+            if self.__reservations or self.__departed:
+                self.__expire_reservations()
+            try:
+                message = self.order_queue.get(timeout=self.pollTimeout)
+            except Empty:
+                continue
+            self.__handle_order(message)
+        for worker in pool:
+            worker.join()
+
+    @profiled('producer_worker')
+    def __serve_requests(self) -> None:
+        '''
+        Inner function representing worker thread execution in pool mode - handling of offer requests.
+
+            Returns:
+                None
+        '''
+        while self.__running():
+            try:
+                message = self.request_queue.get(timeout=self.pollTimeout)
+            except Empty:
+                continue
+            self.__handle_request(message)
+
+    def __warehouse_changed(self, product_id: int) -> None:
+        '''
+        Inner function called by warehouse after every change - it refreshes offer on market board and ask
+        of changed product on exchange.
+
+            Parameters:
+                    product_id (int): ID of changed product.
+
+            Returns:
+                None
+        '''
+        if self.market_board is not None:
+            self.__publish()
+        if self.exchange is not None:
+            self.__post_ask(product_id)
+
+    def __join_exchange(self) -> None:
+        '''
+        Inner function adding producer to exchange and posting asks of all its products. Posting the same asks
+        again (when producer starts) doesn't change their priority.
+
+            Returns:
+                None
+        '''
+        if self.id is None or self.__closed.is_set():
+            return
+        self.exchange.add_producer(self.id, self.__settle)
+        for product_id in list(self.products):
+            self.__post_ask(product_id)
+
+    def __post_ask(self, product_id: int) -> None:
+        '''
+        Inner function posting current stock and price of product to exchange (amount 0 cancels ask).
+
+            Parameters:
+                    product_id (int): ID of product.
+
+            Returns:
+                None
+        '''
+        if self.id is None or self.__closed.is_set():
+            return
+        price = self.products.get(product_id)
+        product = self.warehouse.products.get(product_id)
+        amount = product.amount if product is not None and price is not None else 0
+        self.exchange.post_ask(self.id, product_id, amount, price or 0.0)
+
+    def __settle(self, customer_id: int, product_id: int, amount: int, price: float) -> Tuple[int, int]:
+        '''
+        Inner function used by exchange for delivering goods of matched bid. Warehouse decides - if it holds less
+        than matched amount (ask was stale), only available amount is delivered.
+
+            Parameters:
+                    customer_id (int): ID of customer.
+                    product_id (int): ID of product.
+                    amount (int): Matched amount.
+                    price (float): Matched price per unit (price of producer's ask).
+
+            Returns:
+                    (delivered amount, amount left in warehouse)
+        '''
+        if self.__closed.is_set():
+            return 0, 0
+        with self.warehouse_lock:
+            available = self.check_warehouse(product_id) or 0
+            delivered = min(amount, available)
+            if delivered:
+                self.warehouse.decrease_amount(product_id, delivered)
+        if self.replenishment is not None:
+            self.replenishment.record_order({product_id: amount},
+                                            {product_id: amount - delivered} if delivered < amount else {})
+        if delivered:
+            order = {product_id: delivered}
+            customer_name, discount_multiplier = self.__add_spendings(customer_id, order, True)
+            self.__record_sale(customer_name, customer_id, order, discount_multiplier, True)
+        return delivered, available - delivered
+
+    def __publish(self) -> None:
+        '''
+        Inner function writing current offer to market board (called on every warehouse change). Board row has
+        single writer - publications from producer and generator threads are serialized by board lock.
+
+            Returns:
+                None
+        '''
+        if self.id is None:
+            return
+        with self.__board_lock:
+            if self.__board_row is None:
+                if self.__closed.is_set():
+                    return
+                self.__board_row = self.market_board.assign(self.id)
+            amounts = {product_id: product.amount for product_id, product in list(self.warehouse.products.items())
+                       if product_id in self.products}
+            self.market_board.publish(self.__board_row, self.id, self.warehouse.version, amounts, self.products)
+
+    def __next_message(self) -> Tuple[bool, Optional[tuple]]:
+        '''
+        Inner function choosing next message for producer thread (workers = 0) by scheduling policy.
+
+            Returns:
+                (True if message is order, message) or (False, None) if both queues are empty.
+        '''
+        orders, requests = self.order_queue, self.request_queue
+        if orders.empty():
+            if requests.empty():
+                return False, None
+            is_order = False
+        elif requests.empty() or self.scheduling == 'order_priority':
+            is_order = True
+        elif self.scheduling == 'edf':
+            # producer thread is the only consumer, heads of queues can be peeked without their locks
+            now = self.market.clock()
+            is_order = self.__deadline(orders.queue[0], self.orderSlo, now) <= \
+                self.__deadline(requests.queue[0], self.requestSlo, now)
+        else:
+            is_order = self.__orders_in_row < (self.orderWeight if self.scheduling == 'weighted' else 1)
+        self.__orders_in_row = self.__orders_in_row + 1 if is_order else 0
+        return is_order, (orders if is_order else requests).get_nowait()
+
+    @staticmethod
+    def __deadline(message, slo: float, now: float) -> float:
+        '''
+        Inner function returning deadline of message (time of sending plus SLO, message without time of sending counts
+        as sent now).
+        '''
+        return (message.sent_at if message.sent_at is not None else now) + slo
+
+    def __record_wait(self, message, message_class: str, slo: float) -> None:
+        '''
+        Inner function counting handled message and checking how long it waited against SLO of its class.
+        '''
+        if message.sent_at is None:
+            return
+        missed = self.market.clock() - message.sent_at > slo
+        with self.__slo_lock:
+            stats = self.slo_stats[message_class]
+            stats[0] += 1
+            stats[1] += missed
+
+    def __heartbeat(self) -> None:
+        '''
+        Inner function reporting liveness and queue depth to market's user register (at most every heartbeatInterval).
+        Called by producer thread only - if it gets stuck, heartbeats stop and customers skip the producer.
+
+            Returns:
+                None
+        '''
+        now = self.market.clock()
+        if now >= self.__next_heartbeat and self.id is not None:
+            self.__next_heartbeat = now + self.heartbeatInterval
+            self.market.register.heartbeat(self.id, self.request_queue.qsize() + self.order_queue.qsize())
+
+    def __running(self) -> bool:
+        '''
+        Inner function checking if producer threads should keep working.
+
+            Returns:
+                False after market's stop event is set or producer is closed, True otherwise.
+        '''
+        return not self.market.stop.is_set() and not self.__closed.is_set()
+
+    def __handle_order(self, message) -> None:
+        '''
+        Inner function for handling customer's order - realizing it, replying to customer and updating
+        sales ledger and customer spendings. Messages of two-phase commit are passed to their handlers.
+
+            Parameters:
+                    message (OrderRequest | PrepareRequest | Decision): Order received from customer.
+
+            Returns:
+                    None
+        '''
+        self.__record_wait(message, 'order', self.orderSlo)
+        if isinstance(message, PrepareRequest):
+            self.__prepare(message)
+            return
+        if isinstance(message, Decision):
+            self.__decide(message)
+            return
+        customer_id, order, customer_reply, _, request_id = message
+        logging.debug(f"order is {order}")
+        order_completed = self.__take_goods(order)
+        # spendings are updated before reply - customer may leave the register right after it (and be forgotten)
+        customer_name, discount_multiplier = self.__add_spendings(customer_id, order, order_completed)
+        # send back to customer
+        self.__reply(customer_reply, OrderStatus(self.id, order_completed, request_id))
+        traffic_log.record(traffic_log.ORDER, self.id, customer_id, order)
+        traffic_log.record(traffic_log.ORDER_STATUS, self.id, customer_id, order_completed)
+        self.__record_sale(customer_name, customer_id, order, discount_multiplier, order_completed)
+
+    def __prepare(self, message) -> None:
+        '''
+        Inner function for first phase of two-phase commit - ordered goods are reserved (taken out of warehouse)
+        and customer gets vote whether the order can be realized.
+
+            Parameters:
+                    message (PrepareRequest): Prepared order received from customer.
+
+            Returns:
+                    None
+        '''
+        customer_id, transaction_id, order, customer_reply, _ = message
+        if self.__departed is None:
+            # customers leaving the register are followed only by producers that prepare transactions
+            self.__departed = deque()
+            self.market.register.add_listener(self)
+        # departures are processed first - reservation of new customer that got ID of departed one isn't orphaned
+        self.__collect_departed()
+        ready = self.__take_goods(order)
+        if ready:
+            # customer may leave the register right after sending decision, its name is kept for sales ledger
+            self.__reservations[(customer_id, transaction_id)] = (
+                order, self.market.clock() + self.reservationTimeout, self.market.register.check_customer_id(customer_id))
+        self.__reply(customer_reply, Vote(self.id, transaction_id, ready))
+
+    def __decide(self, message) -> None:
+        '''
+        Inner function for second phase of two-phase commit - reserved goods are sold (commit) or returned to
+        warehouse (abort), then customer gets acknowledgement. Decision about unknown (refused or expired)
+        reservation is acknowledged as not committed.
+
+            Parameters:
+                    message (Decision): Decision received from customer.
+
+            Returns:
+                    None
+        '''
+        customer_id, transaction_id, commit, customer_reply, _ = message
+        reservation = self.__reservations.pop((customer_id, transaction_id), None)
+        self.__orphaned.discard((customer_id, transaction_id))
+        if reservation is None:
+            logging.debug(f"decision about unknown transaction {transaction_id} of {customer_id}")
+            commit = False
+        else:
+            order, _, reserved_name = reservation
+            if commit:
+                customer_name, discount_multiplier = self.__add_spendings(customer_id, order, True)
+                self.__record_sale(customer_name or reserved_name, customer_id, order, discount_multiplier, True)
+            else:
+                self.__return_goods(order)
+        if customer_reply is not None:
+            self.__reply(customer_reply, Ack(self.id, transaction_id, commit))
+
+    def forget(self, customer_id: int) -> None:
+        '''
+        Interface for market's user register - called when customer leaves the register (see
+        UserRegister.add_listener). ID is only queued, producer thread marks customer's reservations as orphaned.
+
+            Parameters:
+                    customer_id (int): ID of customer.
+
+            Returns:
+                    None
+        '''
+        if not self.__closed.is_set():
+            self.__departed.append(customer_id)
+
+    def __collect_departed(self) -> None:
+        '''
+        Inner function marking reservations of customers that left the register as orphaned (their IDs may be
+        given to new customers, so register can't tell it any more).
+        '''
+        while self.__departed:
+            customer_id = self.__departed.popleft()
+            self.__orphaned.update(key for key in self.__reservations if key[0] == customer_id)
+
+    def __expire_reservations(self) -> None:
+        '''
+        Inner function releasing reservations whose customer didn't decide on time and left the register (presumed
+        abort). Customer still in register may have decided to commit - its reservation is kept.
+
+            Returns:
+                    None
+        '''
+        self.__collect_departed()
+        now = self.market.clock()
+        for key, (order, deadline, _) in list(self.__reservations.items()):
+            if deadline <= now and (key in self.__orphaned or not self.market.register.check_customer_id(key[0])):
+                del self.__reservations[key]
+                self.__orphaned.discard(key)
+                logging.debug(f"reservation {key} expired")
+                self.__return_goods(order)
+
+    def __take_goods(self, order: Dict[int, int]) -> bool:
+        '''
+        Inner function realizing order in warehouse (whole or nothing) and reporting it to replenishment controller.
+
+            Parameters:
+                    order (dict): Product IDs mapped to ordered amounts.
+
+            Returns:
+                    True if goods were taken from warehouse, False otherwise.
+        '''
+        with self.warehouse_lock:
+            order_completed = self.create_order(order)
+            if self.replenishment is not None:
+                self.replenishment.record_order(order, {} if order_completed else self.__shortage(order))
+        return order_completed
+
+    def __return_goods(self, order: Dict[int, int]) -> None:
+        '''
+        Inner function returning goods of released reservation to warehouse. Space of warehouse may have been taken by
+        generated goods meanwhile - amount above limit is lost, as if generator reached the limit.
+
+            Parameters:
+                    order (dict): Product IDs mapped to reserved amounts.
+
+            Returns:
+                    None
+        '''
+        with self.warehouse_lock:
+            for product_id, amount in order.items():
+                if product_id in self.warehouse.products:
+                    self.warehouse.increase_amount(product_id, amount)
+
+    def __add_spendings(self, customer_id: int, order: Dict[int, int], order_completed: bool) -> Tuple[Optional[str], float]:
+        '''
+        Inner function adding value of realized order to customer spendings (used for discounts).
+
+            Parameters:
+                    customer_id (int): ID of customer.
+                    order (dict): Product IDs mapped to ordered amounts.
+                    order_completed (bool): Whether order was realized.
+
+            Returns:
+                    (customer name or None if customer isn't in register, discount multiplier of the order)
+        '''
+        customer_name = self.market.register.check_customer_id(customer_id)
+        discount_multiplier = self.discountMultiplier if self.customer_register.is_eligible(customer_id) else 1.0
+        if order_completed and customer_name and discount_multiplier == 1.0:
+            # sum customer spendings only up to discount threshold, after that we always give him 5% discount
+            self.customer_register.add_spendings(
+                customer_id, sum(order[product_id] * self.products[product_id] for product_id in order))
+        return customer_name, discount_multiplier
+
+    def __record_sale(self, customer_name: Optional[str], customer_id: int, order: Dict[int, int],
+                      discount_multiplier: float, order_completed: bool) -> None:
+        '''
+        Inner function recording order in sales ledger (if producer has one).
+
+            Returns:
+                    None
+        '''
+        if self.sales_ledger is not None:
+            self.sales_ledger.record_order(self.name, str(customer_name or customer_id), order, self.products,
+                                           discount_multiplier, order_completed, catalog=self.market.catalog)
+
+    def __handle_request(self, message) -> None:
+        '''
+        Inner function for handling customer's request for offer. Request is answered with Busy reply
+        when too many orders are waiting.
+
+            Parameters:
+                    message (OfferRequest): Request received from customer.
+
+            Returns:
+                    None
+        '''
+        self.__record_wait(message, 'request', self.requestSlo)
+        customer_id, requested_products, customer_queue, _, request_id = message
+        customer_name = self.market.register.check_customer_id(customer_id)
+        if customer_name and self.shed_threshold is not None and self.order_queue.qsize() >= self.shed_threshold:
+            self.__reply(customer_queue, Busy(self.id, self.busyRetryAfter, request_id))
+            traffic_log.record(traffic_log.OFFER_REQUEST, self.id, customer_id, requested_products)
+            traffic_log.record(traffic_log.BUSY, self.id, customer_id, self.busyRetryAfter)
+        elif customer_name:
+            if self.customer_register.is_eligible(customer_id):
+                products_info = self.display_products(requested_products, discount_multiplier=self.discountMultiplier)
+                logging.debug(f"{customer_name} got discount!")
+            else:
+                products_info = self.display_products(requested_products)
+            self.__reply(customer_queue, Offer(self.id, products_info, request_id))
+            if self.replenishment is not None:
+                self.replenishment.record_request(requested_products, products_info)
+            traffic_log.record(traffic_log.OFFER_REQUEST, self.id, customer_id, requested_products)
+            traffic_log.record_offer(self.id, customer_id, requested_products, products_info)
+        else:
+            logging.debug("Request not from customer")
 
+    def __reply(self, customer_queue: Queue, message) -> None:
+        '''
+        Inner function used for sending reply to customer. Reply is dropped if customer's queue is full,
+        producer never blocks on customer.
 
+            Parameters:
+                    customer_queue (Queue): Queue where customer waits for reply.
+                    message (namedtuple): Reply message (Offer, OrderStatus or Busy).
 
-    def __add_products(self, products) -> Dict[str, float]:
+            Returns:
+                    None
+        '''
+        try:
+            customer_queue.put_nowait(message)
+        except Full:
+            logging.debug(f"reply {message} dropped, customer queue is full")
+
+    def __resolve_product_ids(self, products) -> Union[List[int], Dict[int, Dict[str, Union[float, int]]]]:
+        '''
+        Inner function used for translating product names passed to constructor into product IDs.
+
+            Parameters:
+                    products (list | dict): List contatining names of products (str) or dict mapping names to parameters.
+
+            Returns:
+                    The same structure as 'products', with names replaced by product IDs.
+
+            Raises:
+                    ValueError - product not in product register.
+        '''
+        if self.market.catalog.missing(products):
+            raise ValueError("Producer: Product not possible")
+        if isinstance(products, List):
+            return [self.market.catalog.product_id(name) for name in products]
+        return {self.market.catalog.product_id(name): params for name, params in products.items()}
+
+    def __add_products(self, products) -> Dict[int, float]:
         '''
         Inner function used for initalization of 'products' field.
 
             Parameters:
-                    products (list | dict): List contatining names of products (str) or dicts with name, price, initial amount
+                    products (list | dict): List contatining IDs of products (int) or dicts with ID, price, initial amount
                                     and limit of production. Dict may not have all parameters, in that case they're initalised
                                     with default values.
 
             Returns:
-                    out_dict (dict): Dictionary mapping name to price (name:price).
+                    out_dict (dict): Dictionary mapping product ID to price (id:price).
         '''
         out_dict = {}
         if isinstance(products, List):
-            for name in products:
-                if name in product_register:
-                    out_dict[name] = Producer.defaultPrice
-                else:
-                    raise ValueError("Producer: Product not possible")
+            for product_id in products:
+                out_dict[product_id] = Producer.defaultPrice
         else:
-            for name, params in products.items():
-                if name in product_register:
-                    if 'price' in params.keys():
-                        if not isinstance(params['price'], (float, int)):
-                            raise ValueError("Producer: Price has to be either float or int!")
-                        if params['price'] < 0:
-                            raise ValueError("Producer: Price has to be greater than zero!")
-                        out_dict[name] = float(params['price'])
-                    else:
-                        out_dict[name] = Producer.defaultPrice
+            for product_id, params in products.items():
+                if 'price' in params.keys():
+                    if not isinstance(params['price'], (float, int)):
+                        raise ValueError("Producer: Price has to be either float or int!")
+                    if params['price'] < 0:
+                        raise ValueError("Producer: Price has to be greater than zero!")
+                    out_dict[product_id] = float(params['price'])
                 else:
-                    raise ValueError("Producer: Product not possible")
+                    out_dict[product_id] = Producer.defaultPrice
         return out_dict
 
     def add_product(self, name, price=defaultPrice, amount=Warehouse.default_amount, limit=Warehouse.default_limit,
                     create_time=Generator.default_create_time, create_amount=Generator.default_create_amount) -> None:
         '''
-        Method for adding new products.
+        Method for adding new products. Product is also added to producer's offer in market's user register.
 
             Parameters:
-                    products (list): List contatining names of products (str) or tuples with name, price, initial amount
-                                    and limit of production.
+                    name (str): Name of the product, it has to be in product register.
+                    price (float): Price of the product.
+                    amount (int): Initial amount of the product in warehouse.
+                    limit (int): Maximum amount of the product in warehouse.
+                    create_time (int): Time it takes to create the product.
+                    create_amount (int): How much of the product is created in one period.
 
             Returns:
-                    out_dict (dict): Dictionary mapping name to price (name:price).
+                    None
         '''
-        if name in self.products:
-            raise ValueError("Producer: Product already exists!")
-        if name not in product_register:
+        if self.replica_of is not None:
+            raise ValueError("Producer: Offer of replica can be changed only by its primary producer!")
+        if name not in self.market.catalog:
             raise ValueError("Producer: Product not possible")
-        self.products[name] = price
-        self.warehouse.add_product(name, amount, limit)
-        self.product_generator.add_product(name, self.warehouse, create_time, create_amount)
+        product_id = self.market.catalog.product_id(name)
+        if product_id in self.products:
+            raise ValueError("Producer: Product already exists!")
+        with self.warehouse_lock:
+            self.products[product_id] = price
+            self.warehouse.add_product(product_id, amount, limit)
+        self.product_generator.add_product(product_id, self.warehouse, create_time, create_amount)
+        if self.id is not None:
+            self.market.register.add_producer_product(self.id, product_id)
 
     def delete_product(self, name) -> None:
         '''
@@ -171,67 +978,179 @@ class Producer(Thread):
             Returns:
                     None
         '''
-        if name in self.products:
-            del self.products[name]
-            self.product_generator.delete_product(name)
-            self.warehouse.delete_product(name)
+        if self.replica_of is not None:
+            raise ValueError("Producer: Offer of replica can be changed only by its primary producer!")
+        product_id = self.market.catalog.product_id(name) if name in self.market.catalog else None
+        if product_id in self.products:
+            with self.warehouse_lock:
+                del self.products[product_id]
+                self.warehouse.delete_product(product_id)
+            self.product_generator.delete_product(product_id)
+            if self.id is not None:
+                self.market.register.remove_producer_product(self.id, product_id)
+
+    def add_products(self, products: Union[List[str], Dict[str, Dict[str, Union[float, int]]]]) -> None:
+        '''
+        Method for adding many new products at once (e.g. onboarding of large product range) - bulk version of
+        add_product. Whole batch is validated first and nothing is added if any product is incorrect. Then it is
+        stored in warehouse and generator under one acquisition of warehouse lock (products with the same create
+        time share one generator event) and added to producer's offer in market's user register at once.
+
+            Parameters:
+                    products (list | dict): Names of products or names mapped to their parameters (price, amount,
+                                    limit, create_time and create_amount - the same format as in constructor).
+
+            Returns:
+                    None
+
+            Raises:
+                    ValueError - replica, product not in product register, product already exists, incorrect
+                                 parameters.
+        '''
+        if self.replica_of is not None:
+            raise ValueError("Producer: Offer of replica can be changed only by its primary producer!")
+        products = self.__resolve_product_ids(products)
+        product_ids = products if isinstance(products, List) else list(products)
+        if len(set(product_ids)) != len(product_ids) or not self.products.keys().isdisjoint(product_ids):
+            raise ValueError("Producer: Product already exists!")
+        prices = self.__add_products(products)
+        with self.warehouse_lock:
+            # prices are set first - warehouse change is published with them
+            self.products.update(prices)
+            try:
+                self.warehouse.add_products(products)
+            except ValueError:
+                for product_id in product_ids:
+                    del self.products[product_id]
+                raise
+            try:
+                self.product_generator.add_products(products, self.warehouse)
+            except ValueError:
+                for product_id in product_ids:
+                    del self.products[product_id]
+                self.warehouse.delete_products(product_ids)
+                raise
+        if self.id is not None:
+            self.market.register.add_producer_products(self.id, product_ids)
+
+    def delete_products(self, names: Iterable[str]) -> None:
+        '''
+        Method for deleting many products at once - bulk version of delete_product. Products that producer
+        doesn't sell are skipped.
 
-    def check_warehouse(self, product_name: str) -> Union[int, None]:
+            Parameters:
+                    names (iterable): Names of products to delete.
+
+            Returns:
+                    None
+        '''
+        if self.replica_of is not None:
+            raise ValueError("Producer: Offer of replica can be changed only by its primary producer!")
+        catalog = self.market.catalog
+        product_ids = [catalog.product_id(name) for name in names if name in catalog]
+        product_ids = [product_id for product_id in dict.fromkeys(product_ids) if product_id in self.products]
+        if not product_ids:
+            return
+        with self.warehouse_lock:
+            for product_id in product_ids:
+                del self.products[product_id]
+            self.warehouse.delete_products(product_ids)
+        self.product_generator.delete_products(product_ids)
+        if self.id is not None:
+            self.market.register.remove_producer_products(self.id, product_ids)
+
+    def check_warehouse(self, product_id: int) -> Union[int, None]:
         '''
         Method for getting amount of product in warehouse (if it exists):
 
             Parameters:
-                    product_name (str): Product name to check in warehouse.
+                    product_id (int): Product ID to check in warehouse.
 
             Returns:
                     Amount of the item in warehouse if it exists or None if it doess't.
         '''
-        return self.warehouse.products[product_name].amount \
-            if product_name in self.warehouse.products.keys() else None
+        return self.warehouse.products[product_id].amount \
+            if product_id in self.warehouse.products.keys() else None
 
-    def display_products(self, requested_products: List[str], discount_multiplier: float = 1.0) -> Dict[str, List[Union[int, float]]]:
+    def display_products(self, requested_products: List[int], discount_multiplier: float = 1.0) -> OfferSnapshot:
         '''
-        Method used for replying to customer's request.
+        Method used for replying to customer's request. Doesn't need warehouse lock - current offer snapshot is
+        returned as it is (it is rebuilt first only if warehouse changed since last request).
 
             Parameters:
-                    requested_products (List): List of strings representing products that customer wants to buy.
+                    requested_products (List): List of IDs of products that customer wants to buy. Whole offer is
+                                    returned (without copying), customer looks up products of its shopping list.
                     discount_multiplier (float): prices of all products are reduced by this multiplier. Default and max is 1.0 (no discount).
             Returns:
-                    response_dict (Dict): Mapped products to their amount or None in case it's not available.
+                    Read-only mapping of available products to (amount, price) pairs. Products out of stock are skipped.
+        '''
+        offer = self.__offer
+        if offer.version != self.warehouse.version:
+            offer = self.__rebuild_offer()
+        return offer.discounted(discount_multiplier)
+
+    def __rebuild_offer(self) -> OfferSnapshot:
         '''
-        response_dict = {}
-        for product_name in requested_products:
-            if product_name in self.products.keys():
-                response_dict[product_name] = [self.check_warehouse(
-                    product_name), self.products[product_name]*discount_multiplier]
+        Inner function building new offer snapshot from warehouse state.
 
-        return response_dict
+            Returns:
+                    Current offer snapshot.
+        '''
+        with self.warehouse_lock:
+            offer = self.__offer
+            version = self.warehouse.version
+            if offer.version != version:
+                amounts = {product_id: product.amount for product_id, product in self.warehouse.products.items()
+                           if product.amount > 0 and product_id in self.products}
+                prices = {product_id: self.products[product_id] for product_id in amounts}
+                offer = OfferSnapshot(version, amounts, prices, catalog=self.market.catalog)
+                self.__offer = offer
+        return offer
 
-    def create_order(self, ordered_product: Dict[str, int]) -> bool:
+    def __shortage(self, order: Dict[int, int]) -> Dict[int, int]:
+        '''
+        Inner function computing how much of every ordered product is missing in warehouse.
+
+            Parameters:
+                    order (dict): Product IDs mapped to ordered amounts.
+
+            Returns:
+                    Product IDs mapped to missing amounts (only products that are short).
+        '''
+        shortage = {}
+        for product_id, amount in order.items():
+            stock = self.check_warehouse(product_id) or 0
+            if stock < amount:
+                shortage[product_id] = amount - stock
+        return shortage
+
+    def create_order(self, ordered_product: Dict[int, int]) -> bool:
         '''
         Method used for realizing order. Either order can be realized or not, partial orders not supported.
 
             Parameters:
-                    ordered_products (dict): Dictionary of product names mapped to the amount that customer wants to buy
+                    ordered_products (dict): Dictionary of product IDs mapped to the amount that customer wants to buy
 
             Returns:
                     True if whole order is possible to make, False otherwise.
         '''
-        for name, amount in ordered_product.items():
-            product_status = self.check_warehouse(name)
+        for product_id, amount in ordered_product.items():
+            product_status = self.check_warehouse(product_id)
             if product_status is None:
                 return False
             if product_status < amount:
                 return False
         
-        for name, amount in ordered_product.items():
-            self.warehouse.decrease_amount(name, amount)
+        for product_id, amount in ordered_product.items():
+            self.warehouse.decrease_amount(product_id, amount)
 
         return True
 
+    @profiled('generator')
     def generate_products(self) -> None:
         '''
-        Method used for generating products in Warehouse instance using Generator instance.
+        Method used for generating products in Warehouse instance using Generator instance (production rates
+        are adjusted to demand by replenishment controller, if producer has one).
 
             Parameters:
                     None
@@ -241,17 +1160,6 @@ class Producer(Thread):
         '''
         with self.warehouse_lock:
             self.product_generator.prepare_generator(self.warehouse)
-        self.product_generator.scheduler.run()
-
-    def __del__(self) -> None:
-        '''
-        Destructor of the object. Also deletes it from global user register as it was assigned there during construction.
-
-            Parameters:
-                    None
-
-            Returns:
-                    None
-        '''
-        if hasattr(self, 'self.id'):
-            global_user_register.delete_user(self.id)
+        if self.replenishment is not None:
+            self.replenishment.start()
+        self.product_generator.run()
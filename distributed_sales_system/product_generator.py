@@ -1,5 +1,7 @@
-from typing import List, Tuple, Union, Dict
+from typing import Iterable, List, Tuple, Union, Dict
+import math
 from sched import scheduler
+from threading import Event, RLock
 import time
 from distributed_sales_system.warehouse import Warehouse
 from distributed_sales_system import logging
@@ -35,7 +37,17 @@ class Generator():
     Attributes
     ----------
     products (dict):
-            Dictionary mapping product name to its create time and create amount.
+            Dictionary mapping product ID (from product catalog) to its create time and create amount.
+    scheduler (scheduler):
+            Scheduler of product incrementations (and of other periodic work of generator thread, e.g. replenishment).
+    __stop (Event):
+            Set when generation should end (see stop).
+    lock (RLock):
+            Lock held while generated goods are added to warehouse (producer's warehouse lock), so generator's
+            changes of warehouse (and its version) are serialized with producer's ones.
+    maxWait (float):
+            Class attribute, longest time (in seconds) generator thread sleeps without checking scheduler - events
+            added meanwhile (e.g. new products) are delayed at most by this time.
     default_create_time (int):
             Default create time of given product (used if create time not passed in constructor).
     default_create_amount (int):
@@ -43,44 +55,91 @@ class Generator():
     '''
     default_create_time = 5
     default_create_amount = 1
+    maxWait = 1.0
 
-    def __init__(self, products_list: Union[List[str], Dict[str, Dict[str, Union[float, int]]]]) -> None:
+    def __init__(self, products_list: Union[List[int], Dict[int, Dict[str, Union[float, int]]]], lock=None) -> None:
         self.scheduler = scheduler(time.monotonic, time.sleep)  # start scheduler
+        self.__stop = Event()
+        self.lock = lock if lock is not None else RLock()
         self.products = {}
         if isinstance(products_list, List):
-            for name in products_list:
-                self.products[name] = GeneratorProduct(Generator.default_create_time, Generator.default_create_amount)
+            for product_id in products_list:
+                self.products[product_id] = GeneratorProduct(Generator.default_create_time, Generator.default_create_amount)
         else:
-            for name, params in products_list.items():
-                product_init_list = [Generator.default_create_time, Generator.default_create_amount]
-                if 'create_time' in params.keys():
-                    if not isinstance(params['create_time'], int):
-                        raise ValueError("Generator: Product creation time has to be integer!")
-                    if params['create_time'] < 0:
-                        raise ValueError("Generator: Product creation time cannot be less than zero!")
-                    if params['create_time'] > 1000:
-                        raise ValueError("Generator: Product creation time cannot be more than 1000!")
-                    product_init_list[0] = params['create_time']
-                if 'create_amount' in params.keys():
-                    if not isinstance(params['create_amount'], int):
-                        raise ValueError("Generator: Product create amount has to be integer!")
-                    if params['create_amount'] < 0:
-                        raise ValueError("Generator: Cannot produce less than zero!")
-                    if params['create_amount'] > 50:
-                        raise ValueError("Generator: Cannot produce more at a time than 50!")
-                    product_init_list[1] = params['create_amount']
-                
-                self.products[name] = GeneratorProduct(product_init_list[0], product_init_list[1])
-
+            for product_id, params in products_list.items():
+                self.products[product_id] = self.__new_product(params)
 
     def __repr__(self) -> str:
         return f"{self.products}"
+
+    @staticmethod
+    def __new_product(params: Dict[str, Union[float, int]]) -> GeneratorProduct:
+        '''
+        Inner function validating parameters of product (create time and amount, missing ones take default values).
+
+            Parameters:
+                    params (dict): Parameters of product (may also contain parameters of producer and warehouse).
+
+            Returns:
+                    New GeneratorProduct.
+
+            Raises:
+                    ValueError - incorrect create time or amount.
+        '''
+        product_init_list = [Generator.default_create_time, Generator.default_create_amount]
+        if 'create_time' in params.keys():
+            if not isinstance(params['create_time'], int):
+                raise ValueError("Generator: Product creation time has to be integer!")
+            if params['create_time'] < 0:
+                raise ValueError("Generator: Product creation time cannot be less than zero!")
+            if params['create_time'] > 1000:
+                raise ValueError("Generator: Product creation time cannot be more than 1000!")
+            product_init_list[0] = params['create_time']
+        if 'create_amount' in params.keys():
+            if not isinstance(params['create_amount'], int):
+                raise ValueError("Generator: Product create amount has to be integer!")
+            if params['create_amount'] < 0:
+                raise ValueError("Generator: Cannot produce less than zero!")
+            if params['create_amount'] > 50:
+                raise ValueError("Generator: Cannot produce more at a time than 50!")
+            product_init_list[1] = params['create_amount']
+        return GeneratorProduct(product_init_list[0], product_init_list[1])
+
+    @property
+    def stopped(self) -> bool:
+        return self.__stop.is_set()
+
+    def run(self) -> None:
+        '''
+        Method running scheduled events until stop is called (used by generator thread). Events left in scheduler
+        are cancelled afterwards.
+
+            Returns:
+                    None
+        '''
+        while not self.__stop.is_set():
+            delay = self.scheduler.run(blocking=False)
+            self.__stop.wait(self.maxWait if delay is None else min(delay, self.maxWait))
+        for event in self.scheduler.queue:
+            try:
+                self.scheduler.cancel(event)
+            except ValueError:
+                pass
+
+    def stop(self) -> None:
+        '''
+        Method ending generation - generator thread wakes up at once, cancels scheduled events and ends.
+
+            Returns:
+                    None
+        '''
+        self.__stop.set()
     
 
     def prepare_generator(self, warehouse: Warehouse) -> None:
         '''
-        Method that schedules every product incrementation. 
-        Used within daemon thread so no need to reschedule on 'enter'.
+        Method that schedules every product incrementation - one event for all products with the same create time
+        (see add_products). Used within daemon thread so no need to reschedule on 'enter'.
 
             Parameters:
                     warehouse (Warehouse): warehouse instance from producer, 
@@ -90,111 +149,212 @@ class Generator():
         '''
         if not isinstance(warehouse, Warehouse):
             raise ValueError("Generator: Cannot schedule generation without access to proper warehouse!")
-        for name, product in self.products.items():
-            self.scheduler.enter(product.create_time, 1, self.__increase_amount_wrapper, argument=(warehouse, name, product.create_amount, product.create_time))
+        self.__schedule_batches(warehouse, list(self.products))
 
-    
-    def __increase_amount_wrapper(self, warehouse, name, create_amount, create_time, stop=False):
-        if not stop:
-            self.scheduler.enter(create_time, 1, self.__increase_amount_wrapper, argument=(warehouse, name, create_amount, create_time,))
-            warehouse.increase_amount(name, create_amount)
+    def __schedule_batches(self, warehouse: Warehouse, product_ids: List[int]) -> None:
+        '''
+        Inner function scheduling incrementation of given products - one event per create time.
+        '''
+        batches: Dict[int, List[int]] = {}
+        for product_id in product_ids:
+            batches.setdefault(self.products[product_id].create_time, []).append(product_id)
+        for create_time, batch in batches.items():
+            self.scheduler.enter(create_time, 1, self.__increase_batch_wrapper, argument=(warehouse, create_time, batch))
+
+    def __increase_batch_wrapper(self, warehouse, create_time, product_ids):
+        # product whose create time was changed leaves the batch and is scheduled on its own from now on
+        batch = []
+        with self.lock:
+            for product_id in product_ids:
+                product = self.products.get(product_id)
+                if product is None:
+                    continue
+                if product.create_time != create_time:
+                    self.scheduler.enter(product.create_time, 1, self.__increase_amount_wrapper, argument=(warehouse, product_id))
+                    continue
+                batch.append(product_id)
+                warehouse.increase_amount(product_id, product.create_amount)
+        if batch:
+            self.scheduler.enter(create_time, 1, self.__increase_batch_wrapper, argument=(warehouse, create_time, batch))
+        logging.debug(f"warehouse: {warehouse}")
+
+    def __increase_amount_wrapper(self, warehouse, product_id):
+        # current create time and amount are read on every period, so their changes take effect
+        product = self.products.get(product_id)
+        if product is not None:
+            self.scheduler.enter(product.create_time, 1, self.__increase_amount_wrapper, argument=(warehouse, product_id))
+            with self.lock:
+                warehouse.increase_amount(product_id, product.create_amount)
             logging.debug(f"warehouse: {warehouse}")
 
 
-    def add_product(self, product_name: str, warehouse: Warehouse, create_time: int = default_create_time, create_amount: int = default_create_amount) -> None:
+    def add_product(self, product_id: int, warehouse: Warehouse, create_time: int = default_create_time, create_amount: int = default_create_amount) -> None:
         '''
         Method for adding new products to generator. Only to be used as part of Producer.add_product method
         (otherwise errors are likely to happen).
 
             Parameters:
-                    product_name (str): Name of the product to be added.
+                    product_id (int): ID of the product to be added.
                     create_time (int): Time it takes to create given product.
                     create_amount (int): How much given product is created in one period.
             Returns:
                     None
         '''
-        if product_name in self.products:
+        if product_id in self.products:
             raise ValueError("Generator: Product is already generated!")
         else:
-            self.products[product_name] = GeneratorProduct(create_time, create_amount)
-            self.scheduler.enter(create_time, 1, self.__increase_amount_wrapper, argument=(warehouse, product_name, create_amount, create_time))
+            self.products[product_id] = GeneratorProduct(create_time, create_amount)
+            self.scheduler.enter(create_time, 1, self.__increase_amount_wrapper, argument=(warehouse, product_id))
 
-    def delete_product(self, product_name: str) -> None:
+    def delete_product(self, product_id: int) -> None:
         '''
         Method for removing product from generator. Only to be used as part of Producer.delete_product method
         (otherwise errors are likely to happen).
 
             Parameters:
-                    product_name (str): Name of the product to be deleted.
+                    product_id (int): ID of the product to be deleted.
+
+            Returns:
+                    None
+        '''
+        self.delete_products([product_id])
+
+    def add_products(self, products_list: Union[List[int], Dict[int, Dict[str, Union[float, int]]]],
+                     warehouse: Warehouse) -> None:
+        '''
+        Method for adding many new products to generator at once (bulk version of add_product, only to be used as
+        part of Producer.add_products). Whole batch is validated first - nothing is added if any product is
+        incorrect. Products with the same create time share one scheduled event.
+
+            Parameters:
+                    products_list (list | dict): IDs of products or IDs mapped to their parameters (create time and
+                                    amount, the same format as in constructor).
+                    warehouse (Warehouse): Warehouse where products are generated.
+
+            Returns:
+                    None
+
+            Raises:
+                    ValueError - product is already generated, incorrect create time or amount.
+        '''
+        if isinstance(products_list, List):
+            new_products = {product_id: GeneratorProduct(Generator.default_create_time, Generator.default_create_amount)
+                            for product_id in products_list}
+        else:
+            new_products = {product_id: self.__new_product(params) for product_id, params in products_list.items()}
+        if len(new_products) != len(products_list) or not self.products.keys().isdisjoint(new_products):
+            raise ValueError("Generator: Product is already generated!")
+        self.products.update(new_products)
+        self.__schedule_batches(warehouse, list(new_products))
+
+    def delete_products(self, product_ids: Iterable[int]) -> None:
+        '''
+        Method for removing many products from generator at once (bulk version of delete_product, only to be used
+        as part of Producer.delete_products). Scheduled events are searched once for the whole batch. Products that
+        aren't generated are skipped.
+
+            Parameters:
+                    product_ids (iterable): IDs of products to be deleted.
 
             Returns:
                     None
         '''
-        if product_name in self.products:
-            del self.products[product_name]
-            for event in self.scheduler.queue:
-                if event.argument[1] == product_name:
+        deleted = {product_id for product_id in product_ids if self.products.pop(product_id, None) is not None}
+        if not deleted:
+            return
+        for event in self.scheduler.queue:
+            if event.action == self.__increase_amount_wrapper and event.argument[1] in deleted:
+                self.scheduler.cancel(event)
+            elif event.action == self.__increase_batch_wrapper:
+                # batch is cut in place - product added again before event runs must not be generated twice
+                batch = event.argument[2]
+                batch[:] = [product_id for product_id in batch if product_id not in deleted]
+                if not batch:
                     self.scheduler.cancel(event)
 
 
 
-    def increase_create_amount(self, product_name: str, create_amount: int = 1) -> None:
+    def increase_create_amount(self, product_id: int, create_amount: int = 1) -> None:
         '''
         Method used for increasing created amount of given product in the generator.
         If increasing more than 50 then info error will be raised.
 
             Parameters:
-                     product_name (str): Name of the product.
+                     product_id (int): ID of the product.
                      create_amount (int): How much created amount of product should increase.
 
             Returns:
                     None
         '''
-        if product_name not in self.products:
+        if product_id not in self.products:
             raise ValueError("Generator: Product is not generated!")
-        if (self.products[product_name].create_amount + create_amount) < 50:
-            self.products[product_name].create_amount += create_amount
+        if (self.products[product_id].create_amount + create_amount) < 50:
+            self.products[product_id].create_amount += create_amount
         else:
             raise ValueError(
                 "Generator: Cannot produce more at a time than 50!")
 
-    def decrease_create_amount(self, product_name: str, create_amount: int = 1) -> None:
+    def decrease_create_amount(self, product_id: int, create_amount: int = 1) -> None:
         '''
         Method used for decreasing created amount of given product in the generator.
         If decreasing to less than zero ValueError will raise.
 
             Parameters:
-                     product_name (str): Name of the product.
+                     product_id (int): ID of the product.
                      create_amount (int): How much created amount of product should decrease.
 
             Returns:
                     None
         '''
-        if product_name not in self.products:
+        if product_id not in self.products:
             raise ValueError("Generator: Product is not generated!")
-        if self.products[product_name].create_amount - create_amount >= 0:
-            self.products[product_name].create_amount -= create_amount
+        if self.products[product_id].create_amount - create_amount >= 0:
+            self.products[product_id].create_amount -= create_amount
         else:
             raise ValueError("Generator: Cannot produce less than zero!")
 
-    def change_create_time(self, product_name: str, create_time: int = 5) -> None:
+    def change_create_time(self, product_id: int, create_time: int = 5) -> None:
         '''
         Method used for changing creation time of product in generator.
         Upper and lower limit set as 0 and 1000.
         Raising or lowering beyond those will raise an error.
 
             Parameters:
-                     product_name (str): Name of the product.
+                     product_id (int): ID of the product.
                      create_time (int): New creation time for given product.
 
             Returns:
                     None
         '''
-        if product_name not in self.products:
+        if product_id not in self.products:
             raise ValueError("Generator: Product is not generated!")
-        if self.products[product_name].create_time < 0:
+        if self.products[product_id].create_time < 0:
             raise ValueError("Generator: Product creation time cannot be less than zero")
-        elif self.products[product_name].create_time > 1000:
+        elif self.products[product_id].create_time > 1000:
             raise ValueError("Generator: Product creation time cannot be more than a 1000!")
         else:
-            self.products[product_name].create_time = create_time
\ No newline at end of file
+            self.products[product_id].create_time = create_time
+
+    def change_rate(self, product_id: int, rate: float) -> None:
+        '''
+        Method used for setting production rate of product (units per second). Rate is realized with the shortest
+        create time (at least 1) for which create amount stays within limit of 50 - slow products are created
+        rarely in small amounts. Zero rate stops production.
+
+            Parameters:
+                     product_id (int): ID of the product.
+                     rate (float): Wanted production rate, units per second.
+
+            Returns:
+                    None
+        '''
+        if product_id not in self.products:
+            raise ValueError("Generator: Product is not generated!")
+        if rate < 0:
+            raise ValueError("Generator: Cannot produce less than zero!")
+        product = self.products[product_id]
+        if rate == 0:
+            product.create_amount = 0
+            return
+        product.create_time = min(max(math.ceil(1 / rate), 1), 1000)
+        product.create_amount = min(max(round(rate * product.create_time), 1), 50)
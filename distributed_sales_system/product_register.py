@@ -1 +1,128 @@
-product_register = ["apple", "pear", "banana", "orange", "watermelon", "x"]
+from typing import Dict, Iterable, Iterator, List, Set, Union
+from collections.abc import Sequence
+from distributed_sales_system.lock_stats import make_lock
+
+
+class ProductCatalog(Sequence):
+    '''
+    A class representing catalog of all possible products.
+
+    Every product name is interned to dense integer ID (its position in catalog), so the rest of the system
+    (warehouses, generators, user register and messages) can key products by ID. Catalog behaves like a read-only
+    sequence of product names indexed by ID, so it can be used directly e.g. with random.sample.
+
+    ...
+
+    Attributes
+    ----------
+    __names (list):
+            Product names, index is product ID.
+    __ids (dict):
+            Product name mapped to its ID. Used for O(1) membership checks.
+    '''
+
+    def __init__(self, products: Iterable[str] = ()) -> None:
+        self.__names: List[str] = []
+        self.__ids: Dict[str, int] = {}
+        self.__lock = make_lock("product_catalog")
+        for name in products:
+            self.register(name)
+
+    def __repr__(self) -> str:
+        return f"{self.__names}"
+
+    def __len__(self) -> int:
+        return len(self.__names)
+
+    def __getitem__(self, product_id):
+        return self.__names[product_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__names)
+
+    def __contains__(self, product: Union[str, int]) -> bool:
+        if isinstance(product, int):
+            return 0 <= product < len(self.__names)
+        return product in self.__ids
+
+    def register(self, product_name: str) -> int:
+        '''
+        Method for adding new product to catalog. Registering existing product returns its current ID.
+
+            Parameters:
+                    product_name (str): Name of the product.
+
+            Returns:
+                    product_id (int): ID assigned to the product.
+        '''
+        with self.__lock:
+            product_id = self.__ids.get(product_name)
+            if product_id is None:
+                product_id = len(self.__names)
+                self.__names.append(product_name)
+                self.__ids[product_name] = product_id
+            return product_id
+
+    def product_id(self, product_name: str) -> int:
+        '''
+        Method for getting ID of product.
+
+            Parameters:
+                    product_name (str): Name of the product.
+
+            Returns:
+                    product_id (int): ID of the product.
+
+            Raises:
+                    ValueError - product not in catalog.
+        '''
+        try:
+            return self.__ids[product_name]
+        except KeyError:
+            raise ValueError("Catalog: Product not possible") from None
+
+    def product_name(self, product_id: int) -> str:
+        '''
+        Method for getting name of product.
+
+            Parameters:
+                    product_id (int): ID of the product.
+
+            Returns:
+                    product_name (str): Name of the product.
+
+            Raises:
+                    ValueError - product not in catalog.
+        '''
+        if product_id not in self:
+            raise ValueError("Catalog: Product not possible")
+        return self.__names[product_id]
+
+    def missing(self, product_names: Iterable[str]) -> Set[str]:
+        '''
+        Method for validating many product names at once.
+
+            Parameters:
+                    product_names (iterable): Names of products.
+
+            Returns:
+                    Set of names that are not in catalog (empty if all products are possible).
+        '''
+        return set(product_names).difference(self.__ids.keys())
+
+    def names(self, product_ids: Iterable[int]) -> List[str]:
+        '''
+        Method for translating product IDs to names (e.g. for logging and reports).
+
+            Parameters:
+                    product_ids (iterable): IDs of products.
+
+            Returns:
+                    List of product names.
+        '''
+        return [self.__names[product_id] for product_id in product_ids]
+
+
+default_products = ("apple", "pear", "banana", "orange", "watermelon", "x")
+
+product_register = ProductCatalog(default_products)
@@ -0,0 +1,275 @@
+'''
+Opt-in sampling profiler of agent threads.
+
+cProfile sees only the thread it was started in, so agents are profiled by sampling instead - a daemon thread
+periodically takes stacks of all threads that run agent code (functions decorated with profiled) and counts them
+per agent type (producer, customer, generator, ...). Results are written as collapsed stacks (one file per agent
+type, input of flamegraph.pl or speedscope) and as text report with top-N hotspots per agent type.
+
+Profiling is enabled with enable() (e.g. from run.py) or by setting environment variable DSS_PROFILE to output
+directory before the package is imported - results are then written when the process exits.
+Only threads started while profiling is enabled are sampled. When disabled, profiled functions cost one check.
+'''
+
+from collections import Counter
+from functools import wraps
+from threading import Thread, Event, Lock, get_ident
+from typing import Callable, Dict, List, Optional, Tuple
+import atexit
+import os
+import sys
+
+_profiler: Optional['SamplingProfiler'] = None
+
+
+class SamplingProfiler:
+    '''
+    A class representing sampling profiler of agent threads.
+
+    ...
+
+    Attributes
+    ----------
+    interval (float):
+            Time (in seconds) between samples.
+    samples (int):
+            Number of sampling rounds taken so far.
+    __threads (dict):
+            ID of sampled thread mapped to its agent type.
+    __stacks (dict):
+            Agent type mapped to Counter of stacks (tuples of frame labels, from root to leaf).
+    __labels (dict):
+            Code object mapped to its frame label (cached, labels are built once per function).
+    '''
+
+    def __init__(self, interval: float = 0.005) -> None:
+        if interval <= 0:
+            raise ValueError("Profiler: Sampling interval has to be greater than zero!")
+        self.interval = interval
+        self.samples = 0
+        self.__threads: Dict[int, str] = {}
+        self.__stacks: Dict[str, Counter] = {}
+        self.__labels = {}
+        self.__lock = Lock()
+        self.__stop = Event()
+        self.__sampler = Thread(target=self.__sample, name="profiler_sampler", daemon=True)
+
+    def start(self) -> None:
+        '''
+        Method starting sampler thread.
+
+            Returns:
+                    None
+        '''
+        self.__sampler.start()
+
+    def stop(self) -> None:
+        '''
+        Method stopping sampler thread. Collected stacks are kept.
+
+            Returns:
+                    None
+        '''
+        self.__stop.set()
+        if self.__sampler.is_alive():
+            self.__sampler.join()
+
+    def register_thread(self, agent_type: str) -> None:
+        '''
+        Method for marking current thread as running agent of given type (it will be sampled).
+
+            Parameters:
+                    agent_type (str): Name of agent type, e.g. 'producer'.
+
+            Returns:
+                    None
+        '''
+        with self.__lock:
+            self.__threads[get_ident()] = agent_type
+
+    def unregister_thread(self) -> None:
+        '''
+        Method for ending sampling of current thread.
+
+            Returns:
+                    None
+        '''
+        with self.__lock:
+            self.__threads.pop(get_ident(), None)
+
+    def collapsed_stacks(self, agent_type: str) -> List[str]:
+        '''
+        Method returning stacks of agent type in collapsed format ("frame;frame;frame count").
+
+            Parameters:
+                    agent_type (str): Name of agent type.
+
+            Returns:
+                    Lines of collapsed stacks, the most frequent first.
+        '''
+        with self.__lock:
+            stacks = self.__stacks.get(agent_type, Counter()).most_common()
+        return [f"{';'.join(stack)} {samples}" for stack, samples in stacks]
+
+    def hotspots(self, agent_type: str, top: int = 10) -> List[Tuple[str, int, int]]:
+        '''
+        Method returning functions in which agents of given type spent most time.
+
+            Parameters:
+                    agent_type (str): Name of agent type.
+                    top (int): Number of returned functions.
+
+            Returns:
+                    List of (function label, self samples, total samples), sorted by self samples.
+        '''
+        self_samples, total_samples = Counter(), Counter()
+        with self.__lock:
+            stacks = list(self.__stacks.get(agent_type, Counter()).items())
+        for stack, samples in stacks:
+            self_samples[stack[-1]] += samples
+            for label in set(stack):
+                total_samples[label] += samples
+        return [(label, samples, total_samples[label]) for label, samples in self_samples.most_common(top)]
+
+    def report(self, top: int = 10) -> str:
+        '''
+        Method creating text report with top-N hotspots of every agent type.
+
+            Parameters:
+                    top (int): Number of functions listed per agent type.
+
+            Returns:
+                    Report text.
+        '''
+        with self.__lock:
+            agent_types = sorted(self.__stacks)
+        lines = [f"{self.samples} sampling rounds every {self.interval * 1000:.1f} ms"]
+        for agent_type in agent_types:
+            with self.__lock:
+                samples = sum(self.__stacks[agent_type].values())
+            lines.append(f"\n{agent_type}: {samples} samples")
+            lines.append(f"{'self %':>8} {'total %':>8}  function")
+            for label, self_samples, total_samples in self.hotspots(agent_type, top):
+                lines.append(f"{self_samples / samples * 100:8.1f} {total_samples / samples * 100:8.1f}  {label}")
+        return "\n".join(lines)
+
+    def write(self, directory: str, top: int = 10) -> None:
+        '''
+        Method writing collapsed stacks of every agent type (<agent_type>.folded) and report (report.txt).
+
+            Parameters:
+                    directory (str): Output directory (created if it doesn't exist).
+                    top (int): Number of functions listed per agent type in report.
+
+            Returns:
+                    None
+        '''
+        os.makedirs(directory, exist_ok=True)
+        with self.__lock:
+            agent_types = list(self.__stacks)
+        for agent_type in agent_types:
+            with open(os.path.join(directory, f"{agent_type}.folded"), "w", encoding="utf-8") as folded_file:
+                folded_file.write("\n".join(self.collapsed_stacks(agent_type)) + "\n")
+        with open(os.path.join(directory, "report.txt"), "w", encoding="utf-8") as report_file:
+            report_file.write(self.report(top) + "\n")
+
+    def __sample(self) -> None:
+        '''
+        Inner function representing sampler thread - taking stacks of registered threads every interval.
+        '''
+        while not self.__stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self.__lock:
+                for thread_id, agent_type in self.__threads.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks = self.__stacks.get(agent_type)
+                        if stacks is None:
+                            stacks = self.__stacks[agent_type] = Counter()
+                        stacks[self.__stack(frame)] += 1
+                self.samples += 1
+            del frames
+
+    def __stack(self, frame) -> Tuple[str, ...]:
+        '''
+        Inner function translating frame into tuple of frame labels, from root to leaf.
+        '''
+        labels = self.__labels
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                label = labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            stack.append(label)
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+
+def enable(interval: float = 0.005) -> SamplingProfiler:
+    '''
+    Function enabling profiling of agents started from now on.
+
+        Parameters:
+                interval (float): Time (in seconds) between samples.
+
+        Returns:
+                Active profiler.
+    '''
+    global _profiler
+    if _profiler is None:
+        _profiler = SamplingProfiler(interval)
+        _profiler.start()
+    return _profiler
+
+
+def disable(directory: Optional[str] = None, top: int = 10) -> Optional[SamplingProfiler]:
+    '''
+    Function disabling profiling. Results are written to directory if it is passed.
+
+        Parameters:
+                directory (str): Output directory for collapsed stacks and report (optional).
+                top (int): Number of functions listed per agent type in report.
+
+        Returns:
+                Stopped profiler (with collected results) or None if profiling wasn't enabled.
+    '''
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None:
+        profiler.stop()
+        if directory is not None:
+            profiler.write(directory, top)
+    return profiler
+
+
+def profiled(agent_type: str) -> Callable:
+    '''
+    Decorator marking function as body of agent thread (e.g. Producer.run). While profiling is enabled, thread
+    executing the function is sampled and its stacks are counted as stacks of given agent type.
+
+        Parameters:
+                agent_type (str): Name of agent type, e.g. 'producer'.
+
+        Returns:
+                Decorator.
+    '''
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            profiler = _profiler
+            if profiler is None:
+                return function(*args, **kwargs)
+            profiler.register_thread(agent_type)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.unregister_thread()
+        return wrapper
+    return decorator
+
+
+if os.environ.get('DSS_PROFILE'):
+    enable(float(os.environ.get('DSS_PROFILE_INTERVAL', 0.005)))
+    atexit.register(disable, os.environ['DSS_PROFILE'])
@@ -0,0 +1,142 @@
+from distributed_sales_system.warehouse import Warehouse
+from distributed_sales_system.product_generator import Generator
+from distributed_sales_system.lock_stats import make_lock
+from distributed_sales_system import logging
+from typing import Dict, Iterable, List, Mapping
+import time
+
+
+class ReplenishmentController:
+    '''
+    A class representing demand-driven replenishment of producer's warehouse - production rate of every product
+    follows its observed demand instead of static create time and amount.
+
+    Producer reports every order (ordered amounts and shortages of refused orders) and every offer request for
+    products it has run out of - customers order only what is offered, so demand hidden by stock-out is visible
+    only as such requests (every missed request counts as mean order line of the product). Every period controller
+    (run by generator's scheduler, so generator settings are changed by generator thread only) smooths demand
+    rate of every product and sets production rate to
+        demand + (target stock - stock) / coverTime,    target stock = demand * coverTime (at most warehouse limit),
+    so stock converges to coverTime seconds of demand - hot products stop running out, slow products stop piling
+    up to warehouse limit. Generator realizes the rate within its limits (create amount at most 50).
+
+    ...
+
+    Attributes
+    ----------
+    generator (Generator):
+            Generator of producer.
+    warehouse (Warehouse):
+            Warehouse of producer.
+    period (float):
+            Time (in seconds) between adjustments.
+    demand (dict):
+            Product ID mapped to smoothed demand rate (units per second).
+    __ordered (dict):
+            Product ID mapped to amount ordered since last adjustment.
+    __shortage (dict):
+            Product ID mapped to amount missing in refused orders since last adjustment.
+    __missed (dict):
+            Product ID mapped to number of offer requests for it since last adjustment, while it was out of stock.
+    __lines (dict):
+            Product ID mapped to (number of order lines, total ordered amount), used for mean order line.
+    coverTime (float):
+            Class attribute, for how long (in seconds) stock should cover demand.
+    smoothing (float):
+            Class attribute, weight of the newest period in smoothed demand (0.0 - 1.0).
+    '''
+
+    coverTime = 2.0
+    smoothing = 0.5
+
+    def __init__(self, generator: Generator, warehouse: Warehouse, period: float = 1.0) -> None:
+        if period <= 0:
+            raise ValueError("ReplenishmentController: Period has to be greater than zero!")
+        self.generator = generator
+        self.warehouse = warehouse
+        self.period = period
+        self.demand: Dict[int, float] = {}
+        self.__ordered: Dict[int, int] = {}
+        self.__shortage: Dict[int, int] = {}
+        self.__missed: Dict[int, int] = {}
+        self.__lines: Dict[int, List[int]] = {}
+        self.__last_adjustment = time.monotonic()
+        self.__lock = make_lock("replenishment")
+
+    def __repr__(self) -> str:
+        return f"{self.demand}"
+
+    def record_order(self, order: Dict[int, int], shortage: Dict[int, int]) -> None:
+        '''
+        Method for reporting order handled by producer (called by producer threads).
+
+            Parameters:
+                    order (dict): Product IDs mapped to ordered amounts.
+                    shortage (dict): Product IDs mapped to amounts that were missing (empty if order was realized).
+
+            Returns:
+                    None
+        '''
+        with self.__lock:
+            for product_id, amount in order.items():
+                self.__ordered[product_id] = self.__ordered.get(product_id, 0) + amount
+                lines = self.__lines.setdefault(product_id, [0, 0])
+                lines[0] += 1
+                lines[1] += amount
+            for product_id, amount in shortage.items():
+                self.__shortage[product_id] = self.__shortage.get(product_id, 0) + amount
+
+    def record_request(self, requested_products: Iterable[int], offer: Mapping[int, tuple]) -> None:
+        '''
+        Method for reporting offer request handled by producer (called by producer threads).
+
+            Parameters:
+                    requested_products (iterable): IDs of products customer asked for.
+                    offer (mapping): Offer sent to customer (products out of stock aren't in it).
+
+            Returns:
+                    None
+        '''
+        missed = [product_id for product_id in requested_products
+                  if product_id not in offer and product_id in self.generator.products]
+        if missed:
+            with self.__lock:
+                for product_id in missed:
+                    self.__missed[product_id] = self.__missed.get(product_id, 0) + 1
+
+    def start(self) -> None:
+        '''
+        Method scheduling periodic adjustments in generator's scheduler (called by generator thread before it runs
+        scheduler).
+
+            Returns:
+                    None
+        '''
+        self.__last_adjustment = time.monotonic()
+        self.generator.scheduler.enter(self.period, 0, self.__adjust)
+
+    def __adjust(self) -> None:
+        '''
+        Inner function updating demand of every product and production rate following it, then scheduling itself.
+        Refused amounts count as demand twice - refusals mean that stock was too low even for the last period.
+        '''
+        self.generator.scheduler.enter(self.period, 0, self.__adjust)
+        now = time.monotonic()
+        elapsed, self.__last_adjustment = now - self.__last_adjustment, now
+        with self.__lock:
+            ordered, self.__ordered = self.__ordered, {}
+            shortage, self.__shortage = self.__shortage, {}
+            missed, self.__missed = self.__missed, {}
+            mean_lines = {product_id: amount / count for product_id, (count, amount) in self.__lines.items()}
+        for product_id in list(self.generator.products):
+            stored = self.warehouse.products.get(product_id)
+            if stored is None:
+                continue
+            lost = missed.get(product_id, 0) * mean_lines.get(product_id, 1.0)
+            rate = (ordered.get(product_id, 0) + shortage.get(product_id, 0) + lost) / elapsed
+            demand = self.demand.get(product_id)
+            demand = rate if demand is None else self.smoothing * rate + (1 - self.smoothing) * demand
+            self.demand[product_id] = demand
+            target_stock = min(demand * self.coverTime, stored.limit)
+            self.generator.change_rate(product_id, max(demand + (target_stock - stored.amount) / self.coverTime, 0.0))
+        logging.debug(f"replenishment: demand {self.demand}, generator {self.generator}")
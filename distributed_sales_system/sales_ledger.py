@@ -0,0 +1,253 @@
+from typing import Dict, List, Optional, Tuple
+from array import array
+from distributed_sales_system.lock_stats import make_lock
+import heapq
+import mmap
+import os
+import time
+from distributed_sales_system.product_register import ProductCatalog, product_register
+
+
+class SalesLedger:
+    '''
+    A class representing append-only sales ledger.
+
+    Every order line (single product inside order) is stored as one row. Rows are kept in columns (one typed array
+    per field), so queries touch only the columns they need. Appends are buffered and written in batches. If directory
+    is passed, every column is appended to its own raw binary file, which is memory-mapped for queries - history is
+    never loaded into Python objects.
+
+    ...
+
+    Attributes
+    ----------
+    directory (str | None):
+            Directory with column files. If None ledger is kept in memory only.
+    batch_size (int):
+            Number of buffered rows after which they are flushed to columns.
+    columns (tuple):
+            Class attribute, names and array typecodes of ledger columns.
+    '''
+
+    columns = (('timestamp', 'd'), ('producer', 'I'), ('customer', 'I'), ('product', 'I'),
+               ('quantity', 'I'), ('unit_price', 'd'), ('discount', 'd'), ('completed', 'B'))
+    symbols_file = 'symbols.txt'
+
+    def __init__(self, directory: Optional[str] = None, batch_size: int = 1024) -> None:
+        if batch_size <= 0:
+            raise ValueError("SalesLedger: Batch size has to be greater than zero!")
+        self.directory = directory
+        self.batch_size = batch_size
+        self.lock = make_lock("sales_ledger")
+        self.__pending = {name: array(typecode) for name, typecode in SalesLedger.columns}
+        self.__stored = {name: array(typecode) for name, typecode in SalesLedger.columns}
+        self.__mapped: Dict[str, Tuple[int, mmap.mmap, memoryview, memoryview]] = {}
+        self.__symbols: List[str] = []
+        self.__symbol_ids: Dict[str, int] = {}
+        self.__flushed_symbols = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            symbols_path = os.path.join(directory, SalesLedger.symbols_file)
+            if os.path.exists(symbols_path):
+                with open(symbols_path, encoding='utf-8') as symbols:
+                    for line in symbols:
+                        self.__intern(line.rstrip('\n'))
+                self.__flushed_symbols = len(self.__symbols)
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.__stored_rows() + len(self.__pending['timestamp'])
+
+    def record_order(self, producer_name: str, customer_name: str, order: Dict[str, int], prices: Dict[str, float],
+                     discount_multiplier: float = 1.0, completed: bool = True, timestamp: Optional[float] = None,
+                     catalog: Optional[ProductCatalog] = None) -> None:
+        '''
+        Method for appending order to the ledger. Each ordered product becomes a separate row.
+
+            Parameters:
+                    producer_name (str): Name of producer that handled the order.
+                    customer_name (str): Name of customer that placed the order.
+                    order (dict): Product IDs mapped to ordered amount.
+                    prices (dict): Product IDs mapped to unit price (before discount).
+                    discount_multiplier (float): Multiplier applied to the prices. 1.0 means no discount.
+                    completed (bool): True if order was realized, False if it was refused.
+                    timestamp (float): Time of the order. Current time is used if not passed.
+                    catalog (ProductCatalog): Catalog of ordered products (default catalog if not passed).
+
+            Returns:
+                    None
+        '''
+        timestamp = time.time() if timestamp is None else timestamp
+        catalog = catalog if catalog is not None else product_register
+        with self.lock:
+            producer_id = self.__intern(producer_name)
+            customer_id = self.__intern(customer_name)
+            pending = self.__pending
+            for product_id, amount in order.items():
+                pending['timestamp'].append(timestamp)
+                pending['producer'].append(producer_id)
+                pending['customer'].append(customer_id)
+                pending['product'].append(self.__intern(catalog[product_id]))
+                pending['quantity'].append(amount)
+                pending['unit_price'].append(prices.get(product_id, 0.0))
+                pending['discount'].append(discount_multiplier)
+                pending['completed'].append(1 if completed else 0)
+            if len(pending['timestamp']) >= self.batch_size:
+                self.__flush()
+
+    def flush(self) -> None:
+        '''
+        Method for moving buffered rows into columns (and column files, if ledger is stored on disk).
+
+            Returns:
+                    None
+        '''
+        with self.lock:
+            self.__flush()
+
+    def column(self, name: str) -> memoryview:
+        '''
+        Method for getting read-only view of a whole column. Buffered rows are flushed first.
+
+            Parameters:
+                    name (str): Name of the column (one of SalesLedger.columns).
+
+            Returns:
+                    Typed memoryview of the column. For ledger stored on disk it's backed by memory-mapped file,
+                    for in-memory ledger it's a copy. It doesn't include rows appended after this call.
+        '''
+        with self.lock:
+            self.__flush()
+            if self.directory is None:
+                # copy, exported in-memory array couldn't be extended by next flush
+                return memoryview(self.__stored[name][:])
+            return self.__column(name)
+
+    def revenue_per_product(self) -> Dict[str, float]:
+        '''
+        Method for calculating revenue of completed orders per product.
+
+            Returns:
+                    revenue (dict): Product name mapped to total revenue.
+        '''
+        with self.lock:
+            self.__flush()
+            revenue = [0.0] * len(self.__symbols)
+            for product, quantity, price, discount, completed in zip(self.__column('product'), self.__column('quantity'),
+                                                                     self.__column('unit_price'), self.__column('discount'),
+                                                                     self.__column('completed')):
+                if completed:
+                    revenue[product] += quantity * price * discount
+            return {self.__symbols[product]: value for product, value in enumerate(revenue) if value}
+
+    def top_customers(self, n: int = 10) -> List[Tuple[str, float]]:
+        '''
+        Method for finding customers that spent the most.
+
+            Parameters:
+                    n (int): Number of customers to return.
+
+            Returns:
+                    List of (customer name, total spendings) tuples, sorted by spendings descending.
+        '''
+        with self.lock:
+            self.__flush()
+            spendings = [0.0] * len(self.__symbols)
+            for customer, quantity, price, discount, completed in zip(self.__column('customer'), self.__column('quantity'),
+                                                                      self.__column('unit_price'), self.__column('discount'),
+                                                                      self.__column('completed')):
+                if completed:
+                    spendings[customer] += quantity * price * discount
+            best = heapq.nlargest(n, ((value, customer) for customer, value in enumerate(spendings) if value))
+            return [(self.__symbols[customer], value) for value, customer in best]
+
+    def stock_out_frequency(self) -> Dict[str, float]:
+        '''
+        Method for calculating how often orders for given product were refused.
+
+            Returns:
+                    frequency (dict): Product name mapped to fraction (0.0 - 1.0) of refused order lines.
+        '''
+        with self.lock:
+            self.__flush()
+            total = [0] * len(self.__symbols)
+            refused = [0] * len(self.__symbols)
+            for product, completed in zip(self.__column('product'), self.__column('completed')):
+                total[product] += 1
+                if not completed:
+                    refused[product] += 1
+            return {self.__symbols[product]: refused[product] / count for product, count in enumerate(total) if count}
+
+    def close(self) -> None:
+        '''
+        Method for flushing remaining rows and releasing memory-mapped files.
+
+            Returns:
+                    None
+        '''
+        with self.lock:
+            self.__flush()
+            for _, mapping, base, view in self.__mapped.values():
+                view.release()
+                base.release()
+                mapping.close()
+            self.__mapped = {}
+
+    def __intern(self, name: str) -> int:
+        '''
+        Inner function mapping name (producer, customer or product) to integer stored in columns.
+        '''
+        symbol_id = self.__symbol_ids.get(name)
+        if symbol_id is None:
+            symbol_id = len(self.__symbols)
+            self.__symbols.append(name)
+            self.__symbol_ids[name] = symbol_id
+        return symbol_id
+
+    def __stored_rows(self) -> int:
+        '''
+        Inner function returning number of rows already flushed to columns.
+        '''
+        if self.directory is None:
+            return len(self.__stored['timestamp'])
+        path = os.path.join(self.directory, 'timestamp.bin')
+        return os.path.getsize(path) // array('d').itemsize if os.path.exists(path) else 0
+
+    def __flush(self) -> None:
+        '''
+        Inner function for flushing buffered rows. Has to be called with lock acquired.
+        '''
+        if not len(self.__pending['timestamp']):
+            return
+        for name, typecode in SalesLedger.columns:
+            if self.directory is None:
+                self.__stored[name].extend(self.__pending[name])
+            else:
+                with open(os.path.join(self.directory, name + '.bin'), 'ab') as column_file:
+                    self.__pending[name].tofile(column_file)
+            self.__pending[name] = array(typecode)
+        if self.directory is not None and self.__flushed_symbols < len(self.__symbols):
+            with open(os.path.join(self.directory, SalesLedger.symbols_file), 'a', encoding='utf-8') as symbols:
+                symbols.writelines(name + '\n' for name in self.__symbols[self.__flushed_symbols:])
+            self.__flushed_symbols = len(self.__symbols)
+
+    def __column(self, name: str) -> memoryview:
+        '''
+        Inner function returning view of flushed column. Has to be called with lock acquired.
+        '''
+        typecode = dict(SalesLedger.columns)[name]
+        if self.directory is None:
+            return memoryview(self.__stored[name])
+        path = os.path.join(self.directory, name + '.bin')
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size == 0:
+            return memoryview(array(typecode))
+        if name in self.__mapped and self.__mapped[name][0] == size:
+            return self.__mapped[name][3]
+        # previous mapping (if any) is not closed explicitly - views returned earlier may still use it
+        with open(path, 'rb') as column_file:
+            mapping = mmap.mmap(column_file.fileno(), size, access=mmap.ACCESS_READ)
+        base = memoryview(mapping)
+        view = base.cast(typecode)
+        self.__mapped[name] = (size, mapping, base, view)
+        return view
@@ -0,0 +1,175 @@
+'''
+Declarative scenarios - markets described in JSON Lines file (one agent per line) or JSON file (array of agents).
+Records are streamed lazily and agents are built and registered in batches.
+
+Producer record:
+    {"type": "producer", "name": "producer_1", "products": ["apple", "pear"], "workers": 2}
+    (accepted keys besides type and name are producer_options: products, request_queue_size, order_queue_size,
+    shed_threshold, workers, replenishment_period and scheduling - other keys are rejected; sales ledger, market
+    board and market are passed to load_scenario)
+Customer record:
+    {"type": "customer", "name": "customer_1", "purchases": 2, "shopping_list": {"apple": 3}, "think_time": 0.5}
+    (think_time is ignored for pooled customers)
+Record with "count" describes many agents at once, "{i}" in name is replaced with agent number:
+    {"type": "customer", "count": 100000, "name": "customer_{i}", "purchases": 1}
+'''
+
+from distributed_sales_system import default_market
+from distributed_sales_system.market import Market
+from distributed_sales_system.producer import Producer
+from distributed_sales_system.customer import Customer
+from distributed_sales_system.customer_pool import CustomerPool, PooledCustomer
+from distributed_sales_system.sales_ledger import SalesLedger
+from distributed_sales_system.market_board import MarketBoard
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple, Union
+from itertools import chain
+import json
+
+producer_options = ('products', 'request_queue_size', 'order_queue_size', 'shed_threshold', 'workers',
+                    'replenishment_period', 'scheduling')
+
+
+def read_scenario(path: str, chunk_size: int = 1 << 16) -> Iterator[Dict]:
+    '''
+    Function lazily reading agent records from scenario file. Records with "count" are expanded.
+
+        Parameters:
+                path (str): Path to .jsonl file (one record per line) or .json file (array of records).
+                chunk_size (int): Size of chunks in which JSON array is read.
+
+        Returns:
+                Iterator over agent records (dicts).
+    '''
+    with open(path, encoding='utf-8') as scenario_file:
+        if path.endswith('.jsonl'):
+            records = (json.loads(line) for line in scenario_file if line.strip())
+        else:
+            records = _iter_json_array(scenario_file, chunk_size)
+        for record in records:
+            yield from _expand(record)
+
+
+def load_scenario(path: str, batch_size: int = 1000, pool: Optional[CustomerPool] = None,
+                  sales_ledger: Optional[SalesLedger] = None,
+                  market_board: Optional[MarketBoard] = None,
+                  market: Optional[Market] = None) -> Tuple[List[Producer], List[Union[Customer, PooledCustomer]]]:
+    '''
+    Function building market from scenario file. Agents are created in batches - products of whole batch are
+    validated at once and agents are registered in market's user register with single bulk call.
+
+        Parameters:
+                path (str): Path to scenario file.
+                batch_size (int): Number of agents of one type built and registered together.
+                pool (CustomerPool): If passed, customers are created as pooled customers, otherwise as threads.
+                sales_ledger (SalesLedger): Ledger shared by all producers (optional).
+                market_board (MarketBoard): Board where producers publish offers and customer threads read them
+                                            (optional, pooled customers use board of the pool).
+                market (Market): Market of the agents (optional, default market of the package if not passed,
+                                 pooled customers shop in market of the pool).
+
+        Returns:
+                (producers, customers): Lists of created agents (not started).
+    '''
+    market = market if market is not None else default_market
+    producers, customers = [], []
+    producer_batch, customer_batch = [], []
+    for record in read_scenario(path):
+        if record.get('type') == 'producer':
+            producer_batch.append(record)
+            if len(producer_batch) >= batch_size:
+                producers.extend(_build_producers(producer_batch, sales_ledger, market_board, market))
+                producer_batch = []
+        elif record.get('type') == 'customer':
+            customer_batch.append(record)
+            if len(customer_batch) >= batch_size:
+                customers.extend(_build_customers(customer_batch, pool, market_board, market))
+                customer_batch = []
+        else:
+            raise ValueError(f"Scenario: Unknown agent type in record {record}!")
+    if producer_batch:
+        producers.extend(_build_producers(producer_batch, sales_ledger, market_board, market))
+    if customer_batch:
+        customers.extend(_build_customers(customer_batch, pool, market_board, market))
+    return producers, customers
+
+
+def _expand(record: Dict) -> Iterator[Dict]:
+    '''
+    Inner function expanding record with "count" into separate agent records.
+    '''
+    if 'count' not in record:
+        yield record
+        return
+    template = {key: value for key, value in record.items() if key != 'count'}
+    for i in range(record['count']):
+        agent = template.copy()
+        agent['name'] = template['name'].format(i=i)
+        yield agent
+
+
+def _iter_json_array(scenario_file: TextIO, chunk_size: int) -> Iterator[Dict]:
+    '''
+    Inner function decoding elements of top-level JSON array one by one, reading file in chunks.
+    '''
+    decoder = json.JSONDecoder()
+    buffer = scenario_file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError("Scenario: JSON scenario has to be an array of agents!")
+    position = 1
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = scenario_file.read(chunk_size)
+            if not chunk:
+                raise ValueError("Scenario: Unexpected end of JSON scenario!") from None
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield record
+        if position > chunk_size:
+            buffer, position = buffer[position:], 0
+
+
+def _build_producers(records: List[Dict], sales_ledger: Optional[SalesLedger],
+                     market_board: Optional[MarketBoard], market: Market) -> List[Producer]:
+    '''
+    Inner function building batch of producers and registering them in bulk.
+    '''
+    for record in records:
+        unknown = record.keys() - {'type', 'name', *producer_options}
+        if unknown:
+            raise ValueError(f"Scenario: Unknown producer options {sorted(unknown)} in record {record}!")
+    missing = market.catalog.missing(chain.from_iterable(record['products'] for record in records))
+    if missing:
+        raise ValueError(f"Scenario: Products not possible: {sorted(missing)}!")
+    producers = [Producer(record['name'], sales_ledger=sales_ledger, register=False, market_board=market_board,
+                          market=market, **{key: record[key] for key in producer_options if key in record}) for record in records]
+    producer_ids = market.register.add_producers(
+        (producer.name, list(producer.products.keys()), producer.request_queue, producer.order_queue) for producer in producers)
+    for producer, producer_id in zip(producers, producer_ids):
+        producer.id = producer_id
+        market.register.watch(producer_id, producer)
+    return producers
+
+
+def _build_customers(records: List[Dict], pool: Optional[CustomerPool],
+                     market_board: Optional[MarketBoard], market: Market) -> List[Union[Customer, PooledCustomer]]:
+    '''
+    Inner function building batch of customers and registering them in bulk.
+    '''
+    if pool is not None:
+        return pool.add_customers((record['name'], record.get('purchases', 1), record.get('shopping_list'))
+                                  for record in records)
+    customers = [Customer(record['name'], record.get('purchases', 1), record.get('shopping_list'), register=False,
+                          think_time=record.get('think_time', 0.0), market_board=market_board, market=market)
+                 for record in records]
+    customer_ids = market.register.add_customers((customer.name, customer.offer_queue) for customer in customers)
+    for customer, customer_id in zip(customers, customer_ids):
+        customer.id = customer_id
+        market.register.watch(customer_id, customer)
+    return customers
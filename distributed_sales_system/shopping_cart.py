@@ -0,0 +1,349 @@
+from distributed_sales_system import default_market, logging
+from .market import Market
+from .product_register import ProductCatalog, product_register
+from typing import List, Dict, Mapping, Tuple, Optional
+from itertools import accumulate
+from random import randint, choices
+import weakref
+
+
+class ZipfShoppingLists:
+    '''
+    A class generating shopping lists with Zipf-skewed product popularity - product with rank k is chosen
+    with probability proportional to 1 / k^exponent (rank is position in product register).
+
+    ...
+
+    Attributes
+    ----------
+    exponent (float):
+            Skew of popularity. 0 means uniform popularity.
+    max_products_in_list (int):
+            Maximum number of different products in shopping list.
+    max_product_amount (int):
+            Maximum amount of every product in shopping list.
+    catalog_size (int):
+            Number of products of catalog when generator was built (products registered later are never chosen).
+    __products (list):
+            Names of products from catalog (default catalog if not passed, e.g. pool.market.catalog).
+    '''
+
+    def __init__(self, exponent: float = 1.0, max_products_in_list: int = 4, max_product_amount: int = 10,
+                 catalog: Optional[ProductCatalog] = None) -> None:
+        catalog = catalog if catalog is not None else product_register
+        if max_products_in_list > len(catalog):
+            raise ValueError("ZipfShoppingLists: Shopping list cannot be longer than product register!")
+        self.exponent = exponent
+        self.max_products_in_list = max_products_in_list
+        self.max_product_amount = max_product_amount
+        self.__products = list(catalog)
+        self.catalog_size = len(self.__products)
+        self.__cum_weights = list(accumulate(1 / rank ** exponent for rank in range(1, len(self.__products) + 1)))
+
+    def __call__(self) -> Dict[str, int]:
+        '''
+        Method generating one shopping list.
+
+            Returns:
+                    shopping_list (dict): Product names mapped to amount.
+        '''
+        return {self.__products[product_id]: amount for product_id, amount in self.draw().items()}
+
+    def draw(self, max_products_in_list: Optional[int] = None, max_product_amount: Optional[int] = None) -> Dict[int, int]:
+        '''
+        Method generating one shopping list of product IDs (rank of product is its ID).
+
+            Parameters:
+                    max_products_in_list (int): Maximum number of products (at most catalog size),
+                                                max_products_in_list attribute if not passed.
+                    max_product_amount (int): Maximum amount of every product, max_product_amount attribute
+                                              if not passed.
+
+            Returns:
+                    shopping_list (dict): Product IDs mapped to amount.
+        '''
+        max_products_in_list = self.max_products_in_list if max_products_in_list is None \
+            else min(max_products_in_list, self.catalog_size)
+        max_product_amount = self.max_product_amount if max_product_amount is None else max_product_amount
+        number_of_products = randint(1, max_products_in_list)
+        product_ids = range(self.catalog_size)
+        shopping_list = {}
+        while len(shopping_list) < number_of_products:
+            for product_id in choices(product_ids, cum_weights=self.__cum_weights, k=number_of_products - len(shopping_list)):
+                shopping_list[product_id] = randint(1, max_product_amount)
+        return shopping_list
+
+
+# catalog mapped to Zipf generator shared by shopping carts of all markets using the catalog
+_popularity = weakref.WeakKeyDictionary()
+
+
+class ShoppingCart:
+    """
+    Class representing shopping state of customer during one purchase. It contains customer's decision logic
+    (shopping list, collected offers, cost function and preference list), independent of the way customer
+    communicates with producers - used both by Customer threads and by customers in CustomerPool.
+
+    Attributes
+    ----------
+    shopping_list (dict):
+        IDs of products mapped to amount. Represents shopping list. It can be passed as argument (by product names)
+        or be generated automatically based on products available in product register.
+    producers_data (dict):
+        Dictionary mapping producer id to offered products. Information about product contain available amount and
+        price per unit. Offers are read-only (the same offer snapshot is shared by many customers) and may hold whole
+        range of producer - cart only looks up products of shopping list, so its work doesn't depend on offer size.
+    preference_list (list):
+        List of preference producers, by selection criterion. We prefer producers that can complete most part of order.
+    possible_producers (dict):
+        Stores ID and queues (communication) of producers that have at least one product we want to buy.
+    market (Market):
+        Market where customer shops (its catalog and register are used).
+    popularityExponent (float):
+        Class attribute, skew of Zipf popularity of products in generated shopping lists (0 means uniform).
+    """
+
+    popularityExponent = 1.0
+
+    __slots__ = ('market', 'shopping_list', 'producers_data', 'preference_list', 'possible_producers')
+
+    def __init__(self, shopping_list: Optional[Dict[str, int]] = None, market: Optional[Market] = None) -> None:
+        """
+        Function for initialization of shopping cart.
+
+        Parameters:
+            shopping_list (dict): Dict mapping name of product to it's number (names are translated to product IDs)
+            market (Market): Market where customer shops (default market of the package if not passed).
+
+        Raises:
+            ValueError - product of shopping list is not in catalog of the market.
+        """
+        self.market = market if market is not None else default_market
+        catalog = self.market.catalog
+        self.producers_data: Dict[int, Mapping[int, Tuple[int, float]]] = {}
+        self.preference_list: List[Tuple[int, float]] = []
+        self.possible_producers: Dict[int, List] = {}
+        self.shopping_list: Dict[int, int] = {}
+        if shopping_list is not None:
+            for product, amount in shopping_list.items():
+                if product not in catalog:
+                    raise ValueError(f"ShoppingCart: Product {product} is not in product register!")
+                self.shopping_list[catalog.product_id(product)] = amount
+
+    def generate_shopping_list(self, max_products_in_list=4, max_product_amount=10,
+                               popularity: Optional[ZipfShoppingLists] = None) -> None:
+        """
+        Function for generating shopping list. Product are chosen from catalog of the market, with Zipf-skewed
+        popularity (see popularityExponent) - a few products are wanted by most customers, like in real shops.
+
+            Parameters:
+                max_products_in_list (int): Maximum number of products in shopping list.
+
+                max_product_amount (int): Maximum amount of every product in shopping list.
+
+                popularity (ZipfShoppingLists): Popularity of products (shared generator for market's catalog
+                                                and popularityExponent if not passed).
+
+            Returns:
+                 None
+        """
+        if popularity is None:
+            popularity = self.__popularity()
+        self.shopping_list.update(popularity.draw(max_products_in_list, max_product_amount))
+
+    def __popularity(self) -> ZipfShoppingLists:
+        """
+        Inner function returning Zipf generator of market's catalog (rebuilt when catalog grows or exponent changes).
+        """
+        catalog = self.market.catalog
+        popularity = _popularity.get(catalog)
+        if popularity is None or popularity.catalog_size != len(catalog) \
+                or popularity.exponent != self.popularityExponent:
+            popularity = ZipfShoppingLists(self.popularityExponent, 1, catalog=catalog)
+            _popularity[catalog] = popularity
+        return popularity
+
+    def get_producers_from_register(self, customer_id: int) -> None:
+        """
+        Function for contacting user register of the market for information about possible producers.
+
+            Parameters:
+                customer_id (int): ID of customer (used by register for routing between producer replicas).
+
+            Returns:
+                None
+
+        """
+        self.possible_producers = self.market.register.producer_with_products(self.shopping_list, customer_id)
+
+    def add_offer(self, producer_id: int, products_info: Mapping[int, Tuple[int, float]]) -> None:
+        """
+        Function for storing producer's offer. Producer without any available product from shopping list is removed
+        from possible producers. Offer isn't modified or copied (products with zero amount are skipped on lookup).
+
+            Parameters:
+                producer_id (int): ID of producer.
+
+                products_info (mapping): Mapping of product ID to amount and price (id: (amount, price)).
+
+            Returns:
+                None
+        """
+        if any(self.__available(products_info, product) for product in self.shopping_list):
+            self.producers_data[producer_id] = products_info
+        else:
+            self.remove_producer(producer_id)
+
+    def remove_producer(self, producer_id: int) -> None:
+        """
+        Function for removing producer from possible producers (it didn't answer or we already ordered from it).
+
+            Parameters:
+                producer_id (int): ID of producer.
+
+            Returns:
+                None
+        """
+        self.possible_producers.pop(producer_id, None)
+
+    def next_producer(self) -> int:
+        """
+        Function for taking the most preferred producer from preference list.
+
+            Returns:
+                producer_id (int): ID of producer.
+        """
+        return self.preference_list.pop(0)[0]
+
+    def prepare_order_for_producer(self, producer_id) -> Dict[int, int]:
+        """
+        Function for preparing order.
+
+            Parameters:
+                producer_id (int): ID of producer that we want to buy from.
+
+            Returns:
+                 order (dict): Dictionary mapping product ID to amount (id:amount).
+        """
+        order = {}
+        producer_info = self.producers_data[producer_id]
+        for product, product_need in self.shopping_list.items():
+            product_amount = self.__available(producer_info, product)
+            if product_amount:
+                order[product] = product_need if product_amount >= product_need else product_amount
+        return order
+
+    def plan_orders(self) -> Dict[int, Dict[int, int]]:
+        """
+        Function for splitting shopping list into orders for all producers at once - producers are taken in preference
+        order and every one gets what is left of shopping list (as if all previous orders were completed).
+
+            Returns:
+                 plan (dict): Dictionary mapping producer ID to its order (only producers with non-empty order).
+        """
+        remaining = dict(self.shopping_list)
+        plan = {}
+        for producer_id, _ in self.preference_list:
+            producer_info = self.producers_data[producer_id]
+            order = {}
+            for product, product_need in remaining.items():
+                product_amount = self.__available(producer_info, product)
+                if product_amount:
+                    order[product] = min(product_need, product_amount)
+            if order:
+                plan[producer_id] = order
+                for product, amount in order.items():
+                    remaining[product] -= amount
+                remaining = {product: amount for product, amount in remaining.items() if amount}
+            if not remaining:
+                break
+        return plan
+
+    def order_completed(self, order: Dict[int, int]) -> None:
+        """
+        Function for updating shopping list after order was realized.
+
+            Parameters:
+                order (dict): Dictionary mapping product ID to bought amount.
+
+            Returns:
+                None
+        """
+        for bought_product in order:
+            self.shopping_list[bought_product] -= order[bought_product]
+            if self.shopping_list[bought_product] == 0:
+                del self.shopping_list[bought_product]
+
+    def create_preference_list(self) -> None:
+        """
+        Function for creating preference list. It includes:
+        - calculation of cost function per producer
+        - sorting results
+
+            Results:
+                None
+        """
+        cost_for_producers = []
+        for possible_producer in self.possible_producers:
+            cost_for_producers.append((possible_producer, self.__cost_function(self.producers_data[possible_producer])))
+        logging.debug(f"preference list: {cost_for_producers}")
+        self.preference_list = sorted(cost_for_producers, key=lambda producer_data: producer_data[1])
+
+    def clear(self) -> None:
+        """
+        Function for removing data remaining after completing order.
+
+            Returns:
+                None
+        """
+        self.shopping_list: Dict[int, int] = {}
+        self.producers_data: Dict[int, Mapping[int, Tuple[int, float]]] = {}
+        self.preference_list: List[Tuple[int, float]] = []
+        self.possible_producers: Dict[int, List] = {}
+
+    @staticmethod
+    def __available(products_info: Mapping[int, Tuple[int, float]], product: int) -> int:
+        """
+        Inner function for checking if producer has a product (zero amount means product is not available
+        and should be skipped).
+
+            Parameters:
+                products_info (mapping): Mapping of product ID to amount and price (id: (amount, price)).
+
+                product (int): Product ID.
+
+            Returns:
+                Available amount of product (0 if it isn't offered).
+        """
+        info = products_info.get(product)
+        return info[0] if info is not None else 0
+
+    def __cost_function(self, products_data: Mapping[int, Tuple[int, float]]) -> float:
+        """
+        Internal function for calculating cost function (selection criterion) for producer - gives penalty for missing
+        products and too little amount.
+
+            Parameters:
+                products_data (mapping): Mapping of product ID to amount and price (id: (amount, price))
+
+            Returns:
+                cost (float): Value of cost function.
+        """
+
+        missing_products = 0
+        cost = 0
+        for product, product_need in self.shopping_list.items():
+            info = products_data.get(product)
+            if info is None or not info[0]:
+                missing_products += 1
+            else:
+                product_amount, product_cost = info
+                is_order_satisfied = product_amount >= product_need
+                order_amount = product_need if is_order_satisfied else product_amount
+                product_amount_coef = 1 if is_order_satisfied else product_amount/product_need
+                cost += product_cost*order_amount/product_amount_coef
+        products_number_coef = missing_products/len(self.shopping_list)
+        if products_number_coef != 0:
+            return cost/products_number_coef
+        else:
+            return cost
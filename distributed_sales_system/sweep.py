@@ -0,0 +1,223 @@
+'''
+Parameter sweeps of market simulations.
+
+Every configuration (producer count, catalog size, price, discount threshold, generator rate, load...) is simulated
+in its own isolated market (see Market) by worker process of a process pool, so sweep uses all cores and runs don't
+share register, catalog or stop signal. Metrics of every finished run are appended to one CSV table right away -
+interrupted sweep continues where it stopped, configurations already in the table are skipped.
+
+Example:
+    configs = sweep_grid(producers=[2, 4, 8], create_time=[1, 2])
+    rows = Sweep("sweep.csv").run(configs)
+'''
+
+from distributed_sales_system import logging
+from distributed_sales_system.market import Market
+from distributed_sales_system.product_register import ProductCatalog
+from distributed_sales_system.producer import Producer
+from distributed_sales_system.customer_pool import CustomerPool
+from distributed_sales_system.sales_ledger import SalesLedger
+from distributed_sales_system.load_generator import LoadGenerator, ZipfShoppingLists, poisson_arrivals
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from itertools import product
+from typing import Dict, Iterable, List, Optional, Union
+import csv
+import json
+import os
+import random
+import time
+
+Config = Dict[str, Union[int, float]]
+
+default_config: Config = {
+    'producers': 4,              # number of producers, every one sells whole catalog
+    'products': 6,               # catalog size
+    'price': 1.0,                # price of every product
+    'discount_threshold': 50.0,  # Producer.discountThreshold
+    'amount': 20,                # initial amount of every product
+    'limit': 200,                # warehouse limit of every product
+    'create_time': 1,            # generator period (seconds)
+    'create_amount': 5,          # generator amount per period
+    'qps': 20.0,                 # customer arrivals per second (Poisson)
+    'duration': 5.0,             # seconds of arrivals
+    'workers': 4,                # customer pool workers
+    'zipf_exponent': 1.0,        # skew of product popularity
+    'seed': 0,                   # seed of random shopping lists and arrivals
+}
+
+metric_names = ('issued', 'finished', 'throughput', 'latency_p50', 'latency_p99', 'fill_rate', 'refused_lines',
+                'revenue', 'elapsed')
+
+
+def sweep_grid(**axes: Iterable) -> List[Config]:
+    '''
+    Function building configurations of all combinations of given parameter values (cartesian product).
+
+        Parameters:
+                axes: Parameter name (key of default_config) mapped to values it takes.
+
+        Returns:
+                List of configurations (only swept parameters, the rest is taken from default_config).
+
+        Raises:
+                ValueError - unknown parameter.
+    '''
+    unknown = set(axes).difference(default_config)
+    if unknown:
+        raise ValueError(f"Sweep: Unknown parameters {sorted(unknown)}!")
+    names = list(axes)
+    return [dict(zip(names, values)) for values in product(*(list(axes[name]) for name in names))]
+
+
+def config_key(config: Config) -> str:
+    '''
+    Function returning canonical key of configuration (complete with defaults), used to skip computed runs.
+
+        Parameters:
+                config (dict): Configuration.
+
+        Returns:
+                JSON of complete configuration with sorted keys.
+    '''
+    return json.dumps(dict(default_config, **config), sort_keys=True)
+
+
+def run_market(config: Config) -> Dict[str, float]:
+    '''
+    Function simulating one configuration in new market - producers selling whole catalog, open-loop Poisson arrivals
+    of pooled customers with Zipf-skewed shopping lists.
+
+        Parameters:
+                config (dict): Configuration (missing parameters are taken from default_config).
+
+        Returns:
+                Metrics of the run: issued and finished customers, throughput (customers per second), p50/p99 latency
+                (seconds), fill rate (bought units / wanted units), refused order lines, revenue and elapsed time.
+    '''
+    settings = dict(default_config, **config)
+    random.seed(settings['seed'])
+    market = Market("sweep", catalog=ProductCatalog(f"product_{i}" for i in range(settings['products'])))
+    # discount threshold is class attribute read by constructor, subclass keeps other runs of the process intact
+    producer_class = type("SweepProducer", (Producer,), {'discountThreshold': settings['discount_threshold']})
+    ledger = SalesLedger()
+    product_params = {name: {'price': settings['price'], 'amount': settings['amount'], 'limit': settings['limit'],
+                             'create_time': settings['create_time'], 'create_amount': settings['create_amount']}
+                      for name in market.catalog}
+    producers = [producer_class(f"producer_{i}", products=product_params, sales_ledger=ledger, workers=1,
+                                market=market) for i in range(settings['producers'])]
+    wanted = []
+    zipf_lists = ZipfShoppingLists(settings['zipf_exponent'], min(4, settings['products']), catalog=market.catalog)
+
+    def shopping_lists():
+        shopping_list = zipf_lists()
+        wanted.append(sum(shopping_list.values()))
+        return shopping_list
+    start = time.perf_counter()
+    try:
+        for producer in producers:
+            producer.start()
+        pool = CustomerPool(workers=settings['workers'], market=market)
+        pool.start()
+        generator = LoadGenerator(pool, poisson_arrivals(settings['qps'], settings['duration']), shopping_lists)
+        generator.run(timeout=max(30.0, settings['duration']))
+        pool.join(timeout=5.0)
+    finally:
+        market.close()
+        for producer in producers:
+            producer.join()
+            producer.close()
+    elapsed = time.perf_counter() - start
+    report = generator.report()
+    ledger.flush()
+    completed = ledger.column('completed')
+    bought = sum(quantity for quantity, line_completed in zip(ledger.column('quantity'), completed) if line_completed)
+    return {'issued': report['issued'], 'finished': report['finished'], 'throughput': report['throughput'],
+            'latency_p50': report['latency_p50'], 'latency_p99': report['latency_p99'],
+            'fill_rate': bought / sum(wanted) if wanted else 0.0, 'refused_lines': completed.tolist().count(0),
+            'revenue': sum(ledger.revenue_per_product().values()), 'elapsed': elapsed}
+
+
+def _init_worker() -> None:
+    '''
+    Inner function run in every worker process before first simulation - debug logging of agents is silenced.
+    '''
+    logging.disable(logging.DEBUG)
+
+
+class Sweep:
+    '''
+    A class representing parameter sweep writing its results into CSV table (one row per configuration: complete
+    configuration as JSON, every parameter in its own column and metrics of run_market).
+
+    ...
+
+    Attributes
+    ----------
+    path (str):
+            Path of results table. Rows already there are kept and their configurations aren't run again.
+    workers (int):
+            Number of worker processes (number of cores by default).
+    '''
+
+    def __init__(self, path: str, workers: Optional[int] = None) -> None:
+        if workers is not None and workers <= 0:
+            raise ValueError("Sweep: Number of workers has to be greater than zero!")
+        self.path = path
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+
+    def results(self) -> List[Dict[str, str]]:
+        '''
+        Method reading rows of results table.
+
+            Returns:
+                    List of rows (column name mapped to value as text), empty if table doesn't exist yet.
+        '''
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, newline='', encoding='utf-8') as table:
+            return list(csv.DictReader(table))
+
+    def run(self, configs: Iterable[Config]) -> List[Dict[str, str]]:
+        '''
+        Method running configurations that aren't in results table yet, in parallel. Every finished run is appended
+        to the table at once. Run that raised exception is logged and left out (it is retried by next sweep).
+
+            Parameters:
+                    configs (iterable): Configurations (e.g. from sweep_grid).
+
+            Returns:
+                    All rows of results table (previous and new ones).
+        '''
+        done = {row['config'] for row in self.results()}
+        pending = {}
+        for config in configs:
+            key = config_key(config)
+            if key not in done and key not in pending:
+                pending[key] = config
+        logging.info(f"sweep: {len(pending)} configurations to run, {len(done)} already computed")
+        if pending:
+            columns = ['config'] + list(default_config) + list(metric_names)
+            with ProcessPoolExecutor(self.workers, mp_context=get_context('spawn'),
+                                     initializer=_init_worker) as executor:
+                futures = {executor.submit(run_market, config): key for key, config in pending.items()}
+                for future in as_completed(futures):
+                    key = futures[future]
+                    try:
+                        metrics = future.result()
+                    except Exception as error:
+                        logging.warning(f"sweep: configuration {key} failed: {error!r}")
+                        continue
+                    self.__append(columns, dict(json.loads(key), config=key, **metrics))
+        return self.results()
+
+    def __append(self, columns: List[str], row: Dict) -> None:
+        '''
+        Inner function appending one row to results table (with header if table is new).
+        '''
+        new_table = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, 'a', newline='', encoding='utf-8') as table:
+            writer = csv.DictWriter(table, fieldnames=columns, extrasaction='ignore')
+            if new_table:
+                writer.writeheader()
+            writer.writerow(row)
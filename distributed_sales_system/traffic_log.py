@@ -0,0 +1,325 @@
+'''
+Opt-in recording and replay of market traffic.
+
+Producers record every offer request and order they handle, together with their reply (offer, order status or
+Busy), into compact binary log. Replayer feeds recorded requests and orders to other producer instances - as fast
+as possible or at recorded pace - so producer-side changes can be benchmarked against the same workload, without
+random shopping lists and thread timing of customers. Settlements on exchange aren't messages and aren't recorded.
+
+Recording is enabled with enable() (e.g. from run.py) or by setting environment variable DSS_RECORD to log path
+before the package is imported - log is then closed when the process exits. When disabled, recording costs one check.
+
+Log format: header (magic, format version), then records of (time since recording started, kind, producer ID,
+customer ID, number of items) followed by items of the kind:
+- OFFER_REQUEST: requested product IDs,
+- ORDER: (product ID, amount) pairs,
+- OFFER: (product ID, amount, price) triples of requested products (offer itself holds whole range of producer),
+- ORDER_STATUS: no items, number of items is 1 if order was completed, 0 otherwise,
+- BUSY: one item - retry after (in seconds).
+'''
+
+from distributed_sales_system import default_market
+from distributed_sales_system.lock_stats import make_lock
+from distributed_sales_system.messages import OfferRequest, OrderRequest, Offer, OrderStatus, Busy
+from collections import Counter, namedtuple
+from queue import Queue, Empty
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+import atexit
+import os
+import struct
+import time
+
+if TYPE_CHECKING:
+    from distributed_sales_system.producer import Producer
+
+OFFER_REQUEST, ORDER, OFFER, ORDER_STATUS, BUSY = range(5)
+
+TrafficRecord = namedtuple('TrafficRecord', ['time', 'kind', 'producer_id', 'customer_id', 'data'])
+
+_magic = b'DSST'
+_version = 1
+_file_header = struct.Struct('<4sH')
+_record_header = struct.Struct('<dBqqI')
+_item_formats = {OFFER_REQUEST: struct.Struct('<i'), ORDER: struct.Struct('<ii'), OFFER: struct.Struct('<iid'),
+                 BUSY: struct.Struct('<d')}
+
+_recorder: Optional['TrafficRecorder'] = None
+
+
+class TrafficRecorder:
+    '''
+    A class representing recorder of market traffic into binary log.
+
+    ...
+
+    Attributes
+    ----------
+    path (str):
+            Path of the log.
+    records (int):
+            Number of records written so far.
+    __start (float):
+            Time (perf_counter) when recording started, record times are relative to it.
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.records = 0
+        self.__file = open(path, "wb")
+        self.__file.write(_file_header.pack(_magic, _version))
+        self.__start = time.perf_counter()
+        self.__lock = make_lock("traffic_recorder")
+
+    def __enter__(self) -> 'TrafficRecorder':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def record(self, kind: int, producer_id: int, customer_id: int, data) -> None:
+        '''
+        Method writing one record to log. Safe to call from many producer threads.
+
+            Parameters:
+                    kind (int): Kind of record (OFFER_REQUEST, ORDER, OFFER, ORDER_STATUS or BUSY).
+                    producer_id (int): ID of producer that handled the message.
+                    customer_id (int): ID of customer that sent the request.
+                    data: Requested product IDs (list), order (dict), offer (mapping of product ID to
+                          (amount, price)), order completed (bool) or retry after (float), according to kind.
+
+            Returns:
+                    None
+        '''
+        if kind == ORDER_STATUS:
+            count, items = int(bool(data)), b''
+        elif kind == BUSY:
+            count, items = 1, _item_formats[BUSY].pack(data)
+        elif kind == OFFER_REQUEST:
+            count, items = len(data), b''.join(_item_formats[kind].pack(product_id) for product_id in data)
+        elif kind == ORDER:
+            count, items = len(data), b''.join(_item_formats[kind].pack(product_id, amount)
+                                               for product_id, amount in data.items())
+        else:
+            count, items = len(data), b''.join(_item_formats[kind].pack(product_id, amount, price)
+                                               for product_id, (amount, price) in data.items())
+        producer_id = -1 if producer_id is None else producer_id
+        with self.__lock:
+            # time is taken under lock - records are written in order of their times (replay sleeps between them)
+            if not self.__file.closed:
+                self.__file.write(_record_header.pack(time.perf_counter() - self.__start, kind, producer_id,
+                                                      customer_id, count) + items)
+                self.records += 1
+
+    def close(self) -> None:
+        '''
+        Method for finishing recording (log is flushed and closed).
+
+            Returns:
+                    None
+        '''
+        with self.__lock:
+            self.__file.close()
+
+
+def read_traffic(path: str) -> Iterator[TrafficRecord]:
+    '''
+    Function reading records of traffic log.
+
+        Parameters:
+                path (str): Path of the log.
+
+        Returns:
+                Iterator of records, in recorded order.
+
+        Raises:
+                ValueError - file isn't traffic log of supported version.
+    '''
+    with open(path, "rb") as log:
+        magic, version = _file_header.unpack(log.read(_file_header.size))
+        if magic != _magic or version != _version:
+            raise ValueError("TrafficLog: File isn't traffic log of supported version!")
+        while True:
+            header = log.read(_record_header.size)
+            if len(header) < _record_header.size:
+                return
+            timestamp, kind, producer_id, customer_id, count = _record_header.unpack(header)
+            if kind == ORDER_STATUS:
+                data = bool(count)
+            else:
+                item_format = _item_formats[kind]
+                items = list(item_format.iter_unpack(log.read(item_format.size * count)))
+                if kind == OFFER_REQUEST:
+                    data = [product_id for product_id, in items]
+                elif kind == ORDER:
+                    data = dict(items)
+                elif kind == OFFER:
+                    data = {product_id: (amount, price) for product_id, amount, price in items}
+                else:
+                    data = items[0][0]
+            yield TrafficRecord(timestamp, kind, producer_id, customer_id, data)
+
+
+class TrafficReplayer:
+    '''
+    A class representing replayer of recorded traffic. Recorded requests and orders are sent to given producers
+    (recorded producer ID mapped to producer), recorded customers are stood in for by replayer, which collects
+    replies.
+
+    ...
+
+    Attributes
+    ----------
+    records (list):
+            All records of the log.
+    replyTimeout (float):
+            Class attribute, how long (in seconds) replayer waits for missing replies after last message was sent.
+    '''
+
+    replyTimeout = 10.0
+
+    def __init__(self, path: str) -> None:
+        self.records: List[TrafficRecord] = list(read_traffic(path))
+
+    def producer_ids(self) -> List[int]:
+        '''
+        Method returning IDs of recorded producers (to be mapped to producers of replay).
+
+            Returns:
+                    Sorted list of producer IDs.
+        '''
+        return sorted({record.producer_id for record in self.records})
+
+    def replay(self, producers: Dict[int, 'Producer'], speed: Optional[float] = None) -> Dict[str, float]:
+        '''
+        Method sending recorded requests and orders to producers and collecting their replies.
+
+            Parameters:
+                    producers (dict): Recorded producer ID mapped to producer that handles its traffic (traffic of
+                                      producers not in dict is skipped). Producers have to be running and be in
+                                      one market (stand-in customers are registered there).
+                    speed (float): Pace of replay relative to recorded one (1.0 - original pace), None means
+                                   as fast as possible.
+
+            Returns:
+                    Statistics of replay: number of sent messages, received replies, elapsed time, messages per second,
+                    completed orders (and their number in recording), offers and Busy replies.
+        '''
+        markets = {producer.market for producer in producers.values()}
+        if len(markets) > 1:
+            raise ValueError("TrafficReplayer: Producers have to be in one market!")
+        register = markets.pop().register if markets else default_market.register
+        replies = Queue()
+        requests = [record for record in self.records
+                    if record.kind in (OFFER_REQUEST, ORDER) and record.producer_id in producers]
+        customer_ids = {}
+        for record in requests:
+            if record.customer_id not in customer_ids:
+                customer_ids[record.customer_id] = register.add_customer(
+                    f"replay_{record.customer_id}", replies)
+        stats = Counter()
+        try:
+            start = time.perf_counter()
+            for record in requests:
+                if speed is not None:
+                    delay = start + record.time / speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                producer = producers[record.producer_id]
+                if record.kind == OFFER_REQUEST:
+                    producer.request_queue.put(OfferRequest(customer_ids[record.customer_id], record.data, replies))
+                else:
+                    producer.order_queue.put(OrderRequest(customer_ids[record.customer_id], record.data, replies))
+                stats['sent'] += 1
+                self.__collect(replies, stats, block=False)
+            deadline = time.monotonic() + self.replyTimeout
+            while stats['replies'] < stats['sent'] and time.monotonic() < deadline:
+                self.__collect(replies, stats, block=True)
+            elapsed = time.perf_counter() - start
+        finally:
+            for customer_id in customer_ids.values():
+                register.delete_user(customer_id)
+        return {'sent': stats['sent'], 'replies': stats['replies'], 'elapsed': elapsed,
+                'messages_per_second': stats['sent'] / elapsed if elapsed > 0 else 0.0,
+                'orders_completed': stats['completed'],
+                'recorded_orders_completed': sum(1 for record in self.records if record.kind == ORDER_STATUS
+                                                 and record.data and record.producer_id in producers),
+                'offers': stats['offers'], 'busy': stats['busy']}
+
+    def __collect(self, replies: Queue, stats: Counter, block: bool) -> None:
+        '''
+        Inner function counting replies waiting in reply queue (waiting shortly for the first one if block is True).
+        '''
+        try:
+            reply = replies.get(timeout=0.1) if block else replies.get_nowait()
+            while True:
+                stats['replies'] += 1
+                if isinstance(reply, Offer):
+                    stats['offers'] += 1
+                elif isinstance(reply, Busy):
+                    stats['busy'] += 1
+                elif isinstance(reply, OrderStatus) and reply.completed:
+                    stats['completed'] += 1
+                reply = replies.get_nowait()
+        except Empty:
+            pass
+
+
+def enable(path: str) -> TrafficRecorder:
+    '''
+    Function enabling recording of traffic handled by producers from now on.
+
+        Parameters:
+                path (str): Path of the log (overwritten if it exists).
+
+        Returns:
+                Active recorder.
+    '''
+    global _recorder
+    if _recorder is None:
+        _recorder = TrafficRecorder(path)
+    return _recorder
+
+
+def disable() -> Optional[TrafficRecorder]:
+    '''
+    Function disabling recording - log is closed.
+
+        Returns:
+                Closed recorder or None if recording wasn't enabled.
+    '''
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.close()
+    return recorder
+
+
+def record(kind: int, producer_id: int, customer_id: int, data) -> None:
+    '''
+    Function recording message handled by producer if recording is enabled (see TrafficRecorder.record).
+
+        Returns:
+                None
+    '''
+    recorder = _recorder
+    if recorder is not None:
+        recorder.record(kind, producer_id, customer_id, data)
+
+
+def record_offer(producer_id: int, customer_id: int, requested_products: List[int], offer) -> None:
+    '''
+    Function recording offer sent by producer if recording is enabled - only requested products of the offer are
+    written, so size of record doesn't depend on size of producer's range.
+
+        Returns:
+                None
+    '''
+    recorder = _recorder
+    if recorder is not None:
+        recorder.record(OFFER, producer_id, customer_id,
+                        {product_id: offer[product_id] for product_id in requested_products if product_id in offer})
+
+
+if os.environ.get('DSS_RECORD'):
+    enable(os.environ['DSS_RECORD'])
+    atexit.register(disable)
@@ -1,6 +1,11 @@
 from collections import namedtuple
-from typing import Dict, List, Optional
-from copy import deepcopy
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from itertools import count
+from distributed_sales_system.lock_stats import make_lock
+from zlib import crc32
+import heapq
+import time
+import weakref
 from queue import Queue
 
 
@@ -17,36 +22,139 @@ class UserRegister:
         Dictionary mapping customer_id to its name.
     __producer_register (dict):
         Dictionary mapping producer_id to its data (namedtuple ProducerData). Producer data contains its name and
-        list of products.
+        list of product IDs.
+    __product_index (dict):
+        Dictionary mapping product ID to set of IDs of producers that sell it. Only primary producers
+        (not replicas) are indexed.
+    __replica_groups (dict):
+        Dictionary mapping primary producer ID to list of IDs of all producers in its replica group
+        (primary included). Replicas share primary's warehouse, so customer contacts only one of them.
+    __replica_primary (dict):
+        Dictionary mapping replica ID to ID of its primary producer.
+    __replica_counters (dict):
+        Dictionary mapping primary producer ID to counter used by round-robin routing.
+    __health (dict):
+        Dictionary mapping producer ID to (time of its last heartbeat (monotonic), number of waiting requests and
+        orders). Producers that never sent heartbeat (e.g. not started yet) aren't stored and count as healthy.
+    clock (callable):
+        Monotonic clock (seconds) used for heartbeats.
+    routing (str):
+        Policy of choosing replica for customer: 'round_robin', 'least_queue' (smallest number of waiting
+        requests and orders) or 'hash' (rendezvous hashing on customer ID, customer always gets the same replica).
     __assigned_ids (set):
         Set of currently assigned IDs. Customers and producers shared IDs.
-    __free_ids (set):
-        Set of IDs that was freed and can be reused.
+    __free_ids (list):
+        Heap of IDs that was freed and can be reused.
+    __next_id (int):
+        Smallest ID that was never assigned.
+    __finalizers (dict):
+        Dictionary mapping user ID to weakref finalizer of object that owns it (see watch).
+    __released (set):
+        IDs whose owners were garbage collected. They are removed from register by next register operation
+        (finalizers may run in any thread at any moment, so they never touch register themselves).
+    __listeners (WeakSet):
+        Objects notified (their forget method is called) when customer leaves the register, e.g. loyalty ledgers.
+    __producer_listeners (WeakSet):
+        Objects notified when producer leaves the register, e.g. circuit breakers and market boards.
+    __lock (Lock):
+        Lock guarding register state - users join and leave from many threads.
+    heartbeatTimeout (float):
+        Class attribute, time (in seconds) without heartbeat after which producer counts as dead or stuck.
+    overloadDepth (int | None):
+        Class attribute, number of waiting requests and orders from which producer counts as overloaded.
+        None disables the check.
     """
 
-    def __init__(self) -> None:
+    routing_policies = ('round_robin', 'least_queue', 'hash')
+    heartbeatTimeout = 2.0
+    overloadDepth: Optional[int] = 1000
+
+    def __init__(self, routing: str = 'round_robin', clock: Callable[[], float] = time.monotonic) -> None:
+        if routing not in UserRegister.routing_policies:
+            raise ValueError(f"Incorrect routing policy - has to be one of {UserRegister.routing_policies}")
+        self.routing = routing
+        self.clock = clock
         self.__customer_register = {}
         self.__producer_register = {}
+        self.__product_index = {}
+        self.__replica_groups = {}
+        self.__replica_primary = {}
+        self.__replica_counters = {}
+        self.__health = {}
         self.__assigned_ids = set()
-        self.__free_ids = set()
-
-    def producer_with_products(self, products_list: List[str]) -> Dict[int, List[Queue]]:
+        self.__free_ids = []
+        self.__next_id = 0
+        self.__finalizers = {}
+        self.__released = set()
+        self.__listeners = weakref.WeakSet()
+        self.__producer_listeners = weakref.WeakSet()
+        self.__lock = make_lock("user_register")
+
+    def __len__(self) -> int:
+        with self.__lock:
+            self.__collect_released()
+            return len(self.__assigned_ids)
+
+    def producer_with_products(self, products_list: Iterable[int], customer_id: Optional[int] = None) -> Dict[int, List[Queue]]:
         """
         Interface for customers - function used for finding producers that meet customer requirements (in terms of products).
+        For producers with replicas only one member of replica group (chosen by routing policy) is returned.
+        Unhealthy producers (without heartbeat for heartbeatTimeout or overloaded) are skipped.
 
             Parameters:
-                products_list (list): List containing names of products (str) that customer want to buy.
+                products_list (iterable): IDs of products (int) that customer want to buy.
+
+                customer_id (int): ID of customer, used by 'hash' routing policy.
 
             Returns:
-                possible_producers (set): Set containing id of producers, whose have at least one product from product_list.
+                possible_producers (dict): Dictionary mapping id of producers, whose have at least one product from
+                    product_list, to their request and order queues.
 
         """
-        possible_producers = dict()
-        for product in products_list:
-            for producer_id, producer_data in self.__producer_register.items():
-                if product in producer_data.product_list:
-                    possible_producers[producer_id] = [producer_data.request_queue, producer_data.order_queue]
-        return possible_producers
+        with self.__lock:
+            self.__collect_released()
+            primary_producers = set()
+            for product in products_list:
+                primary_producers.update(self.__product_index.get(product, ()))
+            possible_producers = dict()
+            now = self.clock()
+            for primary_id in primary_producers:
+                producer_id = self.__route(primary_id, customer_id, now)
+                if producer_id is None:
+                    continue
+                producer_data = self.__producer_register[producer_id]
+                possible_producers[producer_id] = [producer_data.request_queue, producer_data.order_queue]
+            return possible_producers
+
+    def heartbeat(self, producer_id: int, queue_depth: int) -> None:
+        """
+        Interface for producers - function used for reporting that producer is alive, with its load. Heartbeat of
+        producer that already left the register is ignored.
+
+            Parameters:
+                producer_id (int): Producer ID.
+
+                queue_depth (int): Number of requests and orders waiting in producer's queues.
+
+            Returns:
+                None
+        """
+        with self.__lock:
+            if producer_id in self.__producer_register:
+                self.__health[producer_id] = (self.clock(), queue_depth)
+
+    def producer_health(self, producer_id: int) -> Optional[Tuple[float, int]]:
+        """
+        Interface for monitoring - function returning health of producer.
+
+            Parameters:
+                producer_id (int): Producer ID.
+
+            Returns:
+                (seconds since last heartbeat, reported queue depth) or None if producer never sent heartbeat.
+        """
+        health = self.__health.get(producer_id)
+        return (self.clock() - health[0], health[1]) if health is not None else None
 
     def add_customer(self, customer_name: str, offer_queue: Queue) -> int:
         """
@@ -60,18 +168,20 @@ class UserRegister:
                 customer_id (int): ID assigned for new customer.
 
         """
-        customer_id = self.__generate_id__()
-        self.__customer_register[customer_id] = [customer_name, offer_queue]
-        return customer_id
+        with self.__lock:
+            self.__collect_released()
+            customer_id = self.__generate_id__()
+            self.__customer_register[customer_id] = [customer_name, offer_queue]
+            return customer_id
 
-    def add_producer(self, producer_name: str, producer_product_list: List[str], producer_request_queue: Queue, producer_order_queue: Queue) -> int:
+    def add_producer(self, producer_name: str, producer_product_list: List[int], producer_request_queue: Queue, producer_order_queue: Queue) -> int:
         """
         Interface for producer - function used for assigning ID and adding new customer to register.
 
             Parameters:
                 producer_name (str): Name of producer.
 
-                producer_product_list (list): List containing names (str) of products that producer is selling.
+                producer_product_list (list): List containing IDs (int) of products that producer is selling.
 
                 producer_event
 
@@ -79,50 +189,197 @@ class UserRegister:
                 customer_id (int): ID assigned for new producer.
 
         """
-        producer_id = self.__generate_id__()
-        self.__producer_register[producer_id] = ProducerData(producer_name, deepcopy(producer_product_list), producer_request_queue, producer_order_queue)
-        return producer_id
+        with self.__lock:
+            self.__collect_released()
+            producer_id = self.__generate_id__()
+            self.__producer_register[producer_id] = ProducerData(producer_name, list(producer_product_list), producer_request_queue, producer_order_queue)
+            for product in producer_product_list:
+                self.__product_index.setdefault(product, set()).add(producer_id)
+            self.__replica_groups[producer_id] = [producer_id]
+            self.__replica_counters[producer_id] = count()
+            return producer_id
+
+    def add_customers(self, customers: Iterable[Tuple[str, Queue]]) -> List[int]:
+        """
+        Interface for customers - bulk version of add_customer, used when many customers join the market at once.
+
+            Parameters:
+                customers (iterable): Pairs of customer name and offer queue.
+
+            Returns:
+                customer_ids (list): IDs assigned for new customers, in the same order.
+
+        """
+        customer_ids = []
+        with self.__lock:
+            self.__collect_released()
+            for customer_name, offer_queue in customers:
+                customer_id = self.__generate_id__()
+                self.__customer_register[customer_id] = [customer_name, offer_queue]
+                customer_ids.append(customer_id)
+        return customer_ids
+
+    def add_producers(self, producers: Iterable[Tuple[str, List[int], Queue, Queue]]) -> List[int]:
+        """
+        Interface for producers - bulk version of add_producer, used when many producers join the market at once.
+
+            Parameters:
+                producers (iterable): Tuples of producer name, list of product IDs, request queue and order queue.
+
+            Returns:
+                producer_ids (list): IDs assigned for new producers, in the same order.
+
+        """
+        producer_ids = []
+        product_index = self.__product_index
+        with self.__lock:
+            self.__collect_released()
+            for producer_name, producer_product_list, producer_request_queue, producer_order_queue in producers:
+                producer_id = self.__generate_id__()
+                self.__producer_register[producer_id] = ProducerData(producer_name, list(producer_product_list), producer_request_queue, producer_order_queue)
+                for product in producer_product_list:
+                    if product in product_index:
+                        product_index[product].add(producer_id)
+                    else:
+                        product_index[product] = {producer_id}
+                self.__replica_groups[producer_id] = [producer_id]
+                self.__replica_counters[producer_id] = count()
+                producer_ids.append(producer_id)
+        return producer_ids
+
+    def add_replica(self, primary_id: int, replica_name: str, replica_request_queue: Queue, replica_order_queue: Queue) -> int:
+        """
+        Interface for producer - function used for assigning ID and adding replica of already registered producer.
+        Replica sells the same products as primary producer.
+
+            Parameters:
+                primary_id (int): ID of primary producer.
+
+                replica_name (str): Name of replica.
+
+                replica_request_queue (Queue): Queue where replica receives offer requests.
+
+                replica_order_queue (Queue): Queue where replica receives orders.
+
+            Returns:
+                replica_id (int): ID assigned for new replica.
 
-    def add_producer_product(self, producer_id: int, product: str) -> None:
+            Raises:
+                ValueError - incorrect primary ID.
+        """
+        with self.__lock:
+            self.__collect_released()
+            self.__check_producer_id(primary_id)
+            if primary_id not in self.__replica_groups:
+                raise ValueError("Incorrect ID - producer is a replica")
+            replica_id = self.__generate_id__()
+            primary_data = self.__producer_register[primary_id]
+            # product list is shared, so replicas follow changes of primary offer
+            self.__producer_register[replica_id] = ProducerData(replica_name, primary_data.product_list, replica_request_queue, replica_order_queue)
+            self.__replica_groups[primary_id].append(replica_id)
+            self.__replica_primary[replica_id] = primary_id
+            return replica_id
+
+    def add_producer_product(self, producer_id: int, product: int) -> None:
         """
         Interface for producer - function used for adding new product into offer.
 
             Parameters:
                 producer_id (int): Producer ID.
 
-                product (str): Product name.
+                product (int): Product ID.
 
             Returns:
                 None
 
             Raises:
-                ValueError - incorrect ID.
+                ValueError - incorrect ID (also replica ID, offer can be changed only by primary producer).
         """
-        if self.__check_producer_id(producer_id):
-            current_producer_data = self.__producer_register[producer_id]
-            new_product_list = current_producer_data.product_list
-            new_product_list.append(product)
-            self.__producer_register[producer_id] = current_producer_data._replace(product_list=new_product_list)
-
-    def remove_producer_product(self, producer_id, product) -> None:
+        with self.__lock:
+            if self.__check_producer_id(producer_id):
+                if producer_id not in self.__replica_groups:
+                    raise ValueError("Incorrect ID - producer is a replica")
+                # product list is changed in place (it is shared with replicas), record stays the same
+                self.__producer_register[producer_id].product_list.append(product)
+                self.__product_index.setdefault(product, set()).add(producer_id)
+
+    def remove_producer_product(self, producer_id: int, product: int) -> None:
         """
         Interface for producer - function used for removing product from offer.
             Parameters:
                 producer_id (int): Producer ID.
 
-                product (str): Product name.
+                product (int): Product ID.
 
             Returns:
                 None
 
             Raises:
-                ValueError - incorrect ID.
+                ValueError - incorrect ID (also replica ID, offer can be changed only by primary producer).
+        """
+        with self.__lock:
+            if self.__check_producer_id(producer_id):
+                if producer_id not in self.__replica_groups:
+                    raise ValueError("Incorrect ID - producer is a replica")
+                self.__producer_register[producer_id].product_list.remove(product)
+                self.__product_index[product].discard(producer_id)
+
+    def add_producer_products(self, producer_id: int, products: Iterable[int]) -> None:
         """
-        if self.__check_producer_id(producer_id):
-            current_producer_data = self.__producer_register[producer_id]
-            new_product_list = current_producer_data.product_list
-            new_product_list.remove(product)
-            self.__producer_register[producer_id] = current_producer_data._replace(product_list=new_product_list)
+        Interface for producer - bulk version of add_producer_product, whole batch is indexed under one lock
+        acquisition.
+
+            Parameters:
+                producer_id (int): Producer ID.
+
+                products (iterable): Product IDs.
+
+            Returns:
+                None
+
+            Raises:
+                ValueError - incorrect ID (also replica ID, offer can be changed only by primary producer).
+        """
+        product_index = self.__product_index
+        with self.__lock:
+            if self.__check_producer_id(producer_id):
+                if producer_id not in self.__replica_groups:
+                    raise ValueError("Incorrect ID - producer is a replica")
+                product_list = self.__producer_register[producer_id].product_list
+                for product in products:
+                    product_list.append(product)
+                    if product in product_index:
+                        product_index[product].add(producer_id)
+                    else:
+                        product_index[product] = {producer_id}
+
+    def remove_producer_products(self, producer_id: int, products: Iterable[int]) -> None:
+        """
+        Interface for producer - bulk version of remove_producer_product, product list is filtered in one pass
+        under one lock acquisition. Products that aren't in offer are skipped.
+
+            Parameters:
+                producer_id (int): Producer ID.
+
+                products (iterable): Product IDs.
+
+            Returns:
+                None
+
+            Raises:
+                ValueError - incorrect ID (also replica ID, offer can be changed only by primary producer).
+        """
+        removed = set(products)
+        with self.__lock:
+            if self.__check_producer_id(producer_id):
+                if producer_id not in self.__replica_groups:
+                    raise ValueError("Incorrect ID - producer is a replica")
+                product_list = self.__producer_register[producer_id].product_list
+                product_list[:] = [product for product in product_list if product not in removed]
+                for product in removed:
+                    producers = self.__product_index.get(product)
+                    if producers is not None:
+                        producers.discard(producer_id)
 
     def delete_user(self, user_id) -> None:
         """
@@ -137,13 +394,53 @@ class UserRegister:
             Raises:
                 ValueError - Incorrect ID.
         """
-        if user_id not in self.__assigned_ids:
-            raise ValueError("Incorrect ID - No such ID in register")
-        if user_id in self.__customer_register.keys():
-            del self.__customer_register[user_id]
-        if user_id in self.__producer_register.keys():
-            del self.__producer_register[user_id]
-        self.__delete_id(user_id)
+        with self.__lock:
+            self.__collect_released()
+            if user_id not in self.__assigned_ids:
+                raise ValueError("Incorrect ID - No such ID in register")
+            self.__delete_user(user_id)
+
+    def watch(self, user_id: int, owner: object) -> None:
+        """
+        Interface for users - function used for binding ID to object that owns it. When owner is garbage collected
+        without leaving the register (see delete_user), its ID is removed automatically.
+
+            Parameters:
+                user_id (int): User ID.
+
+                owner (object): Customer or producer that registered the ID (has to support weak references).
+
+            Returns:
+                None
+
+            Raises:
+                ValueError - Incorrect ID.
+        """
+        with self.__lock:
+            if user_id not in self.__assigned_ids:
+                raise ValueError("Incorrect ID - No such ID in register")
+            finalizer = weakref.finalize(owner, self.__released.add, user_id)
+            finalizer.atexit = False
+            self.__finalizers[user_id] = finalizer
+
+    def add_listener(self, listener: object, producers: bool = False) -> None:
+        """
+        Interface for users - function used for subscribing to customers (or producers) leaving the register.
+        Listener's forget method is called with user ID before the ID can be assigned again (with register's lock
+        held, so forget mustn't call register), so that no state is inherited by new user that gets the same ID.
+        Listener is referenced weakly.
+
+            Parameters:
+                listener (object): Object with forget(user_id) method, e.g. LoyaltyLedger or CircuitBreaker.
+
+                producers (bool): If True, listener is notified about producers (also replicas) leaving the register,
+                                  otherwise about customers.
+
+            Returns:
+                None
+        """
+        with self.__lock:
+            (self.__producer_listeners if producers else self.__listeners).add(listener)
 
     def check_customer_id(self, customer_id) -> bool:
         """
@@ -156,11 +453,9 @@ class UserRegister:
                 True if ID belongs to customer/False if not (producer ID or not in register)
 
         """
-        if customer_id in self.__customer_register.keys():
-            return self.__customer_register[customer_id][0]
-        else:
-            return False
-            # raise ValueError("Incorrect ID")
+        # single lookup without lock - producers call it for every message
+        customer_data = self.__customer_register.get(customer_id)
+        return customer_data[0] if customer_data is not None else False
 
     def __check_producer_id(self, producer_id) -> Optional[bool]:
         """
@@ -183,6 +478,101 @@ class UserRegister:
             else:
                 raise ValueError("Incorrect ID - No such ID in register")
 
+    def __delete_user(self, user_id) -> None:
+        """
+        Inner function used for removing user (and, for primary producer, its whole replica group). Listeners are
+        notified before IDs are freed. Called with lock held.
+
+            Parameters:
+                user_id (int): User ID.
+
+            Returns:
+                None
+        """
+        if user_id in self.__customer_register:
+            del self.__customer_register[user_id]
+            for listener in list(self.__listeners):
+                listener.forget(user_id)
+            self.__delete_id(user_id)
+            return
+        if user_id in self.__replica_groups.keys():
+            # primary producer - whole replica group leaves the market
+            for product in self.__producer_register[user_id].product_list:
+                self.__product_index[product].discard(user_id)
+            removed = self.__replica_groups.pop(user_id)
+            for producer_id in removed:
+                del self.__producer_register[producer_id]
+                if producer_id != user_id:
+                    del self.__replica_primary[producer_id]
+            del self.__replica_counters[user_id]
+        elif user_id in self.__producer_register.keys():
+            self.__replica_groups[self.__replica_primary.pop(user_id)].remove(user_id)
+            del self.__producer_register[user_id]
+            removed = [user_id]
+        else:
+            removed = [user_id]
+        for listener in list(self.__producer_listeners):
+            for producer_id in removed:
+                listener.forget(producer_id)
+        for producer_id in removed:
+            self.__delete_id(producer_id)
+
+    def __collect_released(self) -> None:
+        """
+        Inner function used for removing users whose owners were garbage collected. Called with lock held.
+
+            Returns:
+                None
+        """
+        while self.__released:
+            user_id = self.__released.pop()
+            if user_id in self.__assigned_ids:
+                self.__delete_user(user_id)
+
+    def __route(self, primary_id: int, customer_id: Optional[int], now: float) -> Optional[int]:
+        """
+        Inner function used for choosing healthy member of replica group according to routing policy.
+
+            Parameters:
+                primary_id (int): ID of primary producer.
+
+                customer_id (int): ID of customer (used by 'hash' policy).
+
+                now (float): Current time (monotonic).
+
+            Returns:
+                producer_id (int): ID of chosen producer or None if no member of the group is healthy.
+        """
+        group = [producer_id for producer_id in self.__replica_groups[primary_id] if self.__is_healthy(producer_id, now)]
+        if len(group) <= 1:
+            return group[0] if group else None
+        if self.routing == 'least_queue':
+            return min(group, key=lambda producer_id: self.__producer_register[producer_id].request_queue.qsize()
+                       + self.__producer_register[producer_id].order_queue.qsize())
+        if self.routing == 'hash' and customer_id is not None:
+            return max(group, key=lambda producer_id: crc32(b'%d:%d' % (customer_id, producer_id)))
+        return group[next(self.__replica_counters[primary_id]) % len(group)]
+
+    def __is_healthy(self, producer_id: int, now: float) -> bool:
+        """
+        Inner function checking if producer sent heartbeat recently and isn't overloaded.
+
+            Parameters:
+                producer_id (int): Producer ID.
+
+                now (float): Current time (monotonic).
+
+            Returns:
+                True if producer is healthy (or never sent heartbeat), False otherwise.
+        """
+        health = self.__health.get(producer_id)
+        if health is None:
+            return True
+        last_heartbeat, queue_depth = health
+        if now - last_heartbeat > self.heartbeatTimeout:
+            return False
+        return self.overloadDepth is None or queue_depth < self.overloadDepth
+
     def __generate_id__(self) -> int:
         """
         Inner function used for generating ID for new users. It assigned the smallest possible ID.
@@ -191,12 +581,12 @@ class UserRegister:
                 user_id (int): Generated ID.
         """
         if self.__free_ids:
-            user_id = min(self.__free_ids)
-            self.__free_ids.remove(user_id)
+            user_id = heapq.heappop(self.__free_ids)
             self.__assigned_ids.add(user_id)
             return user_id
         else:
-            user_id = max(self.__assigned_ids, default=-1)+1
+            user_id = self.__next_id
+            self.__next_id += 1
             self.__assigned_ids.add(user_id)
             return user_id
 
@@ -210,5 +600,11 @@ class UserRegister:
             Returns:
                 None
         """
-        self.__free_ids.add(user_id)
+        self.__health.pop(user_id, None)
+        finalizer = self.__finalizers.pop(user_id, None)
+        if finalizer is not None:
+            finalizer.detach()
+        # owner may have died just before it left the register, ID can't be released twice
+        self.__released.discard(user_id)
+        heapq.heappush(self.__free_ids, user_id)
         self.__assigned_ids.remove(user_id)
@@ -1,4 +1,5 @@
-from typing import List,  Union, Dict
+from typing import Callable, Iterable, List, Optional, Union, Dict
+from distributed_sales_system.product_register import ProductCatalog, product_register
 
 
 class WarehouseProduct:
@@ -33,7 +34,15 @@ class Warehouse:
     Attributes
     ----------
     products (dict):
-            Dictionary mapping product name to its amount and limit.
+            Dictionary mapping product ID (from product catalog) to its amount and limit.
+    version (int):
+            Counter increased on every change of products or their amounts (changes are made under producer's
+            warehouse lock, also by generator). Used by producer to find out whether its offer snapshot is up to date.
+    catalog (ProductCatalog):
+            Catalog that product IDs come from (used for product names).
+    on_change (callable | None):
+            Function called with ID of changed product after every change (e.g. producer publishing its offer
+            on market board).
     default_amount (int):
             Default amount of given product in warehouse (used if amount not passed in constructor).
     default_limit (int):
@@ -42,76 +51,153 @@ class Warehouse:
     default_amount = 5
     default_limit = 100
 
-    def __init__(self, products_list: Union[List[str], Dict[str, Dict[str, Union[float, int]]]]) -> None:
+    def __init__(self, products_list: Union[List[int], Dict[int, Dict[str, Union[float, int]]]],
+                 catalog: Optional[ProductCatalog] = None) -> None:
         self.products = {}
+        self.version = 0
+        self.catalog = catalog if catalog is not None else product_register
+        self.on_change: Optional[Callable[[int], None]] = None
         if isinstance(products_list, List):
-            for name in products_list:
-                self.products[name] = WarehouseProduct(Warehouse.default_amount, Warehouse.default_limit)
+            for product_id in products_list:
+                self.products[product_id] = WarehouseProduct(Warehouse.default_amount, Warehouse.default_limit)
         else:
-            for name, params in products_list.items():
-                product_init_list = [Warehouse.default_amount, Warehouse.default_limit]
-                if 'amount' in params.keys():
-                    if not isinstance(params['amount'], int):
-                        raise ValueError("Warehouse: Amout has to be integer!")
-                    if params['amount'] < 0:
-                        raise ValueError("Warehouse: Cannot have less products than zero!")
-                    product_init_list[0] = params['amount']
-                if 'limit' in params.keys():
-                    if not isinstance(params['limit'], int):
-                        raise ValueError("Warehouse: Limit has to be integer!")
-                    if params['limit'] < 0:
-                        raise ValueError("Warehouse: Limit cannot be less than zero!")
-                    if params['limit'] > 1000:
-                        raise ValueError("Warehouse: Limit cannot be more than 1000!")
-                    product_init_list[1] = params['limit']
-
-                # check if limit is more than amount
-                if product_init_list[0] >= product_init_list[1]:
-                    raise ValueError(f"Warehouse: Can't have more product: ({product_init_list[0]}) than it's limit: ({product_init_list[1]})!")
-                
-                self.products[name] = WarehouseProduct(product_init_list[0], product_init_list[1])
+            for product_id, params in products_list.items():
+                self.products[product_id] = self.__new_product(params)
 
+    def __repr__(self) -> str:
+        return f"{dict(zip(self.catalog.names(self.products), self.products.values()))}"
 
+    def __changed(self, product_id: int) -> None:
+        '''
+        Inner function increasing version after change of product and notifying about it.
+        '''
+        self.version += 1
+        if self.on_change is not None:
+            self.on_change(product_id)
 
+    def __changed_many(self, product_ids: List[int]) -> None:
+        '''
+        Inner function increasing version once after change of many products and notifying about every one of them.
+        '''
+        self.version += 1
+        if self.on_change is not None:
+            for product_id in product_ids:
+                self.on_change(product_id)
 
-    def __repr__(self) -> str:
-        return f"{self.products}"
+    @staticmethod
+    def __new_product(params: Dict[str, Union[float, int]]) -> WarehouseProduct:
+        '''
+        Inner function validating parameters of product (amount and limit, missing ones take default values).
+
+            Parameters:
+                    params (dict): Parameters of product (may also contain parameters of producer and generator).
+
+            Returns:
+                    New WarehouseProduct.
+
+            Raises:
+                    ValueError - incorrect amount or limit.
+        '''
+        product_init_list = [Warehouse.default_amount, Warehouse.default_limit]
+        if 'amount' in params.keys():
+            if not isinstance(params['amount'], int):
+                raise ValueError("Warehouse: Amout has to be integer!")
+            if params['amount'] < 0:
+                raise ValueError("Warehouse: Cannot have less products than zero!")
+            product_init_list[0] = params['amount']
+        if 'limit' in params.keys():
+            if not isinstance(params['limit'], int):
+                raise ValueError("Warehouse: Limit has to be integer!")
+            if params['limit'] < 0:
+                raise ValueError("Warehouse: Limit cannot be less than zero!")
+            if params['limit'] > 1000:
+                raise ValueError("Warehouse: Limit cannot be more than 1000!")
+            product_init_list[1] = params['limit']
+
+        # check if limit is more than amount
+        if product_init_list[0] >= product_init_list[1]:
+            raise ValueError(f"Warehouse: Can't have more product: ({product_init_list[0]}) than it's limit: ({product_init_list[1]})!")
+        return WarehouseProduct(product_init_list[0], product_init_list[1])
     
     
-    def add_product(self, product_name: str, amount: int = default_amount, limit: int = default_limit) -> None:
+    def add_product(self, product_id: int, amount: int = default_amount, limit: int = default_limit) -> None:
         '''
         Method for adding new products to warehouse. Only to be used as part of Producer.add_product method
         (otherwise errors are likely to happen).
 
             Parameters:
-                    product_name (str): Name of the product to be added.
+                    product_id (int): ID of the product to be added.
                     amount (int): How much given product add to warehouse.
                     limit (int): Maximum amount of given product in warehouse.
             Returns:
                     None
         '''
-        if product_name in self.products:
+        if product_id in self.products:
             raise ValueError("Warehouse: Product already exists in warehouse!")
         else:
-            self.products[product_name] = WarehouseProduct(amount, limit)
+            self.products[product_id] = WarehouseProduct(amount, limit)
+            self.__changed(product_id)
 
 
-    def delete_product(self, product_name: str) -> None:
+    def delete_product(self, product_id: int) -> None:
         '''
         Method for removing product from warehouse. Only to be used as part of Producer.delete_product method
         (otherwise errors are likely to happen).
 
             Parameters:
-                    product_name (str): Name of the product to be deleted.
+                    product_id (int): ID of the product to be deleted.
+
+            Returns:
+                    None
+        '''
+        if product_id in self.products:
+            del self.products[product_id]
+            self.__changed(product_id)
+
+    def add_products(self, products_list: Union[List[int], Dict[int, Dict[str, Union[float, int]]]]) -> None:
+        '''
+        Method for adding many new products to warehouse at once (bulk version of add_product, only to be used as
+        part of Producer.add_products). Whole batch is validated first - nothing is added if any product is
+        incorrect. Version is increased once for the whole batch.
+
+            Parameters:
+                    products_list (list | dict): IDs of products or IDs mapped to their parameters (amount and limit,
+                                    the same format as in constructor).
 
             Returns:
                     None
+
+            Raises:
+                    ValueError - product already exists in warehouse, incorrect amount or limit.
         '''
-        if product_name in self.products:
-            del self.products[product_name]
+        if isinstance(products_list, List):
+            new_products = {product_id: WarehouseProduct(Warehouse.default_amount, Warehouse.default_limit)
+                            for product_id in products_list}
+        else:
+            new_products = {product_id: self.__new_product(params) for product_id, params in products_list.items()}
+        if len(new_products) != len(products_list) or not self.products.keys().isdisjoint(new_products):
+            raise ValueError("Warehouse: Product already exists in warehouse!")
+        if new_products:
+            self.products.update(new_products)
+            self.__changed_many(list(new_products))
 
+    def delete_products(self, product_ids: Iterable[int]) -> None:
+        '''
+        Method for removing many products from warehouse at once (bulk version of delete_product, only to be used
+        as part of Producer.delete_products). Products that aren't in warehouse are skipped.
 
-    def increase_amount(self, product_name: str, amount: int = 1) -> None:
+            Parameters:
+                    product_ids (iterable): IDs of products to be deleted.
+
+            Returns:
+                    None
+        '''
+        deleted = [product_id for product_id in product_ids if self.products.pop(product_id, None) is not None]
+        if deleted:
+            self.__changed_many(deleted)
+
+
+    def increase_amount(self, product_id: int, amount: int = 1) -> None:
         '''
         Method used for increasing amount of given product in the warehouse.
         Used for generating products with Generator class.
@@ -119,59 +205,61 @@ class Warehouse:
         and product amount will be set to limit.
 
             Parameters:
-                     product_name (str): Name of the product.
+                     product_id (int): ID of the product.
                      amount (int): How much product amount should increase.
 
             Returns:
                     None
         '''
-        if product_name not in self.products:
+        if product_id not in self.products:
             raise ValueError("Warehouse: Product doesn't exists in warehouse!")
-        if (self.products[product_name].amount + amount) < self.products[product_name].limit:
-            self.products[product_name].amount += amount
-        else:
-            self.products[product_name].amount = self.products[product_name].limit
-            # logging.info(f"Reached limit for {product_name}")
+        product = self.products[product_id]
+        new_amount = min(product.amount + amount, product.limit)
+        # full warehouse doesn't change, offer snapshot stays valid
+        if new_amount != product.amount:
+            product.amount = new_amount
+            self.__changed(product_id)
 
 
-    def decrease_amount(self, product_name: str, amount: int = 1) -> None:
+    def decrease_amount(self, product_id: int, amount: int = 1) -> None:
         '''
         Method used for decreasing amount of given product in the warehouse.
         Used for updating warehouse state after completing order.
         If decreasing to less than zero ValueError will raise.
 
             Parameters:
-                     product_name (str): Name of the product.
+                     product_id (int): ID of the product.
                      amount (int): How much product amount should decrease.
 
             Returns:
                     None
         '''
-        if product_name not in self.products:
+        if product_id not in self.products:
             raise ValueError("Warehouse: Product doesn't exists in warehouse!")
-        if self.products[product_name].amount - amount >= 0:
-            self.products[product_name].amount -= amount
+        if self.products[product_id].amount - amount >= 0:
+            self.products[product_id].amount -= amount
+            self.__changed(product_id)
         else:
             raise ValueError("Warehouse: Cannot have less products than zero!")
 
-    def change_limit(self, product_name: str, limit: int = 10) -> None:
+    def change_limit(self, product_id: int, limit: int = 10) -> None:
         '''
         Method used for changing limit of product in warehouse.
         Upper and lower limit set as 0 and 1000.
         Raising or lowering beyond those will raise an error.
 
             Parameters:
-                     product_name (str): Name of the product.
+                     product_id (int): ID of the product.
                      limit (int): New limit for given product.
 
             Returns:
                     None
         '''
-        if product_name not in self.products:
+        if product_id not in self.products:
             raise ValueError("Warehouse: Product doesn't exists in warehouse!")
-        if self.products[product_name].limit < 0:
+        if self.products[product_id].limit < 0:
             raise ValueError("Warehouse: Limit cannot be less than zero!")
-        elif self.products[product_name].limit > 1000:
+        elif self.products[product_id].limit > 1000:
             raise ValueError("Warehouse: Limit cannot be more than a 1000!")
         else:
-            self.products[product_name].limit = limit
+            self.products[product_id].limit = limit
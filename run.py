@@ -1,8 +1,15 @@
 from distributed_sales_system.customer import Customer
+from distributed_sales_system.customer_pool import CustomerPool
 from distributed_sales_system.producer import Producer
 from distributed_sales_system import stop_producer
 from distributed_sales_system.product_register import product_register
+from distributed_sales_system.sales_ledger import SalesLedger
+from collections import Counter
 from random import randint, sample
+import logging
+import time
+
+logging.basicConfig(level=logging.DEBUG, format='%(relativeCreated)8.6f %(threadName)s %(message)s')
 
 
 def BasicCommunicationTest():
@@ -78,13 +85,14 @@ def PartialOfferTest():
 
 
 def NonExistentProductOrderTest():
+    # shopping list with product missing from product register is rejected (customer isn't registered)
     producer1 = Producer('producer_1',  products=["apple", "pear", "banana"])
-    customer1 = Customer('customer_1', 1, {"pjoter": 10})
+    try:
+        Customer('customer_1', 1, {"pjoter": 10})
+    except ValueError as error:
+        print(f"rejected: {error}")
 
     producer1.start()
-    customer1.start()
-
-    customer1.join()
 
     stop_producer.set()
 
@@ -133,6 +141,701 @@ def AddNewProductsTest():
     stop_producer.set()
 
 
+def SalesLedgerTest():
+    ledger = SalesLedger()
+    producer1 = Producer('producer_1', products=["apple", "pear", "banana"], sales_ledger=ledger)
+    producer2 = Producer('producer_2', products={"apple": {'price': 0.9}, "x": {}}, sales_ledger=ledger)
+    customers = [Customer(f"customer_{i}", 2) for i in range(5)]
+
+    producer1.start()
+    producer2.start()
+    for cust in customers:
+        cust.start()
+    for cust in customers:
+        cust.join()
+
+    stop_producer.set()
+
+    print(f"ledger rows: {len(ledger)}")
+    print(f"revenue per product: {ledger.revenue_per_product()}")
+    print(f"top customers: {ledger.top_customers(3)}")
+    print(f"stock-out frequency: {ledger.stock_out_frequency()}")
+
+def OverloadTest():
+    import time
+    producer1 = Producer('producer_1', products={"apple": {'amount': 50, 'create_amount': 20, 'create_time': 1}},
+                         request_queue_size=5, order_queue_size=5, shed_threshold=3)
+    customers = [Customer(f"customer_{i}", 1, {"apple": 1}) for i in range(50)]
+
+    producer1.start()
+    start = time.monotonic()
+    for cust in customers:
+        cust.start()
+    for cust in customers:
+        cust.join()
+    print(f"50 customers served in {time.monotonic() - start:.2f}s")
+
+    stop_producer.set()
+
+def PoolProducerTest():
+    import time
+    producer1 = Producer('producer_1', products={"apple": {'amount': 90, 'create_amount': 20, 'create_time': 1},
+                                                 "pear": {'amount': 90, 'create_amount': 20, 'create_time': 1}},
+                         workers=4)
+    customers = [Customer(f"customer_{i}", 2, {"apple": 1, "pear": 1}) for i in range(40)]
+
+    producer1.start()
+    start = time.monotonic()
+    for cust in customers:
+        cust.start()
+    for cust in customers:
+        cust.join()
+    print(f"40 customers served in {time.monotonic() - start:.2f}s")
+
+    stop_producer.set()
+
+def ReplicaTest():
+    import time
+    from distributed_sales_system import global_user_register
+    global_user_register.routing = 'least_queue'
+    producer1 = Producer('producer_1', products={"apple": {'amount': 90, 'create_amount': 20, 'create_time': 1}})
+    replicas = [Producer(f'producer_1_replica_{i}', replica_of=producer1) for i in range(3)]
+    customers = [Customer(f"customer_{i}", 2, {"apple": 1}) for i in range(40)]
+
+    producer1.start()
+    for replica in replicas:
+        replica.start()
+    start = time.monotonic()
+    for cust in customers:
+        cust.start()
+    for cust in customers:
+        cust.join()
+    print(f"40 customers served by 4 replicas in {time.monotonic() - start:.2f}s, apple left: {producer1.warehouse}")
+
+    stop_producer.set()
+
+def CustomerPoolTest():
+    import time
+    producers = [Producer(f"producer_{i}", products={name: {'amount': 90, 'create_amount': 50, 'create_time': 1}
+                                                     for name in product_register}) for i in range(5)]
+    pool = CustomerPool(workers=4)
+    for i in range(2000):
+        pool.add_customer(f"customer_{i}", 2)
+
+    for prod in producers:
+        prod.start()
+    start = time.monotonic()
+    pool.start()
+    pool.join()
+    print(f"2000 pooled customers finished in {time.monotonic() - start:.2f}s")
+
+    stop_producer.set()
+
+def ScenarioStartupTest(producers_number=20, customers_number=100000):
+    import json, os, tempfile, time
+    from distributed_sales_system.scenario import load_scenario
+    scenario_path = os.path.join(tempfile.mkdtemp(), "market.jsonl")
+    with open(scenario_path, "w") as scenario_file:
+        scenario_file.write(json.dumps({"type": "producer", "count": producers_number, "name": "producer_{i}",
+                                        "products": list(product_register), "workers": 1}) + "\n")
+        scenario_file.write(json.dumps({"type": "customer", "count": customers_number, "name": "customer_{i}",
+                                        "purchases": 1}) + "\n")
+
+    ledger = SalesLedger(batch_size=1)
+    pool = CustomerPool(workers=4)
+    start = time.time()
+    producers, customers = load_scenario(scenario_path, pool=pool, sales_ledger=ledger)
+    loaded = time.time()
+    for prod in producers:
+        prod.start()
+    pool.start()
+    while not len(ledger):
+        time.sleep(0.001)
+    first_order = min(ledger.column('timestamp'))
+    print(f"{len(producers)} producers and {len(customers)} customers loaded in {loaded - start:.2f}s, "
+          f"time to first order: {first_order - start:.2f}s")
+
+    # only startup is measured, pool threads are daemons and end with the process
+    stop_producer.set()
+
+def LoadGeneratorTest(schedule=((2, 100), (2, 200), (2, 400))):
+    from distributed_sales_system.load_generator import LoadGenerator, ZipfShoppingLists, ramp_arrivals
+    producers = [Producer(f"producer_{i}", products={name: {'amount': 90, 'create_amount': 50, 'create_time': 1}
+                                                     for name in product_register}, workers=1) for i in range(5)]
+    for prod in producers:
+        prod.start()
+    pool = CustomerPool(workers=4)
+    pool.start()
+    generator = LoadGenerator(pool, ramp_arrivals(schedule), ZipfShoppingLists(exponent=1.2))
+    generator.run(timeout=30)
+    report = generator.report()
+    print(", ".join(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}"
+                    for key, value in report.items()))
+
+    stop_producer.set()
+
+def LifecycleMemoryTest(cycles=2000000, report_every=200000):
+    import gc, os, resource, time
+    from distributed_sales_system import global_user_register
+
+    def rss_mb():
+        try:
+            with open("/proc/self/statm") as statm:
+                return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+        except OSError:
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+    start = time.monotonic()
+    for i in range(1, cycles + 1):
+        if i % 2:
+            with Customer(f"customer_{i}", 1):
+                pass
+        else:
+            # left without close - removed from register when garbage collected
+            Customer(f"customer_{i}", 1)
+        if i % 1000 == 0:
+            with Producer(f"producer_{i}", products=list(product_register)) as prod:
+                Producer(f"replica_{i}", replica_of=prod)
+        if i % report_every == 0:
+            gc.collect()
+            print(f"{i} cycles, {time.monotonic() - start:.1f}s, users in register: {len(global_user_register)}, "
+                  f"RSS: {rss_mb():.1f} MB")
+
+def OfferSnapshotTest(requests=200000, order_every=100):
+    import time, tracemalloc
+    prod = Producer("producer_1", products={name: {'amount': 900, 'limit': 1000} for name in product_register})
+    requested = list(range(len(product_register)))
+    tracemalloc.start()
+    start = time.perf_counter()
+    for i in range(requests):
+        prod.display_products(requested, discount_multiplier=prod.discountMultiplier if i % 2 else 1.0)
+        if i % order_every == 0:
+            # stock change - next request rebuilds snapshot
+            with prod.warehouse_lock:
+                prod.create_order({0: 1})
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{requests} offer requests in {elapsed:.2f}s ({elapsed / requests * 1e6:.2f} us per request), "
+          f"snapshots built: {requests // order_every}, peak traced memory: {peak / 1024:.1f} KB")
+    prod.close()
+
+def LockContentionTest(customers_number=200):
+    # only locks created after enable() are instrumented (set DSS_LOCK_STATS=1 to include global user register)
+    from distributed_sales_system import lock_stats
+    lock_stats.enable()
+    producers = [Producer(f"producer_{i}", products={name: {'amount': 90, 'create_amount': 50, 'create_time': 1}
+                                                     for name in product_register}, workers=2) for i in range(4)]
+    customers = [Customer(f"customer_{i}", 3) for i in range(customers_number)]
+    with lock_stats.GilProbe() as probe:
+        for prod in producers:
+            prod.start()
+        for cust in customers:
+            cust.start()
+        for cust in customers:
+            cust.join()
+    print(lock_stats.report(gil_probe=probe))
+
+    stop_producer.set()
+
+def MarketBoardTest(customers_number=200, use_board=True):
+    import time
+    from distributed_sales_system.market_board import MarketBoard
+    with MarketBoard(rows=16) as board:
+        producers = [Producer(f"producer_{i}", products={name: {'amount': 90, 'create_amount': 50, 'create_time': 1}
+                                                         for name in product_register}, workers=1,
+                              market_board=board if use_board else None) for i in range(8)]
+        customers = [Customer(f"customer_{i}", 2, market_board=board if use_board else None)
+                     for i in range(customers_number)]
+        for prod in producers:
+            prod.start()
+        start = time.monotonic()
+        for cust in customers:
+            cust.start()
+        for cust in customers:
+            cust.join()
+        elapsed = time.monotonic() - start
+        offer_requests = sum(prod.request_queue.unfinished_tasks for prod in producers)
+        print(f"{customers_number} customers {'with' if use_board else 'without'} market board finished in "
+              f"{elapsed:.2f}s, offer requests sent: {offer_requests}, producer_0 on board: {board.read(producers[0].id)}")
+        stop_producer.set()
+        for prod in producers:
+            prod.join()
+            prod.close()
+
+def ExchangeTest(customers_number=200, use_exchange=True, ceiling_bids=200000):
+    # the same market as MarketBoardTest, customers buy either on exchange or by bilateral negotiation
+    import time
+    from distributed_sales_system.exchange import Exchange
+    exchange = Exchange() if use_exchange else None
+    producers = [Producer(f"producer_{i}", products={name: {'amount': 90, 'create_amount': 50, 'create_time': 1,
+                                                            'price': 1.0 + i / 10} for name in product_register},
+                          workers=1, exchange=exchange) for i in range(8)]
+    customers = [Customer(f"customer_{i}", 2, exchange=exchange) for i in range(customers_number)]
+    for prod in producers:
+        prod.start()
+    start = time.monotonic()
+    for cust in customers:
+        cust.start()
+    for cust in customers:
+        cust.join()
+    elapsed = time.monotonic() - start
+    messages = sum(prod.request_queue.unfinished_tasks + prod.order_queue.unfinished_tasks for prod in producers)
+    print(f"{customers_number} customers {'on exchange' if use_exchange else 'negotiating'} finished in {elapsed:.2f}s "
+          f"({customers_number * 2 / elapsed:.0f} purchases/s), messages sent to producers: {messages}")
+    stop_producer.set()
+    for prod in producers:
+        prod.join()
+        prod.close()
+
+    if use_exchange:
+        # throughput ceiling of matching engine alone - asks are reposted, bids settle nothing
+        from distributed_sales_system.exchange import OrderBook
+        book = OrderBook(0)
+        for producer_id in range(100):
+            book.post(producer_id, 10, 1.0 + producer_id % 10)
+        start = time.perf_counter()
+        for i in range(ceiling_bids):
+            for producer_id, amount, price in book.reserve(3):
+                book.post(producer_id, 10, price)
+        elapsed = time.perf_counter() - start
+        print(f"matching engine: {ceiling_bids / elapsed:.0f} bids/s ({elapsed / ceiling_bids * 1e6:.2f} us per bid "
+              f"with reposting of matched asks)")
+
+def RecordReplayTest(customers_number=200, path="traffic.log"):
+    import os
+    from distributed_sales_system import traffic_log
+
+    def start_producers(workers):
+        producers = [Producer(f"producer_{i}", products={name: {'amount': 90, 'create_amount': 50, 'create_time': 1}
+                                                         for name in product_register}, workers=workers)
+                     for i in range(8)]
+        for prod in producers:
+            prod.start()
+        return producers
+
+    def stop_producers(producers):
+        stop_producer.set()
+        for prod in producers:
+            prod.join()
+            prod.close()
+        stop_producer.clear()
+
+    recorder = traffic_log.enable(path)
+    producers = start_producers(workers=1)
+    customers = [Customer(f"customer_{i}", 2) for i in range(customers_number)]
+    for cust in customers:
+        cust.start()
+    for cust in customers:
+        cust.join()
+    stop_producers(producers)
+    traffic_log.disable()
+    print(f"recorded {recorder.records} records, {os.path.getsize(path) / 1024:.1f} KB")
+
+    replayer = traffic_log.TrafficReplayer(path)
+    recorded_ids = replayer.producer_ids()
+    # the same workload against producers in both modes, as fast as possible and at recorded pace
+    for workers, speed in ((1, None), (0, None), (1, 1.0)):
+        producers = start_producers(workers)
+        stats = replayer.replay(dict(zip(recorded_ids, producers)), speed=speed)
+        stop_producers(producers)
+        print(f"workers={workers}, speed={speed}: {stats}")
+    os.remove(path)
+
+def HealthTest(customers_number=50, batches=3, offer_timeout=1.0):
+    # dead producer never starts (no heartbeat, customers trip shared circuit breaker on it), stuck producer
+    # blocks on its warehouse lock (heartbeats stop, register skips it)
+    import time
+    from distributed_sales_system import global_user_register
+    from distributed_sales_system.circuit_breaker import CircuitBreaker
+    from distributed_sales_system.messages import OrderRequest
+    from queue import Queue
+    products = {name: {'amount': 90, 'create_amount': 50, 'create_time': 1} for name in product_register}
+    producers = [Producer(f"producer_{i}", products=products, workers=1) for i in range(4)]
+    dead = Producer("dead_producer", products=products)
+    stuck = Producer("stuck_producer", products=products)
+    for prod in producers + [stuck]:
+        prod.start()
+    stuck.warehouse_lock.acquire()
+    stuck.order_queue.put(OrderRequest(-1, {0: 1}, Queue()))
+    time.sleep(global_user_register.heartbeatTimeout + 0.5)
+    print(f"health of stuck producer: {global_user_register.producer_health(stuck.id)}, "
+          f"dead producer: {global_user_register.producer_health(dead.id)}")
+
+    offer_timeout, Customer.offerTimeout = Customer.offerTimeout, offer_timeout
+    circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0)
+    for batch in range(batches):
+        customers = [Customer(f"customer_{batch}_{i}", 1, circuit_breaker=circuit_breaker)
+                     for i in range(customers_number)]
+        start = time.monotonic()
+        for cust in customers:
+            cust.start()
+        for cust in customers:
+            cust.join()
+        print(f"batch {batch}: {customers_number} customers finished in {time.monotonic() - start:.2f}s, "
+              f"dead producer's breaker: {circuit_breaker.state(dead.id)}")
+    Customer.offerTimeout = offer_timeout
+
+    stop_producer.set()
+    stuck.warehouse_lock.release()
+    for prod in producers + [stuck]:
+        prod.join()
+        prod.close()
+    dead.close()
+
+def _register_lookups(addresses, authkey, duration, products_number, local, products_per_lookup=4):
+    # client process of PartitionedRegisterTest - counts lookups done in given time and requests sent to every
+    # shard; local lookups ask for products of one (random) shard, other ones for random products of the catalog
+    import time
+    from collections import Counter
+    from random import choice, sample
+    from distributed_sales_system.partitioned_register import PartitionedRegister
+    with PartitionedRegister(addresses, authkey) as register:
+        groups = register.product_shards(range(products_number))
+        shard_of = {product: shard for shard, products in groups.items() for product in products}
+        groups = [products for products in groups.values() if len(products) >= products_per_lookup]
+        requests = Counter()
+        lookups, deadline = 0, time.monotonic() + duration
+        while time.monotonic() < deadline:
+            products = sample(choice(groups), products_per_lookup) if local \
+                else sample(range(products_number), products_per_lookup)
+            register.producer_ids_with_products(products)
+            requests.update({shard_of[product] for product in products})
+            lookups += 1
+    return lookups, requests
+
+def PartitionedRegisterTest(shard_counts=(1, 2, 4), clients=4, producers_number=1000, products_number=256, duration=2.0):
+    # lookups of random products (scatter-gather) hit most shards, so every lookup costs more messages with more
+    # shards - their throughput doesn't scale with shard count. Lookups of products of one shard (e.g. catalog
+    # partitioned by category) cost one message whatever the shard count, so load per shard falls with more shards
+    # and throughput grows with them on multi-core host (on single core total CPU stays the same).
+    from collections import Counter
+    from multiprocessing import get_context
+    from random import sample
+    from distributed_sales_system.partitioned_register import RegisterCluster, PartitionedRegister
+    for shards in shard_counts:
+        with RegisterCluster(shards) as cluster:
+            with PartitionedRegister(cluster.addresses, cluster.authkey) as register:
+                for i in range(producers_number):
+                    register.add_producer(f"producer_{i}", sample(range(products_number), 8), None, None)
+                print(f"{shards} shards, users and products per shard: {register.stats()}")
+            for local in (False, True):
+                with get_context('spawn').Pool(clients) as pool:
+                    results = pool.starmap(_register_lookups, [(cluster.addresses, cluster.authkey, duration,
+                                                                products_number, local)] * clients)
+                lookups = sum(lookups for lookups, _ in results)
+                requests = sum((shard_requests for _, shard_requests in results), Counter())
+                per_shard = [requests[shard] / duration for shard in range(shards)]
+                print(f"{shards} shards, {clients} clients, {'single-shard' if local else 'scatter'} lookups: "
+                      f"{lookups / duration:.0f} lookups/s, {sum(requests.values()) / lookups:.2f} shards per lookup, "
+                      f"requests per shard {[f'{load:.0f}/s' for load in per_shard]}")
+
+def ReplenishmentTest(qps=15, duration=12.0, replenishment_period=1.0):
+    # the same skewed (Zipf) load against static production (every product created equally - hot ones run out, slow
+    # ones pile up) and against production following demand; fill rate = bought units / units on shopping lists
+    # (customers order only what is offered, so stock-outs show up as unbought units), idle inventory = mean stock
+    from threading import Event, Thread
+    from distributed_sales_system.load_generator import LoadGenerator, ZipfShoppingLists, poisson_arrivals
+    for period in (None, replenishment_period):
+        ledger = SalesLedger()
+        producers = [Producer(f"producer_{i}", products={name: {'amount': 20, 'limit': 1000, 'create_amount': 10,
+                                                                'create_time': 1} for name in product_register},
+                              sales_ledger=ledger, workers=1, replenishment_period=period) for i in range(4)]
+        for prod in producers:
+            prod.start()
+        samples, sampling_done = [], Event()
+
+        def sample_stock():
+            while not sampling_done.wait(0.5):
+                samples.append(sum(product.amount for prod in producers for product in prod.warehouse.products.values()))
+        sampler = Thread(target=sample_stock, daemon=True)
+        sampler.start()
+        wanted = []
+        zipf_lists = ZipfShoppingLists(exponent=1.2)
+
+        def shopping_lists():
+            shopping_list = zipf_lists()
+            wanted.append(sum(shopping_list.values()))
+            return shopping_list
+        pool = CustomerPool(workers=4)
+        pool.start()
+        generator = LoadGenerator(pool, poisson_arrivals(qps, duration), shopping_lists)
+        generator.run(timeout=30)
+        sampling_done.set()
+        sampler.join()
+        bought = sum(quantity for quantity, completed in zip(ledger.column('quantity'), ledger.column('completed'))
+                     if completed)
+        refused = ledger.column('completed').tolist().count(0)
+        print(f"{'static' if period is None else 'adaptive'} production: fill rate {bought / sum(wanted):.3f}, "
+              f"refused order lines {refused}, mean idle inventory {sum(samples) / len(samples):.0f} units, "
+              f"final inventory {samples[-1]} units")
+        if period is not None:
+            print(f"producer_0 demand: { {name: round(rate, 1) for name, rate in zip(product_register.names(producers[0].replenishment.demand), producers[0].replenishment.demand.values())} }")
+        stop_producer.set()
+        for prod in producers:
+            prod.join()
+            prod.close()
+        stop_producer.clear()
+
+def ParallelOrderTest(customers_number=20, amount=5):
+    # every producer sells one product, every customer wants all four - sequential ordering pays four round-trips,
+    # parallel one; stock runs out, so parallel baskets end half-filled, atomic ones are bought whole or not at all
+    class TimedCustomer(Customer):
+        latencies = []
+
+        def submit_order(self):
+            start = time.perf_counter()
+            super().submit_order()
+            TimedCustomer.latencies.append(time.perf_counter() - start)
+    names = list(product_register)[:4]
+    for ordering in Customer.ordering_modes:
+        ledger = SalesLedger()
+        producers = [Producer(f"producer_{i}", products={name: {'amount': 30 + 10 * i, 'limit': 100, 'create_time': 100}},
+                              sales_ledger=ledger, workers=1) for i, name in enumerate(names)]
+        for prod in producers:
+            prod.start()
+        TimedCustomer.latencies = []
+        customers = [TimedCustomer(f"{ordering}_{i}", 1, {name: amount for name in names}, ordering=ordering)
+                     for i in range(customers_number)]
+        for cust in customers:
+            cust.start()
+        for cust in customers:
+            cust.join()
+        # decisions of atomic orders are acknowledged, but aborts and late replies may still be queued
+        while any(not prod.order_queue.empty() for prod in producers):
+            time.sleep(0.01)
+        time.sleep(0.1)
+        stop_producer.set()
+        for prod in producers:
+            prod.join()
+            prod.close()
+        stop_producer.clear()
+        ledger.flush()
+        bought_lines = Counter(customer for customer, completed in zip(ledger.column('customer'), ledger.column('completed'))
+                               if completed)
+        latencies = sorted(TimedCustomer.latencies)
+        print(f"{ordering}: mean submit latency {sum(latencies) / len(latencies) * 1000:.2f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms, "
+              f"whole baskets {sum(1 for lines in bought_lines.values() if lines == len(names))}, "
+              f"half-filled baskets {sum(1 for lines in bought_lines.values() if lines < len(names))}, "
+              f"empty baskets {customers_number - len(bought_lines)}")
+
+def MarketIsolationTest(customers_number=10, purchases=3):
+    # two markets with own catalogs side by side in one process - IDs and products don't meet, stopping the first
+    # market leaves producers of the second running
+    from distributed_sales_system.market import Market
+    from distributed_sales_system.product_register import ProductCatalog
+    markets = [Market("fruit"), Market("bakery", catalog=ProductCatalog(["bread", "roll", "bagel"]))]
+    agents = {}
+    for market in markets:
+        ledger = SalesLedger()
+        producers = [Producer(f"producer_{i}", products={name: {'amount': 50, 'limit': 100} for name in market.catalog},
+                              sales_ledger=ledger, market=market) for i in range(2)]
+        customers = [Customer(f"customer_{i}", purchases, {name: 2 for name in market.catalog}, market=market)
+                     for i in range(customers_number)]
+        agents[market.name] = (ledger, producers, customers)
+        for agent in producers + customers:
+            agent.start()
+    for market in markets:
+        ledger, producers, customers = agents[market.name]
+        for cust in customers:
+            cust.join()
+        market.close()
+        for prod in producers:
+            prod.join()
+        alive = [prod.name for other in markets if other is not market for prod in agents[other.name][1] if prod.is_alive()]
+        print(f"{market.name} stopped, producers still running in other markets: {alive}")
+    for market in markets:
+        ledger, producers, _ = agents[market.name]
+        ledger.flush()
+        print(f"{market.name}: producer IDs {[prod.id for prod in producers]}, sold order lines "
+              f"{sum(ledger.column('completed'))}, revenue per product {ledger.revenue_per_product()}")
+        for prod in producers:
+            prod.close()
+
+def SweepTest(path="sweep.csv", duration=3.0):
+    # grid of producer counts and generator periods run in process pool (one isolated market per run); second
+    # run of the same grid finds all configurations in the table and runs nothing
+    from distributed_sales_system.sweep import Sweep, sweep_grid
+    configs = sweep_grid(producers=[1, 2, 4], create_time=[1, 3], duration=[duration])
+    sweep = Sweep(path)
+    for attempt in range(2):
+        start = time.perf_counter()
+        rows = sweep.run(configs)
+        print(f"sweep {attempt}: {len(rows)} rows in table after {time.perf_counter() - start:.1f} s")
+    for row in rows:
+        print(f"producers {row['producers']}, create_time {row['create_time']}: "
+              f"throughput {float(row['throughput']):.1f}/s, latency p99 {float(row['latency_p99']) * 1000:.1f} ms, "
+              f"fill rate {float(row['fill_rate']):.3f}")
+
+def BrowseStormTest(rounds=20, burst=10, storm_depth=1000, round_gap=0.02):
+    # single-threaded producer kept under backlog of offer requests (browse storm) while bursts of orders arrive -
+    # settlement latency of orders (from sending to reply put into customer's queue, so thread wake-ups of customer
+    # don't count) per scheduling policy, with number of served requests and SLO misses of both classes
+    from queue import Queue
+    from threading import Event, Thread
+    from distributed_sales_system import default_market, global_user_register
+    from distributed_sales_system.messages import OfferRequest, OrderRequest
+    clock = default_market.clock
+
+    class Buyer:
+        # reply sink noting when reply was put (producer replies with put_nowait)
+        def __init__(self):
+            self.settled = []
+
+        def put_nowait(self, message):
+            self.settled.append(clock())
+    for scheduling in Producer.scheduling_policies:
+        producer = Producer("producer_0", products={name: {'amount': 999, 'limit': 1000, 'create_time': 100}
+                                                    for name in product_register}, scheduling=scheduling)
+        browser_replies = Queue(maxsize=1)
+        browser_id = global_user_register.add_customer("browser", browser_replies)
+        buyer = Buyer()
+        buyer_id = global_user_register.add_customer("buyer", buyer)
+        storm_done = Event()
+
+        def storm():
+            products = list(range(len(product_register)))
+            while not storm_done.is_set():
+                if producer.request_queue.qsize() < storm_depth:
+                    producer.request_queue.put(OfferRequest(browser_id, products, browser_replies, clock()))
+                else:
+                    time.sleep(0.001)
+        storm_thread = Thread(target=storm, daemon=True)
+        storm_thread.start()
+        # backlog is built before producer starts, then storm keeps it topped up
+        while producer.request_queue.qsize() < storm_depth:
+            time.sleep(0.01)
+        producer.start()
+        latencies = []
+        for _ in range(rounds):
+            buyer.settled.clear()
+            sent_at = clock()
+            for _ in range(burst):
+                producer.order_queue.put(OrderRequest(buyer_id, {0: 1}, buyer, sent_at))
+            while len(buyer.settled) < burst:
+                time.sleep(0.001)
+            latencies.extend(settled - sent_at for settled in buyer.settled)
+            time.sleep(round_gap)
+        storm_done.set()
+        storm_thread.join()
+        stop_producer.set()
+        producer.join()
+        producer.close()
+        stop_producer.clear()
+        for customer_id in (browser_id, buyer_id):
+            global_user_register.delete_user(customer_id)
+        latencies.sort()
+        (orders_handled, orders_missed), (requests_handled, requests_missed) = \
+            producer.slo_stats['order'], producer.slo_stats['request']
+        print(f"{scheduling}: order settlement p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms, "
+              f"order SLO misses {orders_missed}/{orders_handled}, "
+              f"requests served {requests_handled} (SLO misses {requests_missed})")
+
+def ShutdownTest(producers_number=200, queued=20, drain_timeout=0.2):
+    # large market torn down with queued offer requests and orders in every producer - orders are settled within
+    # drain timeout, the rest is answered with Closed reply, register is left empty and generator threads end;
+    # then single producer closed with prepared transaction whose decision never comes (producer voted ready, so
+    # goods stay reserved - transaction is in doubt, customer may have committed it)
+    from threading import enumerate as threads
+    from distributed_sales_system.market import Market
+    from distributed_sales_system.messages import OfferRequest, OrderRequest, PrepareRequest
+    market = Market("shutdown")
+
+    class Sink:
+        # reply sink counting replies by type (producer replies with put_nowait)
+        def __init__(self):
+            self.replies = Counter()
+
+        def put_nowait(self, message):
+            self.replies[type(message).__name__] += 1
+    sink = Sink()
+    customer_id = market.register.add_customer("customer", sink)
+    products = {name: {'amount': 50, 'limit': 100, 'create_time': 1} for name in market.catalog}
+    producers = [Producer(f"producer_{i}", products=products, market=market) for i in range(producers_number)]
+    for producer in producers:
+        for _ in range(queued):
+            producer.request_queue.put(OfferRequest(customer_id, [0, 1], sink, market.clock()))
+            producer.order_queue.put(OrderRequest(customer_id, {0: 1}, sink, market.clock()))
+    for producer in producers:
+        producer.start()
+    start = time.perf_counter()
+    finished = market.shutdown(timeout=10.0)
+    elapsed = time.perf_counter() - start
+    generators = [thread.name for thread in threads() if thread.name.endswith("_generator")]
+    market.register.delete_user(customer_id)
+    print(f"{producers_number} producers shut down in {elapsed:.2f} s (all ended: {finished}), replies {dict(sink.replies)} "
+          f"of {2 * producers_number * queued} queued messages, users left in register {len(market.register)}, "
+          f"generator threads alive {len(generators)}")
+
+    market.restart()
+    producer = Producer("producer_2pc", products=products, market=market)
+    sink = Sink()
+    customer_id = market.register.add_customer("customer", sink)
+    producer.start()
+    producer.order_queue.put(PrepareRequest(customer_id, 1, {0: 10}, sink, market.clock()))
+    producer.order_queue.put(OrderRequest(customer_id, {1: 1}, sink, market.clock()))
+    while sum(sink.replies.values()) < 2:
+        time.sleep(0.01)
+    producer.request_queue.put(OfferRequest(customer_id, [0], sink, market.clock()))
+    start = time.perf_counter()
+    producer.close(drain_timeout)
+    producer.join()
+    market.register.delete_user(customer_id)
+    print(f"producer with undecided transaction closed in {time.perf_counter() - start:.2f} s, replies "
+          f"{dict(sink.replies)}, amount of reserved product in warehouse {producer.warehouse.products[0].amount} "
+          f"(10 of 50 kept for transaction in doubt)")
+
+    # messages put after close returned are answered with Closed reply at once, nothing is left in queues
+    sink = Sink()
+    start = time.perf_counter()
+    producer.request_queue.put(OfferRequest(customer_id, [0], sink, market.clock()))
+    producer.order_queue.put_nowait(OrderRequest(customer_id, {0: 1}, sink, market.clock()))
+    print(f"messages put after close answered in {(time.perf_counter() - start) * 1000:.2f} ms, replies "
+          f"{dict(sink.replies)}, messages left in queues {producer.request_queue.qsize() + producer.order_queue.qsize()}")
+
+def BulkCatalogTest(products_number=2000, bulk_products_number=50000):
+    # onboarding and removal of large product range one by one and in bulk (producer isn't started, its generator
+    # events stay scheduled) - register index and generator events are checked after every step
+    from distributed_sales_system.market import Market
+    from distributed_sales_system.product_register import ProductCatalog
+    market = Market("bulk", catalog=ProductCatalog(f"sku_{i}" for i in range(bulk_products_number + 1)))
+    for bulk, number in ((False, products_number), (True, products_number), (True, bulk_products_number)):
+        producer = Producer("producer_0", products=["sku_0"], market=market)
+        params = {f"sku_{i}": {'price': 2.0, 'amount': 10, 'create_time': 1 + i % 10} for i in range(1, number + 1)}
+        start = time.perf_counter()
+        if bulk:
+            producer.add_products(params)
+        else:
+            for name, product_params in params.items():
+                producer.add_product(name, **product_params)
+        added = time.perf_counter() - start
+        indexed = len(market.register.producer_with_products([number]))
+        events = len(producer.product_generator.scheduler.queue)
+        start = time.perf_counter()
+        if bulk:
+            producer.delete_products(params)
+        else:
+            for name in params:
+                producer.delete_product(name)
+        deleted = time.perf_counter() - start
+        print(f"{'bulk' if bulk else 'one by one'}, {number} products: added in {added:.2f} s ({events} generator "
+              f"events, last product indexed: {bool(indexed)}), deleted in {deleted:.2f} s, products left "
+              f"{len(producer.products)}, generator events left {len(producer.product_generator.scheduler.queue)}")
+        producer.close()
+
+def Profiled(test, directory=None, interval=0.005):
+    # samples all agent threads started by the test and prints report, <agent>.folded files and report.txt
+    # are written to directory if it is passed
+    from distributed_sales_system import profiling
+    profiling.enable(interval)
+    try:
+        test()
+    finally:
+        profiler = profiling.disable(directory)
+        print(profiler.report())
+
 def EnduranceTest():
     customers = []
     # producers = []
@@ -161,4 +864,27 @@ if __name__ == "__main__":
     # DiscountTest()
     # ProductGeneratorTest()
     # AddNewProductsTest()
-    EnduranceTest()
\ No newline at end of file
+    # SalesLedgerTest()
+    # OverloadTest()
+    # PoolProducerTest()
+    # ReplicaTest()
+    # CustomerPoolTest()
+    # ScenarioStartupTest()
+    # LoadGeneratorTest()
+    # LifecycleMemoryTest()
+    # OfferSnapshotTest()
+    # Profiled(CustomerPoolTest, directory="profile")
+    # LockContentionTest()
+    # MarketBoardTest()
+    EnduranceTest()
+    # ExchangeTest()
+    # RecordReplayTest()
+    # HealthTest()
+    # PartitionedRegisterTest()
+    # ReplenishmentTest()
+    # ParallelOrderTest()
+    # MarketIsolationTest()
+    # SweepTest()
+    # BrowseStormTest()
+    # ShutdownTest()
+    # BulkCatalogTest()